@@ -0,0 +1,95 @@
+import time
+from array import array
+
+from bank_accounts import InterestRewardsAcct, SavingsAcct
+from money import BASIS_POINTS, div_round_half_even, from_cents, to_cents
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DAYS_PER_YEAR = 365
+
+
+def daily_interest(balances, annual_rate_bp):
+    # One day of interest per balance in cents, rounded half-even. Balances
+    # at or below zero earn nothing.
+    denominator = BASIS_POINTS * DAYS_PER_YEAR
+    if np is not None:
+        numerator = np.maximum(np.asarray(balances, dtype=np.int64), 0) * annual_rate_bp
+        quotient, remainder = np.divmod(numerator, denominator)
+        twice = remainder * 2
+        quotient += (twice > denominator) | ((twice == denominator) & (quotient & 1 == 1))
+        return array('q', quotient.tolist())
+    return array('q', [div_round_half_even(cents * annual_rate_bp, denominator) if cents > 0 else 0
+                       for cents in balances])
+
+
+class EndOfDay:
+    # Posts daily interest to every interest-bearing account (SavingsAcct
+    # included) and, when asked, a maintenance fee to every SavingsAcct.
+    # Accounts are processed in chunks: balances are gathered into one
+    # array, the accruals computed together, then only the accounts with
+    # something to post are touched. Blocked accounts are skipped, as a
+    # deposit or withdrawal on them would be.
+    def __init__(self, accounts, annual_rate_bp=200, maintenance_fee=0, chunk_size=65536):
+        self.accounts = [account for account in accounts if isinstance(account, InterestRewardsAcct)]
+        self.annual_rate_bp = annual_rate_bp
+        self.maintenance_fee = to_cents(maintenance_fee)
+        self.chunk_size = chunk_size
+
+    def run(self, charge_fees=False, time_budget=None, start=0):
+        # Stops between chunks once time_budget seconds have passed; pass
+        # the returned next_start back in to finish the run later.
+        began = time.perf_counter()
+        accounts = self.accounts
+        report = {'interest_posted': 0, 'interest': 0, 'fees_charged': 0, 'fees': 0,
+                  'fees_uncollected': 0, 'blocked': 0}
+        index = start
+        while index < len(accounts):
+            if time_budget is not None and time.perf_counter() - began >= time_budget:
+                break
+            chunk = accounts[index:index + self.chunk_size]
+            self._post_interest(chunk, report)
+            if charge_fees and self.maintenance_fee:
+                self._charge_fees(chunk, report)
+            index += len(chunk)
+        report['interest'] = from_cents(report['interest'])
+        report['fees'] = from_cents(report['fees'])
+        report['processed'] = index - start
+        report['next_start'] = index
+        report['complete'] = index >= len(accounts)
+        report['elapsed'] = time.perf_counter() - began
+        return report
+
+    def _post_interest(self, chunk, report):
+        balances = [0 if account.is_blocked else account._balance for account in chunk]
+        for account, cents in zip(chunk, daily_interest(balances, self.annual_rate_bp)):
+            if cents:
+                account._balance += cents
+                account.log_transaction('Interest Accrued', cents)
+                report['interest_posted'] += 1
+                report['interest'] += cents
+
+    def _charge_fees(self, chunk, report):
+        fee = self.maintenance_fee
+        for account in chunk:
+            if account.is_blocked or not isinstance(account, SavingsAcct):
+                continue
+            # Never takes the balance below zero: whatever the account
+            # cannot cover is reported as uncollected instead.
+            charged = min(fee, max(account._balance, 0))
+            if charged < fee:
+                report['fees_uncollected'] += 1
+            if not charged:
+                continue
+            account._balance -= charged
+            account.log_transaction('Maintenance Fee', -charged)
+            account._stats.record_fee(charged)
+            account.check_minimum_balance()
+            report['fees_charged'] += 1
+            report['fees'] += charged
+            if account.is_blocked:
+                report['blocked'] += 1
@@ -0,0 +1,87 @@
+import asyncio
+
+
+class AsyncLedger:
+    # Every account gets a bounded queue drained by its own worker task, so
+    # writes to one account apply in arrival order and callers wait in put()
+    # once the queue is full. The account methods themselves are synchronous
+    # and never yield, so a transfer touching two accounts still runs as one
+    # step on the event loop.
+    def __init__(self, queue_size=1024):
+        self.queue_size = queue_size
+        self._queues = {}
+        self._workers = {}
+        self._pending_reads = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _queue(self, account):
+        queue = self._queues.get(account.account_id)
+        if queue is None:
+            queue = self._queues[account.account_id] = asyncio.Queue(self.queue_size)
+            self._workers[account.account_id] = asyncio.get_running_loop().create_task(self._drain(queue))
+        return queue
+
+    async def _drain(self, queue):
+        while True:
+            func, args, future = await queue.get()
+            try:
+                result = func(*args)
+            except Exception as exc:
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            queue.task_done()
+
+    async def _submit(self, account, func, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue(account).put((func, args, future))
+        return await future
+
+    async def deposit(self, account, amount):
+        return await self._submit(account, account.deposit, amount)
+
+    async def withdraw(self, account, amount):
+        return await self._submit(account, account.withdraw, amount)
+
+    async def transfer(self, account, amount, target):
+        return await self._submit(account, account.transfer, amount, target)
+
+    async def transfer_to_parent(self, account, amount):
+        return await self._submit(account, account.transfer_to_parent, amount)
+
+    async def balance(self, account):
+        # Reads queue behind earlier writes to the same account. While a read
+        # is waiting in the queue, later callers share its result. A read is
+        # only shared once it is actually queued, so a caller cancelled while
+        # waiting for room leaves nothing behind.
+        future = self._pending_reads.get(account.account_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            await self._queue(account).put((self._read, (account, future), future))
+            self._pending_reads[account.account_id] = future
+        return await asyncio.shield(future)
+
+    def _read(self, account, future):
+        if self._pending_reads.get(account.account_id) is future:
+            del self._pending_reads[account.account_id]
+        return account.balance
+
+    async def join(self):
+        for queue in list(self._queues.values()):
+            await queue.join()
+
+    async def close(self):
+        await self.join()
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._queues.clear()
+        self._workers.clear()
@@ -1,84 +1,161 @@
+import gc
+import itertools
+
+from journal import TransactionJournal
+from money import apply_rate, from_cents, to_cents
+from notifiers import StdoutNotifier
+from stats import AccountStats
+
+
 class BalanceException(Exception):
     pass
 
 
+_account_ids = itertools.count(1)
+
+
 class BankAccount:
+    __slots__ = ('account_id', '_balance', 'name', '_min_balance', 'is_blocked', 'transaction_history', '_stats')
+
+    notifier = StdoutNotifier()
+    listeners = ()
+    guards = ()
+
     def __init__(self, initial_amount, acct_name, min_balance=0):
-        self.balance = initial_amount
+        self._open(initial_amount, acct_name, min_balance)
+        self.notifier.notify('opened', self)
+
+    def _open(self, initial_amount, acct_name, min_balance=0):
+        self.account_id = next(_account_ids)
+        self._balance = to_cents(initial_amount)
         self.name = acct_name
-        self.min_balance = min_balance
+        self._min_balance = to_cents(min_balance)
         self.is_blocked = False
-        self.transaction_history = []
-        self.log_transaction('Account opened', initial_amount)
-        print(f"\nAccount '{self.name}' created.\nBalance = ${self.balance:.2f}")
+        self.transaction_history = TransactionJournal()
+        self._stats = AccountStats()
+        self.log_transaction('Account opened', self._balance)
+
+    # Money is held as integer cents; the public attributes expose Decimals.
+    @property
+    def balance(self):
+        return from_cents(self._balance)
+
+    @balance.setter
+    def balance(self, amount):
+        self._balance = to_cents(amount)
+        self._state_changed()
+
+    @property
+    def min_balance(self):
+        return from_cents(self._min_balance)
+
+    @min_balance.setter
+    def min_balance(self, amount):
+        self._min_balance = to_cents(amount)
+        self._state_changed()
 
     def create_child_account(self, initial_amount, child_name):
         if self.is_blocked:
-            print(f"\nAccount '{self.name}' is currently blocked and cannot create a child account.")
+            self.notifier.notify('child_refused', self)
             return None
         child_account = ChildAccount(initial_amount, child_name, parent_account=self)
-        print(f"\nChild account '{child_account.name}' created under parent account '{self.name}'.")
+        self.notifier.notify('child_created', self, other=child_account)
         return child_account
 
-    def log_transaction(self, action, amount):
-        self.transaction_history.append((action, amount))
+    def log_transaction(self, action, cents):
+        history = self.transaction_history
+        history.append(action, cents, self._balance)
+        self._stats.record(history.codes[-1], cents, self._balance, history.timestamps[-1])
+        for listener in self.listeners:
+            listener.on_transaction(self, action, cents)
+
+    def balance_at(self, timestamp):
+        # Balance as of timestamp (a time.time() value), or None if the
+        # account did not exist yet.
+        cents = self.transaction_history.balance_at_time(timestamp)
+        return from_cents(cents) if cents is not None else None
+
+    def stats(self):
+        return self._stats.as_dict()
+
+    def family_stats(self):
+        # Totals for this account and every account below it.
+        return self._stats.family_dict()
+
+    def _state_changed(self):
+        # Balance, limits or blocking changed outside of a logged transaction.
+        # A balance change gets an entry of its own, so it is stamped with
+        # the time it happened rather than inheriting the previous entry's.
+        delta = self._balance - self._stats.balance
+        if delta:
+            self.log_transaction('Balance Adjusted', delta)
+        for listener in self.listeners:
+            listener.on_state(self)
 
     def get_balance(self):
         if self.is_blocked:
-            print(f"\nAccount '{self.name}' is currently blocked.")
+            self.notifier.notify('blocked', self)
             return
-        print(f"\nAccount '{self.name}' balance = ${self.balance:.2f}")
+        self.notifier.notify('balance', self)
 
     def deposit(self, amount):
         if self.is_blocked:
-            print(f"\nAccount '{self.name}' is currently blocked.")
+            self.notifier.notify('blocked', self)
             return
-        if amount <= 0:
+        cents = to_cents(amount)
+        if cents <= 0:
             raise BalanceException("Deposit amount must be positive.")
-        self.balance += amount
-        self.log_transaction('Deposit', amount)
-        print("\nDeposit complete.")
-        self.get_balance()
+        self._balance += cents
+        self.log_transaction('Deposit', cents)
+        self.notifier.notify('deposit', self)
 
     def withdraw(self, amount):
-        if amount <= 0:
+        cents = to_cents(amount)
+        if cents <= 0:
             raise BalanceException("Withdrawal amount must be positive.")
-        if self.balance - amount < 0:
+        for guard in self.guards:
+            guard.check(self, 'withdraw', cents, None)
+        if self._balance - cents < 0:
             raise BalanceException(f"Insufficient funds in account '{self.name}'.")
-        self.balance -= amount
-        self.log_transaction('Withdraw', -amount)
-        print("\nWithdraw complete.")
+        self._balance -= cents
+        self.log_transaction('Withdraw', -cents)
+        self.notifier.notify('withdraw', self)
         self.check_minimum_balance()
 
     def check_minimum_balance(self):
-        if self.balance < self.min_balance:
+        if self._balance < self._min_balance:
             self.is_blocked = True
-            print(f"\nAccount '{self.name}' has fallen below the minimum balance and is now blocked.")
+            self._state_changed()
+            self.notifier.notify('below_minimum', self)
 
     def unblock_account(self):
-        if self.balance >= self.min_balance:
+        if self._balance >= self._min_balance:
             self.is_blocked = False
-            print(f"\nAccount '{self.name}' is now unblocked.")
+            self._state_changed()
+            self.notifier.notify('unblocked', self)
         else:
-            print(f"\nAccount '{self.name}' cannot be unblocked. Balance is below the minimum requirement.")
+            self.notifier.notify('unblock_refused', self)
 
     def viable_transaction(self, amount):
-        if self.balance < amount:
+        if self._balance < to_cents(amount):
             raise BalanceException(f"Insufficient funds for the transaction in account '{self.name}'.")
 
     def transfer(self, amount, account):
         if self.is_blocked:
-            print(f"\nAccount '{self.name}' is currently blocked.")
+            self.notifier.notify('blocked', self)
             return
-        if amount <= 0:
+        cents = to_cents(amount)
+        if cents <= 0:
             raise BalanceException("Transfer amount must be positive.")
         if self == account:
             raise BalanceException("Cannot transfer to the same account.")
+        for guard in self.guards:
+            guard.check(self, 'transfer', cents, account)
         self.viable_transaction(amount)
         self.withdraw(amount)
         account.deposit(amount)
-        self.log_transaction('Transfer', amount)
-        print('\nTransfer complete!')
+        self.log_transaction('Transfer', cents)
+        self.notifier.notify('transfer', self)
         self.check_minimum_balance()
 
     def view_transaction_history(self):
@@ -87,70 +164,167 @@ class BankAccount:
 
     def close_account(self):
         if self.is_blocked:
-            print(f"\nAccount '{self.name}' is currently blocked and cannot be closed.")
+            self.notifier.notify('close_blocked', self)
             return
         # Check if the balance is zero or within allowed limit
-        if self.balance != 0 and self.balance < self.min_balance:
-            print(f"\nAccount '{self.name}' cannot be closed because the balance is below the minimum requirement.")
+        if self._balance != 0 and self._balance < self._min_balance:
+            self.notifier.notify('close_refused', self)
             return
         # Perform account closure steps
         self.is_blocked = True  # Block the account
         self.log_transaction('Account Closed', 0)  # Log the closure transaction
-        print(f"\nAccount '{self.name}' has been closed.")
+        self.notifier.notify('closed', self)
 
 
 class InterestRewardsAcct(BankAccount):
+    __slots__ = ()
+
+    bonus_rate_bp = 500
+
     def __init__(self, initial_amount, acct_name, min_balance=0):
         super().__init__(initial_amount, acct_name, min_balance)
 
     def deposit(self, amount):
         if self.is_blocked:
-            print(f"\nAccount '{self.name}' is currently blocked.")
+            self.notifier.notify('blocked', self)
             return
-        if amount <= 0:
+        cents = to_cents(amount)
+        if cents <= 0:
             raise BalanceException("Deposit amount must be positive.")
-        bonus_amount = amount * 0.05
-        self.balance += amount + bonus_amount
-        self.log_transaction('Interest Deposit', amount + bonus_amount)
-        print("\nInterest deposit complete.")
-        self.get_balance()
+        cents += apply_rate(cents, self.bonus_rate_bp)
+        self._balance += cents
+        self.log_transaction('Interest Deposit', cents)
+        self.notifier.notify('interest_deposit', self)
 
 
 class SavingsAcct(InterestRewardsAcct):
+    __slots__ = ('_fee',)
+
     def __init__(self, initial_amount, acct_name, fee=5, min_balance=0):
-        super().__init__(initial_amount, acct_name, min_balance)
-        self.fee = fee
+        self._open(initial_amount, acct_name, fee, min_balance)
+        self.notifier.notify('opened', self)
+
+    def _open(self, initial_amount, acct_name, fee=5, min_balance=0):
+        self._fee = to_cents(fee)
+        BankAccount._open(self, initial_amount, acct_name, min_balance)
+
+    @property
+    def fee(self):
+        return from_cents(self._fee)
+
+    @fee.setter
+    def fee(self, amount):
+        self._fee = to_cents(amount)
+        self._state_changed()
 
     def withdraw(self, amount):
-        total_amount = amount + self.fee
-        if total_amount <= 0:
+        total_cents = to_cents(amount) + self._fee
+        if total_cents <= 0:
             raise BalanceException("Withdrawal amount must be positive.")
-        if self.balance - total_amount < 0:
+        for guard in self.guards:
+            guard.check(self, 'withdraw', total_cents, None)
+        if self._balance - total_cents < 0:
             raise BalanceException(f"Insufficient funds in account '{self.name}'.")
-        self.balance -= total_amount
-        self.log_transaction('Withdraw with Fee', -total_amount)
-        print("\nWithdraw complete with fee.")
+        self._balance -= total_cents
+        self.log_transaction('Withdraw with Fee', -total_cents)
+        self._stats.record_fee(self._fee)
+        self.notifier.notify('withdraw_fee', self)
         self.check_minimum_balance()
 
         # Check for minimum balance after withdrawal
-        if self.balance < self.min_balance:
+        if self._balance < self._min_balance:
             self.is_blocked = True
-            print(f"Account '{self.name}' has been blocked due to falling below the minimum balance.")
+            self.notifier.notify('savings_blocked', self)
             raise BalanceException(f"Insufficient funds in account '{self.name}'.")
 
 class ChildAccount(BankAccount):
+    __slots__ = ('parent_account',)
+
     def __init__(self, initial_amount, acct_name, parent_account, min_balance=0):
-        super().__init__(initial_amount, acct_name, min_balance)
+        self._open(initial_amount, acct_name, parent_account, min_balance)
+        self.notifier.notify('opened', self)
+
+    def _open(self, initial_amount, acct_name, parent_account, min_balance=0):
         self.parent_account = parent_account
+        BankAccount._open(self, initial_amount, acct_name, min_balance)
+        self._stats.attach(parent_account._stats)
 
     def transfer_to_parent(self, amount):
         if self.is_blocked:
-            print(f"\nChild account '{self.name}' is currently blocked.")
+            self.notifier.notify('child_blocked', self)
             return
-        if amount <= 0:
+        cents = to_cents(amount)
+        if cents <= 0:
             raise BalanceException("Transfer amount must be positive.")
+        for guard in self.guards:
+            guard.check(self, 'transfer_to_parent', cents, self.parent_account)
         self.viable_transaction(amount)
         self.withdraw(amount)
         self.parent_account.deposit(amount)
-        self.log_transaction('Transfer to Parent', amount)
-        print(f'\nTransfer to parent account complete: ${amount:.2f}')
+        self.log_transaction('Transfer to Parent', cents)
+        self.notifier.notify('transfer_to_parent', self, amount)
+
+
+def set_notifier(notifier):
+    BankAccount.notifier = notifier
+
+
+def add_listener(listener):
+    # Listeners implement on_transaction(account, action, cents) and
+    # on_state(account); 'Account opened' is always an account's first entry.
+    BankAccount.listeners = BankAccount.listeners + (listener,)
+
+
+def remove_listener(listener):
+    BankAccount.listeners = tuple(item for item in BankAccount.listeners if item is not listener)
+
+
+def add_guard(guard):
+    # Guards implement check(account, operation, cents, target) and raise
+    # to refuse a withdraw, transfer or transfer_to_parent before anything
+    # is applied; target is the receiving account, or None for a withdraw.
+    # The withdraw inside a transfer is checked as a withdraw too.
+    BankAccount.guards = BankAccount.guards + (guard,)
+
+
+def remove_guard(guard):
+    BankAccount.guards = tuple(item for item in BankAccount.guards if item is not guard)
+
+
+def check_guards(operations):
+    # Asks every guard about (account, operation, cents, target) tuples
+    # that will be applied together. Guards with check_many() judge them as
+    # one batch; the others are asked about each operation in turn.
+    for guard in BankAccount.guards:
+        check_many = getattr(guard, 'check_many', None)
+        if check_many is not None:
+            check_many(operations)
+        else:
+            for operation in operations:
+                guard.check(*operation)
+
+
+def advance_account_ids(last_id):
+    global _account_ids
+    _account_ids = itertools.count(max(last_id + 1, next(_account_ids)))
+
+
+def open_accounts_bulk(specs, account_cls=BankAccount):
+    # Each spec holds the positional constructor arguments of account_cls.
+    # Accounts are opened without notifications, and the cyclic garbage
+    # collector is paused since none of the new objects can form cycles.
+    new = account_cls.__new__
+    open_account = account_cls._open
+    accounts = []
+    append = accounts.append
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for spec in specs:
+            account = new(account_cls)
+            open_account(account, *spec)
+            append(account)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return accounts
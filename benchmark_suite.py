@@ -0,0 +1,253 @@
+import argparse
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+from array import array
+
+import bank_accounts
+from bank_accounts import BankAccount, ChildAccount, InterestRewardsAcct, SavingsAcct
+from benchmarks import measure_allocated
+from journal import ACTION_CODES
+from notifiers import SilentNotifier, StdoutNotifier
+
+
+ACCOUNT_TYPES = (BankAccount, InterestRewardsAcct, SavingsAcct, ChildAccount)
+
+# Each timing case is a (setup, run) pair: setup(ops) builds fresh state so
+# no repeat sees the previous one's balances or history, and run(state, ops)
+# is the only part that is timed.
+CASES = {}
+
+DEPOSIT_CODE = ACTION_CODES['Deposit']
+
+
+def new_account(cls, initial_amount, name):
+    if cls is ChildAccount:
+        return BankAccount(initial_amount, name + 'Parent').create_child_account(initial_amount, name)
+    return cls(initial_amount, name)
+
+
+def _open(cls):
+    def setup(ops):
+        return BankAccount(1, 'BenchParent') if cls is ChildAccount else None
+
+    def run(parent, ops):
+        if parent is not None:
+            for i in range(ops):
+                ChildAccount(1000, 'Bench', parent)
+        else:
+            for i in range(ops):
+                cls(1000, 'Bench')
+    return setup, run
+
+
+def _deposit(cls):
+    def setup(ops):
+        return new_account(cls, 1000, 'Bench')
+
+    def run(account, ops):
+        deposit = account.deposit
+        for i in range(ops):
+            deposit(1)
+    return setup, run
+
+
+def _withdraw(cls):
+    def setup(ops):
+        return new_account(cls, ops * 10, 'Bench')
+
+    def run(account, ops):
+        withdraw = account.withdraw
+        for i in range(ops):
+            withdraw(1)
+    return setup, run
+
+
+def _transfer(cls):
+    def setup(ops):
+        return new_account(cls, ops * 10, 'Bench'), BankAccount(0, 'BenchTarget')
+
+    def run(accounts, ops):
+        source, target = accounts
+        transfer = source.transfer
+        for i in range(ops):
+            transfer(1, target)
+    return setup, run
+
+
+def _transfer_to_parent(ops):
+    return new_account(ChildAccount, ops * 10, 'Bench')
+
+
+def _run_transfer_to_parent(account, ops):
+    transfer_to_parent = account.transfer_to_parent
+    for i in range(ops):
+        transfer_to_parent(1)
+
+
+for _cls in ACCOUNT_TYPES:
+    for _operation, _factory in (('open', _open), ('deposit', _deposit), ('withdraw', _withdraw),
+                                 ('transfer', _transfer)):
+        CASES[f'{_operation}.{_cls.__name__}'] = _factory(_cls)
+CASES['transfer_to_parent.ChildAccount'] = (_transfer_to_parent, _run_transfer_to_parent)
+
+
+def _history_growth(size):
+    # Deposit rate on an account that already holds size entries; it should
+    # not fall as the history grows.
+    def setup(ops):
+        account = BankAccount(1000, 'BenchHistory')
+        history = account.transaction_history
+        history.extend(array('Q', range(size)), array('d', bytes(8 * size)),
+                       array('H', [DEPOSIT_CODE]) * size, array('q', [100]) * size)
+        return account
+    return setup, _deposit(BankAccount)[1]
+
+
+for _size in (0, 100000, 1000000):
+    CASES[f'history_growth.{_size}'] = _history_growth(_size)
+
+
+def summarize(samples):
+    # samples are ops/sec, one per repeat
+    mean = statistics.fmean(samples)
+    stdev = statistics.stdev(samples) if len(samples) > 1 else 0.0
+    return {
+        'unit': 'ops/sec',
+        'samples': samples,
+        'mean': mean,
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'max': max(samples),
+        'stdev': stdev,
+        'ci95': 1.96 * stdev / math.sqrt(len(samples)),
+        'higher_is_better': True,
+    }
+
+
+def measure(setup, run, ops, warmup=1, repeats=5):
+    for _ in range(warmup):
+        run(setup(ops), ops)
+    samples = []
+    for _ in range(repeats):
+        state = setup(ops)
+        start = time.perf_counter()
+        run(state, ops)
+        samples.append(ops / (time.perf_counter() - start))
+    return summarize(samples)
+
+
+def memory_results(n=20000):
+    # tracemalloc totals are deterministic enough that one sample suffices.
+    results = {}
+    for cls in ACCOUNT_TYPES:
+        parent = BankAccount(1, 'BenchParent')
+
+        def build(cls=cls, parent=parent):
+            if cls is ChildAccount:
+                return [ChildAccount(1000, 'Bench', parent) for _ in range(n)]
+            return [cls(1000, 'Bench') for _ in range(n)]
+        results[f'memory_per_account.{cls.__name__}'] = _memory(measure_allocated(build) / n)
+
+    def build_history(entries=n * 10):
+        account = BankAccount(1000, 'BenchMemory')
+        for i in range(entries):
+            account.deposit(1)
+        return account
+    results['memory_per_entry'] = _memory((measure_allocated(build_history) - measure_allocated(
+        lambda: BankAccount(1000, 'BenchMemory'))) / (n * 10))
+    return results
+
+
+def _memory(size):
+    return {'unit': 'bytes', 'samples': [size], 'mean': size, 'median': size, 'min': size, 'max': size,
+            'stdev': 0.0, 'ci95': 0.0, 'higher_is_better': False}
+
+
+def run_suite(ops=20000, warmup=1, repeats=5, names=None, memory=True):
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        results = {name: measure(*CASES[name], ops, warmup, repeats)
+                   for name in (names if names is not None else CASES)}
+        if memory:
+            results.update(memory_results())
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'ops': ops,
+            'warmup': warmup,
+            'repeats': repeats,
+            'timestamp': time.time(),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=0.10):
+    # A benchmark regresses when its mean is worse than the baseline's by
+    # more than threshold and the two 95% confidence intervals do not
+    # overlap, so run-to-run noise alone is not flagged.
+    report = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        change = (result['mean'] - base['mean']) / base['mean'] if base['mean'] else 0.0
+        worse = -change if result['higher_is_better'] else change
+        separated = abs(result['mean'] - base['mean']) > result['ci95'] + base['ci95']
+        report.append({
+            'name': name,
+            'baseline': base['mean'],
+            'current': result['mean'],
+            'change': change,
+            'regression': worse > threshold and separated,
+            'improvement': -worse > threshold and separated,
+        })
+    return report
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark bank_accounts and compare against a baseline.')
+    parser.add_argument('--ops', type=int, default=20000)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--only', nargs='*', help='case names to run (default: all)')
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.ops, args.warmup, args.repeats, args.only, not args.no_memory)
+    if args.output:
+        save(results, args.output)
+    for name, result in results['results'].items():
+        print(f"{name:<36} {result['mean']:14.1f} {result['unit']:<8} ±{result['ci95']:.1f}")
+    if not args.baseline:
+        return 0
+    report = compare(results, load(args.baseline), args.threshold)
+    for row in report:
+        flag = 'REGRESSION' if row['regression'] else 'improved' if row['improvement'] else ''
+        print(f"{row['name']:<36} {row['change']:+8.1%} {flag}")
+    return 1 if any(row['regression'] for row in report) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
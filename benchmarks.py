@@ -0,0 +1,551 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import bank_accounts
+from accrual import EndOfDay
+from async_ledger import AsyncLedger
+from bank_accounts import BalanceException, BankAccount, SavingsAcct, open_accounts_bulk
+from bulk_io import export_columnar, export_csv, import_columnar, import_csv
+from concurrency import ThreadSafeBank
+from history_store import HistoryFile
+from idempotency import DedupCache, IdempotentBank
+from journal import TransactionJournal
+from ledger import DEPOSIT, TRANSFER, WITHDRAW, Ledger
+from metrics import Metrics
+from notifiers import SilentNotifier, StdoutNotifier
+from registry import AccountRegistry
+from rules import ACCOUNT, FAMILY, OPERATIONS, RuleEngine, VelocityRule
+from sharding import ShardedLedger
+from statements import stream_statements
+from wal import DurableStore, recover
+
+
+def run_transactions(n):
+    source = BankAccount(n * 10, 'BenchSource')
+    target = BankAccount(0, 'BenchTarget')
+    start = time.perf_counter()
+    for _ in range(n):
+        source.deposit(5)
+        source.withdraw(3)
+        source.transfer(1, target)
+    elapsed = time.perf_counter() - start
+    return n * 3 / elapsed
+
+
+def bench_notifiers(n=20000):
+    results = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for label, notifier in (('stdout', StdoutNotifier()), ('silent', SilentNotifier())):
+            bank_accounts.set_notifier(notifier)
+            try:
+                results[label] = run_transactions(n)
+            finally:
+                bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def measure_allocated(build):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def bench_journal_memory(n=200000):
+    actions = ('Deposit', 'Withdraw', 'Interest Deposit')
+
+    def build_list():
+        history = []
+        for i in range(n):
+            history.append((actions[i % 3], i * 1.5))
+        return history
+
+    def build_journal():
+        journal = TransactionJournal()
+        for i in range(n):
+            journal.append(actions[i % 3], i * 150)
+        return journal
+
+    return {
+        'list': measure_allocated(build_list) / n,
+        'journal': measure_allocated(build_journal) / n,
+    }
+
+
+def bench_account_opening(n=100000):
+    specs = [(100, f'Account{i}') for i in range(n)]
+    results = {}
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        start = time.perf_counter()
+        accounts = [BankAccount(*spec) for spec in specs]
+        results['constructor'] = n / (time.perf_counter() - start)
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    del accounts
+    start = time.perf_counter()
+    accounts = open_accounts_bulk(specs)
+    results['bulk'] = n / (time.perf_counter() - start)
+    del accounts
+    results['bytes_per_account'] = measure_allocated(lambda: open_accounts_bulk(specs)) / n
+    return results
+
+
+def money_operations(source, target, amount, n):
+    # deposit, withdraw and transfer on bare balances of one representation
+    start = time.perf_counter()
+    for _ in range(n):
+        source += amount
+        if source - amount >= 0:
+            source -= amount
+        if source >= amount:
+            source -= amount
+            target += amount
+    return n * 3 / (time.perf_counter() - start)
+
+
+def bench_money(n=200000):
+    return {
+        'float': money_operations(1e9, 0.0, 12.34, n),
+        'decimal': money_operations(Decimal('1e9'), Decimal(0), Decimal('12.34'), n),
+        'int_cents': money_operations(100000000000, 0, 1234, n),
+    }
+
+
+def bench_batch(n=100000, num_accounts=1000):
+    specs = [(1000000, f'Account{i}') for i in range(num_accounts)]
+    ids = [i % num_accounts for i in range(n)]
+    ops = [(DEPOSIT, WITHDRAW, TRANSFER)[i % 3] for i in range(n)]
+    amounts = [100 + i % 50 for i in range(n)]
+    targets = [(i * 7 + 1) % num_accounts for i in range(n)]
+    results = {}
+
+    accounts = open_accounts_bulk(specs)
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        start = time.perf_counter()
+        for i in range(n):
+            account = accounts[ids[i]]
+            amount = amounts[i] / 100
+            if ops[i] == DEPOSIT:
+                account.deposit(amount)
+            elif ops[i] == WITHDRAW:
+                account.withdraw(amount)
+            else:
+                account.transfer(amount, accounts[targets[i]])
+        results['scalar'] = n / (time.perf_counter() - start)
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+
+    ledger = Ledger(open_accounts_bulk(specs))
+    start = time.perf_counter()
+    ledger.apply_batch(ids, ops, amounts, targets)
+    results['batch'] = n / (time.perf_counter() - start)
+    return results
+
+
+def bench_concurrency(n=40000, num_accounts=100, worker_counts=(1, 2, 4, 8)):
+    results = {}
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        for workers in worker_counts:
+            bank = ThreadSafeBank()
+            accounts = open_accounts_bulk([(1000, f'Account{i}') for i in range(num_accounts)])
+            per_worker = n // workers
+
+            def run(seed):
+                for i in range(per_worker):
+                    source = accounts[(seed + i) % num_accounts]
+                    target = accounts[(seed + i * 7 + 1) % num_accounts]
+                    try:
+                        bank.transfer(source, 1, target)
+                    except BalanceException:
+                        pass
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(workers) as pool:
+                list(pool.map(run, range(workers)))
+            results[workers] = per_worker * workers / (time.perf_counter() - start)
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def bench_async(clients=10000, ops_per_client=5, num_accounts=1000):
+    results = {}
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        accounts = open_accounts_bulk([(1000, f'Account{i}') for i in range(num_accounts)])
+        start = time.perf_counter()
+        for client in range(clients):
+            for i in range(ops_per_client):
+                accounts[(client + i) % num_accounts].transfer(1, accounts[(client + i + 1) % num_accounts])
+        results['sync'] = clients * ops_per_client / (time.perf_counter() - start)
+
+        accounts = open_accounts_bulk([(1000, f'Account{i}') for i in range(num_accounts)])
+
+        async def client(ledger, client_id):
+            for i in range(ops_per_client):
+                await ledger.transfer(accounts[(client_id + i) % num_accounts], 1,
+                                      accounts[(client_id + i + 1) % num_accounts])
+
+        async def run():
+            async with AsyncLedger(queue_size=64) as ledger:
+                await asyncio.gather(*(client(ledger, i) for i in range(clients)))
+
+        start = time.perf_counter()
+        asyncio.run(run())
+        results['async'] = clients * ops_per_client / (time.perf_counter() - start)
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def bench_wal(n=200000, num_accounts=1000):
+    results = {}
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            store = DurableStore(directory).attach()
+            try:
+                accounts = open_accounts_bulk([(0, f'Account{i}') for i in range(num_accounts)])
+                start = time.perf_counter()
+                for i in range(n):
+                    accounts[i % num_accounts].deposit(1)
+                store.wal.commit()
+                results['writes_per_sec'] = n / (time.perf_counter() - start)
+            finally:
+                store.close()
+            start = time.perf_counter()
+            recover(directory)
+            elapsed = time.perf_counter() - start
+            results['recovery_entries_per_sec'] = (n + num_accounts) / elapsed
+            results['recovery_seconds_10m'] = 10000000 / results['recovery_entries_per_sec']
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def bench_history_ranges(n=1000000, reads=2000, span=100):
+    history = TransactionJournal()
+    for i in range(n):
+        history.restore(i + 1, float(i), 'Deposit', 100)
+    results = {'ram_bytes_before': history.nbytes()}
+    with tempfile.TemporaryDirectory() as directory:
+        archive = HistoryFile(os.path.join(directory, 'bench.hist'))
+        try:
+            history.spill(archive)
+            results['ram_bytes_after'] = history.nbytes()
+            step = (n - span) // reads
+            start = time.perf_counter()
+            for i in range(reads):
+                list(history.entries(i * step, i * step + span))
+            results['range_reads_per_sec'] = reads / (time.perf_counter() - start)
+            start = time.perf_counter()
+            for i in range(reads):
+                history.index_of_time(float(i * step))
+            results['time_lookups_per_sec'] = reads / (time.perf_counter() - start)
+        finally:
+            archive.close()
+    return results
+
+
+def bench_stats(n=100000, queries=200):
+    account, = open_accounts_bulk([(0, 'StatsAccount')])
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        for _ in range(n):
+            account.deposit(1)
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    results = {}
+    start = time.perf_counter()
+    for _ in range(queries):
+        sum(amount for action, amount in account.transaction_history if action == 'Deposit')
+    results['history_scan'] = queries / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(queries):
+        account.stats()['actions']['Deposit']['total']
+    results['stats'] = queries / (time.perf_counter() - start)
+    return results
+
+
+def bench_sharding(n=100000, num_accounts=1000, batch_size=1000, shard_counts=(1, 2, 4)):
+    # Transfers between random-looking account pairs, so most of them cross
+    # shards once there is more than one. Throughput only scales with the
+    # shard count on machines with that many free cores.
+    results = {}
+    names = [f'Account{i}' for i in range(num_accounts)]
+    ops = [('transfer', names[i % num_accounts], 1, names[(i * 7 + 3) % num_accounts]) for i in range(n)]
+    for shards in shard_counts:
+        with ShardedLedger(num_shards=shards) as ledger:
+            for name in names:
+                ledger.open(BankAccount, 1000000, name)
+            start = time.perf_counter()
+            for i in range(0, n, batch_size):
+                ledger.submit(ops[i:i + batch_size])
+            results[shards] = n / (time.perf_counter() - start)
+    return results
+
+
+def bench_end_of_day(n=200000, target=10000000, time_budget=600.0):
+    # Measures a full interest + fee run over n savings accounts and
+    # extrapolates it to target accounts against time_budget seconds.
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        accounts = open_accounts_bulk([(1000 + i % 5000, f'Account{i}', 1, 100) for i in range(n)], SavingsAcct)
+        engine = EndOfDay(accounts, annual_rate_bp=200, maintenance_fee=2)
+        report = engine.run(charge_fees=True)
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    rate = n / report['elapsed']
+    return {
+        'accounts_per_sec': rate,
+        'projected_seconds': target / rate,
+        'within_budget': target / rate <= time_budget,
+    }
+
+
+def bench_bulk_io(n=1000000, num_accounts=10000, target=50000000):
+    # Import rates for n history entries in each format, with the time a
+    # target-entry load would take at that rate.
+    results = {}
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        accounts = open_accounts_bulk([(1000000, f'Account{i}') for i in range(num_accounts)])
+        for i in range(n - num_accounts):
+            accounts[i % num_accounts].deposit(1)
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, name) for name in ('accounts.csv', 'entries.csv', 'accounts.col')]
+            export_csv(accounts, paths[0], paths[1])
+            export_columnar(accounts, paths[2])
+            del accounts
+            for label, load in (('csv', lambda: import_csv(paths[0], paths[1])),
+                                ('columnar', lambda: import_columnar(paths[2]))):
+                start = time.perf_counter()
+                load()
+                rate = n / (time.perf_counter() - start)
+                results[label] = {'entries_per_sec': rate, 'projected_seconds': target / rate}
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def bench_metrics(n=20000):
+    # Same mix as bench_notifiers with instrumentation off and on.
+    results = {}
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        results['disabled'] = run_transactions(n)
+        with Metrics():
+            results['enabled'] = run_transactions(n)
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def bench_idempotency(n=100000, maxsize=100000):
+    # Memory per cached key at a full cache, cost of a repeated-key lookup,
+    # and keyed vs plain deposits.
+    results = {}
+    cache = DedupCache(maxsize=maxsize)
+    outcome = (True, None)
+    results['bytes_per_key'] = measure_allocated(
+        lambda: [cache.put(f'request-{i}', ('deposit', i, 100), outcome) for i in range(maxsize)]) / maxsize
+    keys = [f'request-{i}' for i in range(0, maxsize, 7)]
+    start = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    results['lookup_ns'] = (time.perf_counter() - start) / len(keys) * 1e9
+
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        account = BankAccount(0, 'BenchIdempotent')
+        start = time.perf_counter()
+        for i in range(n):
+            account.deposit(1)
+        results['plain'] = n / (time.perf_counter() - start)
+        bank = IdempotentBank(DedupCache(maxsize=maxsize))
+        start = time.perf_counter()
+        for i in range(n):
+            bank.deposit(account, 1, i)
+        results['keyed'] = n / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for i in range(n):
+            bank.deposit(account, 1, i)
+        results['retried'] = n / (time.perf_counter() - start)
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def bench_registry(population=200000, capacity=20000, lookups=100000):
+    # Lookups served from the resident working set vs ones that reload an
+    # evicted account from the store.
+    results = {}
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            registry = AccountRegistry(directory, capacity=capacity).attach()
+            try:
+                start = time.perf_counter()
+                ids = [BankAccount(1000, f'Account{i}').account_id for i in range(population)]
+                results['register_per_sec'] = population / (time.perf_counter() - start)
+                hot = ids[-capacity // 2:]
+                start = time.perf_counter()
+                for i in range(lookups):
+                    registry.get(hot[i % len(hot)])
+                results['hot_per_sec'] = lookups / (time.perf_counter() - start)
+                cold = ids[:population - capacity]
+                start = time.perf_counter()
+                for i in range(0, lookups * 7, 7):
+                    registry.get(cold[i % len(cold)])
+                results['cold_per_sec'] = lookups / (time.perf_counter() - start)
+                results['resident'] = len(registry.resident)
+            finally:
+                registry.close()
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def bench_point_in_time(n=1000000, queries=2000, num_accounts=100000):
+    # Point-in-time balances on one long history, with checkpoints vs a
+    # replay from the first entry, then statement throughput.
+    results = {}
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        account = BankAccount(0, 'BenchHistory')
+        for i in range(n):
+            account.deposit(1)
+        history = account.transaction_history
+        stamps = [history.timestamps[(i * 7919) % n] for i in range(queries)]
+        start = time.perf_counter()
+        for stamp in stamps:
+            account.balance_at(stamp)
+        results['checkpointed_per_sec'] = queries / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for stamp in stamps[:20]:
+            balance = 0
+            for seq, timestamp, code, cents in history.raw_entries(0, history.index_of_time(stamp) + 1):
+                balance += cents
+        results['replay_per_sec'] = 20 / (time.perf_counter() - start)
+
+        accounts = open_accounts_bulk([(1000, f'Account{i}') for i in range(num_accounts)])
+        for i in range(num_accounts * 5):
+            accounts[i % num_accounts].deposit(1)
+        start = time.perf_counter()
+        for report in stream_statements(accounts, 0.0, time.time() + 1):
+            pass
+        results['statements_per_sec'] = num_accounts / (time.perf_counter() - start)
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def bench_rules(n=30000, families=100, windows=10):
+    # Mixed withdraw / transfer / transfer_to_parent traffic over parents
+    # with two children each, plain and with 3 operations x 2 scopes x
+    # windows x (count, amount) rules attached. None of the limits is hit.
+    rules = [VelocityRule(f'{operation}.{scope}.{minutes}m.{kind}', operation, minutes * 60.0,
+                          scope=scope, **{kind: 10 ** 9})
+             for operation in OPERATIONS for scope in (ACCOUNT, FAMILY)
+             for minutes in range(1, windows + 1) for kind in ('max_count', 'max_amount')]
+    results = {'rule_count': len(rules)}
+    bank_accounts.set_notifier(SilentNotifier())
+    try:
+        def traffic(label):
+            parents = [BankAccount(10 ** 6, 'BenchParent') for _ in range(families)]
+            children = [parent.create_child_account(10 ** 6, 'BenchChild') for parent in parents for _ in range(2)]
+            start = time.perf_counter()
+            for i in range(n):
+                child = children[i % len(children)]
+                op = i % 3
+                if op == 0:
+                    child.withdraw(1)
+                elif op == 1:
+                    child.transfer(1, parents[i % families])
+                else:
+                    child.transfer_to_parent(1)
+            results[label] = n / (time.perf_counter() - start)
+
+        traffic('plain')
+        with RuleEngine(rules) as engine:
+            results['groups'] = sum(len(groups) for groups in engine.compiled.values())
+            traffic('rules')
+            # Windows now hold every event above; the cost per check must not grow.
+            traffic('rules_full')
+    finally:
+        bank_accounts.set_notifier(StdoutNotifier())
+    return results
+
+
+def main():
+    results = bench_notifiers()
+    for label, rate in results.items():
+        print(f"{label:>8}: {rate:12.0f} transactions/sec")
+    print(f" speedup: {results['silent'] / results['stdout']:.1f}x")
+    for label, size in bench_journal_memory().items():
+        print(f"{label:>8}: {size:12.1f} bytes/entry")
+    for label, rate in bench_money().items():
+        print(f"{label:>9}: {rate:12.0f} money ops/sec")
+    for label, rate in bench_batch().items():
+        print(f"{label:>8}: {rate:12.0f} ops/sec")
+    for workers, rate in bench_concurrency().items():
+        print(f"{workers:>3} thr.: {rate:12.0f} locked transfers/sec")
+    for label, rate in bench_async().items():
+        print(f"{label:>8}: {rate:12.0f} transfers/sec (10k clients)")
+    durability = bench_wal()
+    print(f"     wal: {durability['writes_per_sec']:12.0f} durable deposits/sec")
+    print(f" recover: {durability['recovery_entries_per_sec']:12.0f} entries/sec "
+          f"(~{durability['recovery_seconds_10m']:.0f}s for 10M)")
+    ranges = bench_history_ranges()
+    print(f" history: {ranges['ram_bytes_before']:12d} -> {ranges['ram_bytes_after']} RAM bytes after spill")
+    print(f"   range: {ranges['range_reads_per_sec']:12.0f} 100-entry reads/sec")
+    print(f"  lookup: {ranges['time_lookups_per_sec']:12.0f} time lookups/sec")
+    for label, rate in bench_stats().items():
+        print(f"{label:>12}: {rate:10.0f} total-deposit queries/sec")
+    for shards, rate in bench_sharding().items():
+        print(f"{shards:>3} shd.: {rate:12.0f} sharded transfers/sec")
+    eod = bench_end_of_day()
+    print(f"     eod: {eod['accounts_per_sec']:12.0f} accounts/sec "
+          f"(~{eod['projected_seconds']:.0f}s for 10M, within budget: {eod['within_budget']})")
+    for label, load in bench_bulk_io().items():
+        print(f"{label:>8}: {load['entries_per_sec']:12.0f} imported entries/sec "
+              f"(~{load['projected_seconds']:.0f}s for 50M)")
+    instrumented = bench_metrics()
+    for label, rate in instrumented.items():
+        print(f"{label:>8}: {rate:12.0f} transactions/sec (metrics)")
+    print(f"overhead: {instrumented['disabled'] / instrumented['enabled'] - 1:12.1%}")
+    idempotency = bench_idempotency()
+    print(f"   dedup: {idempotency['bytes_per_key']:12.1f} bytes/key, {idempotency['lookup_ns']:.0f} ns/lookup")
+    for label in ('plain', 'keyed', 'retried'):
+        print(f"{label:>8}: {idempotency[label]:12.0f} deposits/sec")
+    lookups = bench_registry()
+    print(f"registry: {lookups['hot_per_sec']:12.0f} resident lookups/sec")
+    print(f"  reload: {lookups['cold_per_sec']:12.0f} cold lookups/sec ({lookups['resident']} resident)")
+    for label, rate in bench_point_in_time().items():
+        print(f"{label:>20}: {rate:10.0f}/sec")
+    limits = bench_rules()
+    print(f"   rules: {limits['rule_count']:12d} rules in {limits['groups']} groups")
+    for label in ('plain', 'rules', 'rules_full'):
+        print(f"{label:>10}: {limits[label]:10.0f} checked operations/sec")
+    opening = bench_account_opening()
+    print(f"    open: {opening['constructor']:12.0f} accounts/sec (constructor, silent)")
+    print(f"    bulk: {opening['bulk']:12.0f} accounts/sec")
+    print(f"  memory: {opening['bytes_per_account']:12.1f} bytes/account")
+
+
+if __name__ == '__main__':
+    main()
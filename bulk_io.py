@@ -0,0 +1,362 @@
+import csv
+import math
+import struct
+import sys
+import zlib
+from array import array
+from decimal import Decimal
+
+import bank_accounts
+import journal
+from history_store import spill_history
+from journal import CHECKPOINT_EVERY, MEMO_CODES, OPENING_CODE, action_code
+from ledger import KIND_CHILD, account_kind
+from money import from_cents, to_cents
+from wal import ACCOUNT_CLASSES, CRC, FRAME, blank_account, frame
+
+
+MAGIC = b'BANKCOL1'
+
+# Frame types of the columnar format. Every chunk holds a row count and
+# then one packed little-endian column after another.
+ACTIONS = 1
+ACCOUNTS = 2
+ENTRIES = 3
+CHECKPOINTS = 4
+
+COUNT = struct.Struct('<I')
+ACTION_RECORD = struct.Struct('<H')
+ACCOUNT_COLUMNS = 'QBqqqQBI'   # id, kind, balance, min balance, fee, parent id, blocked, name length
+ENTRY_COLUMNS = 'QQdHq'        # account id, seq, timestamp, action code, cents
+CHECKPOINT_COLUMNS = 'QQq'     # account id, entry index, balance after the entry
+
+ACCOUNT_FIELDS = ['account_id', 'type', 'name', 'balance', 'min_balance', 'fee', 'parent_id', 'blocked']
+ENTRY_FIELDS = ['account_id', 'seq', 'timestamp', 'action', 'amount']
+
+KINDS_BY_NAME = {cls.__name__: kind for kind, cls in ACCOUNT_CLASSES.items()}
+
+
+def _parent_id(account):
+    parent = getattr(account, 'parent_account', None)
+    return parent.account_id if parent is not None else 0
+
+
+def _history_chunks(accounts, chunk_size):
+    # Yields (account ids, seqs, timestamps, codes, cents) columns of at
+    # most chunk_size entries, reading spilled history from its archive.
+    columns = [array(typecode) for typecode in ENTRY_COLUMNS]
+    ids, seqs, timestamps, codes, amounts = columns
+    for account in accounts:
+        account_id = account.account_id
+        for seq, timestamp, code, cents in account.transaction_history.raw_entries():
+            ids.append(account_id)
+            seqs.append(seq)
+            timestamps.append(timestamp)
+            codes.append(code)
+            amounts.append(cents)
+            if len(ids) >= chunk_size:
+                yield columns
+                columns = [array(typecode) for typecode in ENTRY_COLUMNS]
+                ids, seqs, timestamps, codes, amounts = columns
+    if ids:
+        yield columns
+
+
+class _Loader:
+    # Builds accounts straight from exported state, skipping __init__ and
+    # the per-call notifications, while checking what the constructors and
+    # methods would otherwise guarantee: unique ids, known account types,
+    # valid parents, and per-account histories that start with
+    # 'Account opened' and only move forward in sequence and time.
+    def __init__(self, history_dir=None):
+        self.accounts = {}
+        self.parents = {}
+        self.positions = {}
+        self.history_dir = history_dir
+        self.touched = {}
+        self.checkpointed = set()
+        self.last_seq = 0
+
+    def add_account(self, kind, account_id, name, balance, min_balance, fee, parent_id, blocked):
+        if account_id in self.accounts:
+            raise ValueError(f"Duplicate account id {account_id}.")
+        if kind not in ACCOUNT_CLASSES:
+            raise ValueError(f"Unknown account type {kind} for account {account_id}.")
+        account = blank_account(kind, account_id, name, min_balance, fee)
+        account._balance = balance
+        account.is_blocked = blocked
+        if kind == KIND_CHILD:
+            if not parent_id:
+                raise ValueError(f"Child account {account_id} has no parent.")
+            self.parents[account_id] = parent_id
+        self.accounts[account_id] = account
+
+    def add_entries(self, ids, seqs, timestamps, codes, amounts):
+        start = 0
+        count = len(ids)
+        while start < count:
+            account_id = ids[start]
+            stop = start + 1
+            while stop < count and ids[stop] == account_id:
+                stop += 1
+            self._add_run(account_id, seqs[start:stop], timestamps[start:stop],
+                          codes[start:stop], amounts[start:stop])
+            start = stop
+        if self.history_dir is not None:
+            spill_history(self.touched.values(), self.history_dir)
+            self.touched.clear()
+
+    def _add_run(self, account_id, seqs, timestamps, codes, amounts):
+        account = self.accounts.get(account_id)
+        if account is None:
+            raise ValueError(f"History entry for unknown account {account_id}.")
+        last_seq, last_timestamp, balance = self.positions.get(account_id, (0, -math.inf, None))
+        stats = account._stats
+        fee = getattr(account, '_fee', 0)
+        fee_code = journal.ACTION_CODES.get('Withdraw with Fee')
+        maintenance_code = journal.ACTION_CODES.get('Maintenance Fee')
+        history = account.transaction_history
+        checkpoints = []
+        index = len(history)
+        for seq, timestamp, code, cents in zip(seqs, timestamps, codes, amounts):
+            if seq <= last_seq or timestamp < last_timestamp:
+                raise ValueError(f"History of account {account_id} is out of order at sequence {seq}.")
+            if code == OPENING_CODE:
+                if balance is not None:
+                    raise ValueError(f"Account {account_id} is opened twice.")
+                balance = cents
+            elif balance is None:
+                raise ValueError(f"History of account {account_id} must start with 'Account opened'.")
+            elif code not in MEMO_CODES:
+                balance += cents
+            stats.record(code, cents, balance, timestamp)
+            if code == fee_code:
+                stats.record_fee(fee)
+            elif code == maintenance_code:
+                stats.record_fee(-cents)
+            last_seq = seq
+            last_timestamp = timestamp
+            index += 1
+            if not index % CHECKPOINT_EVERY:
+                checkpoints.append((index - 1, balance))
+        history.extend(seqs, timestamps, codes, amounts)
+        for checkpoint_index, checkpoint_balance in checkpoints:
+            history.checkpoint_index.append(checkpoint_index)
+            history.checkpoint_balance.append(checkpoint_balance)
+        self.positions[account_id] = (last_seq, last_timestamp, balance)
+        self.last_seq = max(self.last_seq, last_seq)
+        self.touched[account_id] = account
+
+    def add_checkpoints(self, ids, indexes, balances):
+        # Exported checkpoints replace the ones derived from the entries.
+        for account_id, index, balance in zip(ids, indexes, balances):
+            account = self.accounts.get(account_id)
+            if account is None:
+                raise ValueError(f"Checkpoint for unknown account {account_id}.")
+            history = account.transaction_history
+            if account_id not in self.checkpointed:
+                self.checkpointed.add(account_id)
+                del history.checkpoint_index[:]
+                del history.checkpoint_balance[:]
+            if index >= len(history) or (history.checkpoint_index and index <= history.checkpoint_index[-1]):
+                raise ValueError(f"Checkpoint {index} of account {account_id} is out of order.")
+            history.checkpoint_index.append(index)
+            history.checkpoint_balance.append(balance)
+
+    def finish(self):
+        accounts = self.accounts
+        for account_id, parent_id in self.parents.items():
+            if parent_id not in accounts:
+                raise ValueError(f"Parent {parent_id} of account {account_id} is missing.")
+            seen = {account_id}
+            ancestor = parent_id
+            while ancestor in self.parents:
+                if ancestor in seen:
+                    raise ValueError(f"Parent links of account {account_id} form a cycle.")
+                seen.add(ancestor)
+                ancestor = self.parents[ancestor]
+        # The exported balance is authoritative, as it is for a WAL STATE
+        # record: it may have been set directly without a journal entry.
+        for account_id, account in accounts.items():
+            position = self.positions.get(account_id)
+            if position is not None and position[2] != account._balance:
+                account.transaction_history.checkpoint(account._balance)
+            account._stats.sync_balance(account._balance)
+        for account_id, parent_id in self.parents.items():
+            account = accounts[account_id]
+            account.parent_account = accounts[parent_id]
+            account._stats.attach(account.parent_account._stats)
+        if accounts:
+            bank_accounts.advance_account_ids(max(accounts))
+        journal.advance_sequence(self.last_seq)
+        return accounts
+
+
+def export_csv(accounts, accounts_path, transactions_path, chunk_size=65536):
+    accounts = list(accounts)
+    with open(accounts_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(ACCOUNT_FIELDS)
+        writer.writerows([account.account_id, type(account).__name__, account.name,
+                          from_cents(account._balance), from_cents(account._min_balance),
+                          from_cents(getattr(account, '_fee', 0)), _parent_id(account),
+                          int(account.is_blocked)] for account in accounts)
+    actions = journal.ACTIONS
+    with open(transactions_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(ENTRY_FIELDS)
+        for ids, seqs, timestamps, codes, amounts in _history_chunks(accounts, chunk_size):
+            writer.writerows(zip(ids, seqs, map(repr, timestamps), (actions[code] for code in codes),
+                                 map(from_cents, amounts)))
+
+
+def import_csv(accounts_path, transactions_path=None, chunk_size=65536, history_dir=None):
+    # Streams the transaction file in chunks of chunk_size rows; with
+    # history_dir set, each chunk is spilled to history files so memory
+    # stays bounded by the chunk rather than the whole history.
+    loader = _Loader(history_dir)
+    with open(accounts_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        if next(reader, None) != ACCOUNT_FIELDS:
+            raise ValueError(f"{accounts_path} does not start with the account header.")
+        for account_id, type_name, name, balance, min_balance, fee, parent_id, blocked in reader:
+            kind = KINDS_BY_NAME.get(type_name)
+            if kind is None:
+                raise ValueError(f"Unknown account type {type_name!r} for account {account_id}.")
+            loader.add_account(kind, int(account_id), name, to_cents(Decimal(balance)),
+                               to_cents(Decimal(min_balance)), to_cents(Decimal(fee)),
+                               int(parent_id), blocked == '1')
+    if transactions_path is not None:
+        with open(transactions_path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            if next(reader, None) != ENTRY_FIELDS:
+                raise ValueError(f"{transactions_path} does not start with the transaction header.")
+            columns = [array(typecode) for typecode in ENTRY_COLUMNS]
+            for account_id, seq, timestamp, action, amount in reader:
+                columns[0].append(int(account_id))
+                columns[1].append(int(seq))
+                columns[2].append(float(timestamp))
+                columns[3].append(action_code(action))
+                columns[4].append(to_cents(Decimal(amount)))
+                if len(columns[0]) >= chunk_size:
+                    loader.add_entries(*columns)
+                    columns = [array(typecode) for typecode in ENTRY_COLUMNS]
+            if columns[0]:
+                loader.add_entries(*columns)
+    return loader.finish()
+
+
+def _pack_columns(columns):
+    parts = [COUNT.pack(len(columns[0]))]
+    for column in columns:
+        if sys.byteorder == 'big':
+            column = array(column.typecode, column)
+            column.byteswap()
+        parts.append(column.tobytes())
+    return b''.join(parts)
+
+
+def _unpack_columns(payload, typecodes):
+    count, = COUNT.unpack_from(payload)
+    offset = COUNT.size
+    columns = []
+    for typecode in typecodes:
+        column = array(typecode)
+        size = column.itemsize * count
+        if offset + size > len(payload):
+            raise ValueError("Truncated column chunk.")
+        column.frombytes(payload[offset:offset + size])
+        if sys.byteorder == 'big':
+            column.byteswap()
+        columns.append(column)
+        offset += size
+    return columns, payload[offset:]
+
+
+def _read_frames(f):
+    # Unlike wal.read_frames, a bad or torn frame is an error here: an
+    # export is only ever read after it was completely written.
+    while True:
+        header = f.read(FRAME.size)
+        if not header:
+            return
+        if len(header) < FRAME.size:
+            raise ValueError("Truncated frame header.")
+        length, record_type = FRAME.unpack(header)
+        payload = f.read(length)
+        crc = f.read(CRC.size)
+        if len(payload) < length or len(crc) < CRC.size:
+            raise ValueError("Truncated frame.")
+        if CRC.unpack(crc)[0] != zlib.crc32(header[4:] + payload):
+            raise ValueError("Frame checksum mismatch.")
+        yield record_type, payload
+
+
+def export_columnar(accounts, path, chunk_size=65536):
+    accounts = list(accounts)
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(b''.join(frame(ACTIONS, ACTION_RECORD.pack(code) + name.encode('utf-8'))
+                         for code, name in enumerate(journal.ACTIONS)))
+        for start in range(0, len(accounts), chunk_size):
+            chunk = accounts[start:start + chunk_size]
+            names = [account.name.encode('utf-8') for account in chunk]
+            columns = [
+                array('Q', [account.account_id for account in chunk]),
+                array('B', [account_kind(account) for account in chunk]),
+                array('q', [account._balance for account in chunk]),
+                array('q', [account._min_balance for account in chunk]),
+                array('q', [getattr(account, '_fee', 0) for account in chunk]),
+                array('Q', [_parent_id(account) for account in chunk]),
+                array('B', [account.is_blocked for account in chunk]),
+                array('I', [len(name) for name in names]),
+            ]
+            f.write(frame(ACCOUNTS, _pack_columns(columns) + b''.join(names)))
+        for columns in _history_chunks(accounts, chunk_size):
+            f.write(frame(ENTRIES, _pack_columns(columns)))
+        # Checkpoints carry balances set without a journal entry, which a
+        # replay of the entries alone would miss.
+        for start in range(0, len(accounts), chunk_size):
+            columns = [array(typecode) for typecode in CHECKPOINT_COLUMNS]
+            for account in accounts[start:start + chunk_size]:
+                history = account.transaction_history
+                columns[0].extend([account.account_id] * len(history.checkpoint_index))
+                columns[1].extend(history.checkpoint_index)
+                columns[2].extend(history.checkpoint_balance)
+            if columns[0]:
+                f.write(frame(CHECKPOINTS, _pack_columns(columns)))
+
+
+def import_columnar(path, history_dir=None):
+    loader = _Loader(history_dir)
+    codes_by_file = {}
+    remap = False
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a columnar account export.")
+        for record_type, payload in _read_frames(f):
+            if record_type == ACCOUNTS:
+                columns, names = _unpack_columns(payload, ACCOUNT_COLUMNS)
+                offset = 0
+                for account_id, kind, balance, min_balance, fee, parent_id, blocked, length in zip(*columns):
+                    name = names[offset:offset + length].decode('utf-8')
+                    offset += length
+                    loader.add_account(kind, account_id, name, balance, min_balance, fee, parent_id,
+                                       bool(blocked))
+            elif record_type == ENTRIES:
+                ids, seqs, timestamps, codes, amounts = _unpack_columns(payload, ENTRY_COLUMNS)[0]
+                unknown = set(codes).difference(codes_by_file)
+                if unknown:
+                    raise ValueError(f"Unknown action code {min(unknown)}.")
+                if remap:
+                    codes = array('H', [codes_by_file[code] for code in codes])
+                loader.add_entries(ids, seqs, timestamps, codes, amounts)
+            elif record_type == CHECKPOINTS:
+                loader.add_checkpoints(*_unpack_columns(payload, CHECKPOINT_COLUMNS)[0])
+            elif record_type == ACTIONS:
+                code, = ACTION_RECORD.unpack_from(payload)
+                codes_by_file[code] = action_code(payload[ACTION_RECORD.size:].decode('utf-8'))
+                remap = remap or codes_by_file[code] != code
+            else:
+                raise ValueError(f"Unknown frame type {record_type}.")
+    return loader.finish()
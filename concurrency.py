@@ -0,0 +1,62 @@
+import threading
+from contextlib import contextmanager
+
+
+class StripedLocks:
+    # Accounts map onto a fixed pool of re-entrant locks by account_id.
+    # Multi-account operations take their stripes in ascending index order,
+    # so two transfers in opposite directions can never deadlock.
+    def __init__(self, stripes=1024):
+        self.locks = [threading.RLock() for _ in range(stripes)]
+
+    def stripe(self, account):
+        return account.account_id % len(self.locks)
+
+    @contextmanager
+    def hold(self, *accounts):
+        locks = self.locks
+        stripes = sorted({self.stripe(account) for account in accounts})
+        for index in stripes:
+            locks[index].acquire()
+        try:
+            yield
+        finally:
+            for index in reversed(stripes):
+                locks[index].release()
+
+
+class ThreadSafeBank:
+    def __init__(self, locks=None):
+        self.locks = locks if locks is not None else StripedLocks()
+
+    def balance(self, account):
+        with self.locks.hold(account):
+            return account.balance
+
+    def deposit(self, account, amount):
+        with self.locks.hold(account):
+            account.deposit(amount)
+
+    def withdraw(self, account, amount):
+        with self.locks.hold(account):
+            account.withdraw(amount)
+
+    def transfer(self, account, amount, target):
+        with self.locks.hold(account, target):
+            account.transfer(amount, target)
+
+    def transfer_to_parent(self, account, amount):
+        with self.locks.hold(account, account.parent_account):
+            account.transfer_to_parent(amount)
+
+    def create_child_account(self, account, initial_amount, child_name):
+        with self.locks.hold(account):
+            return account.create_child_account(initial_amount, child_name)
+
+    def unblock_account(self, account):
+        with self.locks.hold(account):
+            account.unblock_account()
+
+    def close_account(self, account):
+        with self.locks.hold(account):
+            account.close_account()
@@ -0,0 +1,113 @@
+import bank_accounts
+from bank_accounts import BalanceException, ChildAccount
+from ledger import OK, TRANSFER_TO_PARENT, Ledger
+from money import from_cents
+
+
+class HierarchyRegistry:
+    # Indexes parent -> children by account_id as child accounts are opened.
+    # Each parent's children are a dict keyed by account_id, so registering
+    # is O(1) and the children keep their opening order.
+    # Family balances come from the family aggregate each account's stats
+    # already keep, so they never require walking the tree.
+    def __init__(self, accounts=()):
+        self.children_by_parent = {}
+        self.index(accounts)
+
+    def attach(self):
+        bank_accounts.add_listener(self)
+        return self
+
+    def detach(self):
+        bank_accounts.remove_listener(self)
+
+    def index(self, accounts):
+        for account in accounts:
+            self.register(account)
+
+    def register(self, account):
+        if isinstance(account, ChildAccount) and account.parent_account is not None:
+            siblings = self.children_by_parent.setdefault(account.parent_account.account_id, {})
+            siblings.setdefault(account.account_id, account)
+
+    def on_transaction(self, account, action, cents):
+        if action == 'Account opened':
+            self.register(account)
+
+    def on_state(self, account):
+        pass
+
+    def children(self, account):
+        return list(self.children_by_parent.get(account.account_id, {}).values())
+
+    def descendants(self, account):
+        stack = self.children(account)[::-1]
+        while stack:
+            child = stack.pop()
+            yield child
+            stack.extend(reversed(self.children(child)))
+
+    def family_balance(self, account):
+        stats = account._stats
+        return from_cents((stats.family if stats.family is not None else stats).balance)
+
+    def sweep_to_parent(self, parent, recursive=False, locks=None):
+        # Moves every child's balance above its minimum into parent as
+        # 'Transfer to Parent' operations. With recursive=True grandchildren
+        # are swept into their own parents first, level by level, so the
+        # whole family ends up in parent. Everything is validated before the
+        # first transfer and applied in one batch per level, under locks
+        # (a concurrency.StripedLocks) when given. Returns the amount swept.
+        levels = [self.children(parent)]
+        if recursive:
+            while True:
+                below = [child for account in levels[-1] for child in self.children(account)]
+                if not below:
+                    break
+                levels.append(below)
+        family = [parent] + [account for level in levels for account in level]
+        if locks is None:
+            return self._sweep(levels, parent)
+        with locks.hold(*family):
+            return self._sweep(levels, parent)
+
+    def _sweep(self, levels, parent):
+        receivers = {parent.account_id: parent}
+        for level in levels[1:]:
+            receivers.update((child.parent_account.account_id, child.parent_account) for child in level)
+        blocked = [account.name for account in receivers.values() if account.is_blocked]
+        if blocked:
+            raise BalanceException(f"Cannot sweep into blocked account(s): {', '.join(blocked)}.")
+        # Every level's amounts are worked out up front, counting what each
+        # account receives from the level below, so the guards (velocity
+        # rules and the like) can refuse the sweep before any money moves.
+        # A negative minimum is not swept below zero: the transfer could
+        # not cover it and would fail part way through the sweep.
+        balances = {}
+        plan = []
+        for level in reversed(levels):
+            moves = []
+            for child in level:
+                balance = balances.get(child.account_id, child._balance)
+                floor = max(child._min_balance, 0)
+                if not child.is_blocked and balance > floor:
+                    amount = balance - floor
+                    moves.append((child, amount))
+                    receiver = child.parent_account
+                    balances[receiver.account_id] = balances.get(receiver.account_id, receiver._balance) + amount
+            plan.append(moves)
+        bank_accounts.check_guards([check for moves in plan for child, amount in moves
+                                    for check in ((child, 'transfer_to_parent', amount, child.parent_account),
+                                                  (child, 'withdraw', amount, None))])
+        swept = 0
+        for level, moves in zip(reversed(levels), plan):
+            if not moves:
+                continue
+            ledger = Ledger(child for child, _ in moves)
+            amounts = [amount for _, amount in moves]
+            results = ledger.apply_batch(range(len(amounts)), [TRANSFER_TO_PARENT] * len(amounts), amounts)
+            if any(result != OK for result in results):
+                raise RuntimeError("Sweep transfer failed after validation.")
+            if level is levels[0]:
+                swept = sum(amounts)
+        return from_cents(swept)
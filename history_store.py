@@ -0,0 +1,164 @@
+import mmap
+import os
+import struct
+from collections import OrderedDict
+
+import journal
+from money import from_cents
+
+
+RECORD = struct.Struct('<QdqH6x')   # seq, timestamp, cents, action code; 32 bytes per entry
+SEQ = struct.Struct('<Q')
+TIMESTAMP = struct.Struct('<8xd')
+
+# Archives are opened on first use and at most MAX_OPEN_FILES of them stay
+# open, holding two descriptors each (the file and its mapping's copy); the
+# least recently used is closed to make room and reopens transparently when
+# it is next read or extended.
+MAX_OPEN_FILES = 128
+_open_files = OrderedDict()
+
+
+def _unmap(mapping):
+    try:
+        mapping.close()
+    except BufferError:
+        # A view or a partly consumed generator still points into the
+        # mapping; it is unmapped once they are released.
+        pass
+
+
+class HistoryFile:
+    # Fixed-size records in a memory-mapped file. Sequence numbers and
+    # timestamps only grow, so both can be binary searched in place and
+    # range reads touch only the pages they return.
+    def __init__(self, path, truncate=False):
+        # truncate=True starts a new archive even if an old file is in the way.
+        self.path = path
+        self.file = None
+        self.map = None
+        with open(path, 'a+b') as f:
+            if truncate:
+                f.truncate(0)
+            self.count = os.fstat(f.fileno()).st_size // RECORD.size
+
+    def _open(self):
+        if self.file is not None:
+            _open_files.move_to_end(self)
+            return
+        while len(_open_files) >= MAX_OPEN_FILES:
+            next(iter(_open_files)).close()
+        self.file = open(self.path, 'a+b')
+        _open_files[self] = None
+        self._remap()
+
+    def _mapped(self):
+        self._open()
+        return self.map
+
+    def _remap(self):
+        old = self.map
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = size // RECORD.size
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ) if size else None
+        if old is not None:
+            _unmap(old)
+
+    def extend(self, records):
+        # records yields (seq, timestamp, action code, cents) tuples. If the
+        # file cannot be remapped the write is undone, so the caller's
+        # records are never left both on disk and in memory.
+        pack = RECORD.pack
+        data = b''.join(pack(seq, timestamp, cents, code) for seq, timestamp, code, cents in records)
+        self._open()
+        size = self.count * RECORD.size
+        try:
+            self.file.write(data)
+            self.file.flush()
+            self._remap()
+        except BaseException:
+            self.file.truncate(size)
+            raise
+
+    def close(self):
+        # Releases the file and mapping; the archive stays usable and is
+        # reopened on demand.
+        if self.file is None:
+            return
+        _open_files.pop(self, None)
+        if self.map is not None:
+            _unmap(self.map)
+            self.map = None
+        self.file.close()
+        self.file = None
+
+    def __len__(self):
+        return self.count
+
+    def _check_range(self, start, stop):
+        start, stop, _ = slice(start, stop).indices(self.count)
+        return start, max(start, stop)
+
+    def view(self, start=0, stop=None):
+        # Zero-copy window over the raw records.
+        start, stop = self._check_range(start, stop)
+        if start == stop:
+            return memoryview(b'')
+        return memoryview(self._mapped())[start * RECORD.size:stop * RECORD.size]
+
+    def raw_entries(self, start=0, stop=None):
+        for seq, timestamp, cents, code in RECORD.iter_unpack(self.view(start, stop)):
+            yield seq, timestamp, code, cents
+
+    def entries(self, start=0, stop=None):
+        actions = journal.ACTIONS
+        for seq, timestamp, code, cents in self.raw_entries(start, stop):
+            yield seq, timestamp, actions[code], from_cents(cents)
+
+    def entry(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('history index out of range')
+        seq, timestamp, cents, code = RECORD.unpack_from(self._mapped(), index * RECORD.size)
+        return seq, timestamp, journal.ACTIONS[code], from_cents(cents)
+
+    def pages(self, page_size, start=0, stop=None):
+        start, stop = self._check_range(start, stop)
+        for page_start in range(start, stop, page_size):
+            yield list(self.entries(page_start, min(page_start + page_size, stop)))
+
+    def _bisect(self, field, value):
+        low, high = 0, self.count
+        if not high:
+            return 0
+        mapping = self._mapped()
+        unpack_from = field.unpack_from
+        while low < high:
+            middle = (low + high) // 2
+            if unpack_from(mapping, middle * RECORD.size)[0] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def index_of_sequence(self, seq):
+        # Index of the first record with sequence number >= seq.
+        return self._bisect(SEQ, seq)
+
+    def index_of_time(self, timestamp):
+        # Index of the first record stamped at or after timestamp.
+        return self._bisect(TIMESTAMP, timestamp)
+
+
+def spill_history(accounts, directory):
+    # One history file per account, named after its account_id. A journal
+    # spilled for the first time starts its file afresh, so an id reused
+    # from an earlier run does not inherit that run's records.
+    os.makedirs(directory, exist_ok=True)
+    for account in accounts:
+        history = account.transaction_history
+        archive = history.archive
+        if archive is None:
+            archive = HistoryFile(os.path.join(directory, f'{account.account_id}.hist'), truncate=True)
+        history.spill(archive)
@@ -0,0 +1,140 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from bank_accounts import BalanceException
+from money import to_cents
+
+
+class IdempotencyConflict(ValueError):
+    pass
+
+
+class DedupCache:
+    # Bounded LRU of idempotency key -> (fingerprint, outcome). Entries
+    # also expire ttl seconds after they were stored; expired entries are
+    # dropped when looked up and trimmed from the cold end on insert.
+    def __init__(self, maxsize=100000, ttl=24 * 3600.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= self.clock():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key, fingerprint, outcome):
+        entries = self.entries
+        now = self.clock()
+        entries[key] = (now + self.ttl, fingerprint, outcome)
+        entries.move_to_end(key)
+        while entries:
+            oldest = next(iter(entries))
+            if len(entries) > self.maxsize or entries[oldest][0] <= now:
+                del entries[oldest]
+                self.evictions += 1
+            else:
+                break
+
+    def clear(self):
+        self.entries.clear()
+
+
+class IdempotentBank:
+    # Runs account operations at most once per idempotency key. A repeated
+    # key returns the first call's result, or raises its exception again,
+    # without touching the account. Reusing a key for a different operation
+    # raises IdempotencyConflict. Operations go through bank (for example a
+    # concurrency.ThreadSafeBank) when one is given, otherwise straight to
+    # the account. Concurrent calls with the same key wait for the first.
+    def __init__(self, cache=None, bank=None):
+        self.cache = cache if cache is not None else DedupCache()
+        self.bank = bank
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.in_flight = set()
+        self.waiters = 0
+
+    def deposit(self, account, amount, key):
+        return self._run(key, 'deposit', account, amount)
+
+    def withdraw(self, account, amount, key):
+        return self._run(key, 'withdraw', account, amount)
+
+    def transfer(self, account, amount, target, key):
+        return self._run(key, 'transfer', account, amount, target)
+
+    def transfer_to_parent(self, account, amount, key):
+        return self._run(key, 'transfer_to_parent', account, amount)
+
+    def close_account(self, account, key):
+        return self._run(key, 'close_account', account)
+
+    def _fingerprint(self, operation, account, args):
+        fingerprint = [operation, account.account_id]
+        if args:
+            fingerprint.append(to_cents(args[0]))
+        if len(args) > 1:
+            fingerprint.append(args[1].account_id)
+        return tuple(fingerprint)
+
+    def _run(self, key, operation, account, *args):
+        fingerprint = self._fingerprint(operation, account, args)
+        with self.lock:
+            while True:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return self._replay(key, fingerprint, *cached)
+                if key not in self.in_flight:
+                    self.in_flight.add(key)
+                    break
+                self.waiters += 1
+                self.condition.wait()
+                self.waiters -= 1
+        # Only results and BalanceExceptions are remembered; any other error
+        # leaves the key free so the call can be retried. The first failure
+        # propagates as itself, with its full traceback; retries get copies.
+        outcome = None
+        try:
+            if self.bank is not None:
+                outcome = (True, getattr(self.bank, operation)(account, *args))
+            else:
+                outcome = (True, getattr(account, operation)(*args))
+        except BalanceException as exc:
+            outcome = (False, exc)
+            raise
+        finally:
+            with self.lock:
+                if outcome is not None:
+                    self.cache.put(key, fingerprint, outcome)
+                self.in_flight.discard(key)
+                if self.waiters:
+                    self.condition.notify_all()
+        return outcome[1]
+
+    def _replay(self, key, fingerprint, cached_fingerprint, outcome):
+        if cached_fingerprint != fingerprint:
+            raise IdempotencyConflict(f"Idempotency key {key!r} was already used for a different operation.")
+        succeeded, value = outcome
+        if not succeeded:
+            # A fresh copy each time: re-raising the cached object would grow
+            # its traceback, and keep those frames alive, on every retry.
+            raise copy.copy(value)
+        return value
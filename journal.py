@@ -0,0 +1,311 @@
+import bisect
+import itertools
+import math
+import time
+from array import array
+
+from money import from_cents
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+ACTIONS = [
+    'Account opened',
+    'Deposit',
+    'Withdraw',
+    'Interest Deposit',
+    'Withdraw with Fee',
+    'Transfer',
+    'Transfer to Parent',
+    'Account Closed',
+    'Interest Accrued',
+    'Maintenance Fee',
+    'Balance Adjusted',
+]
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# Entries that note an event without moving money themselves. A transfer's
+# debit is already logged by the withdrawal it performs.
+OPENING_CODE = ACTION_CODES['Account opened']
+MEMO_CODES = frozenset(ACTION_CODES[action] for action in ('Transfer', 'Transfer to Parent', 'Account Closed'))
+
+# A balance checkpoint is kept after every CHECKPOINT_EVERY entries, so a
+# point-in-time balance never replays more than that many entries.
+CHECKPOINT_EVERY = 256
+
+_sequence = itertools.count(1)
+
+
+def next_sequence():
+    return next(_sequence)
+
+
+def advance_sequence(last_seq):
+    global _sequence
+    _sequence = itertools.count(max(last_seq + 1, next(_sequence)))
+
+
+def reserve_sequence(count):
+    # Takes count consecutive sequence numbers for entries written in bulk
+    # and returns the first. islice advances the counter in a single call,
+    # so no other thread can take a number in between.
+    last = next(itertools.islice(_sequence, count - 1, count))
+    return last - count + 1
+
+
+def action_code(action):
+    code = ACTION_CODES.get(action)
+    if code is None:
+        code = ACTION_CODES[action] = len(ACTIONS)
+        ACTIONS.append(action)
+    return code
+
+
+class TransactionJournal:
+    __slots__ = ('codes', 'amounts', 'timestamps', 'sequence', 'archive',
+                 'checkpoint_index', 'checkpoint_balance')
+
+    def __init__(self):
+        self.codes = array('H')
+        self.amounts = array('q')
+        self.timestamps = array('d')
+        self.sequence = array('Q')
+        self.archive = None
+        # Balance in cents after entry checkpoint_index[i]; the indexes
+        # count archived entries too and only grow.
+        self.checkpoint_index = array('Q')
+        self.checkpoint_balance = array('q')
+
+    def append(self, action, cents, balance=None):
+        # balance is the account balance after this entry; it is kept as a
+        # checkpoint every CHECKPOINT_EVERY entries.
+        code = ACTION_CODES.get(action)
+        if code is None:
+            code = action_code(action)
+        codes = self.codes
+        codes.append(code)
+        self.amounts.append(cents)
+        self.timestamps.append(time.time())
+        self.sequence.append(next(_sequence))
+        if balance is not None:
+            count = len(codes) if self.archive is None else len(self)
+            if not count % CHECKPOINT_EVERY:
+                self.checkpoint_index.append(count - 1)
+                self.checkpoint_balance.append(balance)
+
+    def checkpoint(self, balance):
+        # Records balance as the balance after the latest entry, for
+        # restored accounts whose authoritative balance differs from the
+        # replayed one. Live changes are logged as 'Balance Adjusted'.
+        index = len(self) - 1
+        if index < 0:
+            return
+        if self.checkpoint_index and self.checkpoint_index[-1] == index:
+            self.checkpoint_balance[-1] = balance
+        else:
+            self.checkpoint_index.append(index)
+            self.checkpoint_balance.append(balance)
+
+    def rebuild_checkpoints(self, final_balance=None):
+        # Recomputes the periodic checkpoints by replaying the entries, for
+        # histories restored without balances. A final_balance that differs
+        # from the replayed one is kept as a last checkpoint.
+        del self.checkpoint_index[:]
+        del self.checkpoint_balance[:]
+        balance = 0
+        for index, (seq, timestamp, code, cents) in enumerate(self.raw_entries()):
+            if code == OPENING_CODE:
+                balance = cents
+            elif code not in MEMO_CODES:
+                balance += cents
+            if not (index + 1) % CHECKPOINT_EVERY:
+                self.checkpoint_index.append(index)
+                self.checkpoint_balance.append(balance)
+        if final_balance is not None and final_balance != balance:
+            self.checkpoint(final_balance)
+
+    def running_balances(self, start=0, stop=None):
+        # (seq, timestamp, action code, cents, balance after the entry) for
+        # entries start..stop, replaying from the nearest checkpoint.
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return
+        checkpoints = self.checkpoint_index
+        position = bisect.bisect_right(checkpoints, start - 1) - 1 if start else -1
+        if position >= 0:
+            replay_from = checkpoints[position] + 1
+            balance = self.checkpoint_balance[position]
+        else:
+            replay_from = 0
+            balance = 0
+        position += 1
+        next_checkpoint = checkpoints[position] if position < len(checkpoints) else None
+        for index, (seq, timestamp, code, cents) in enumerate(self.raw_entries(replay_from, stop), replay_from):
+            if code == OPENING_CODE:
+                balance = cents
+            elif code not in MEMO_CODES:
+                balance += cents
+            if index == next_checkpoint:
+                balance = self.checkpoint_balance[position]
+                position += 1
+                next_checkpoint = checkpoints[position] if position < len(checkpoints) else None
+            if index >= start:
+                yield seq, timestamp, code, cents, balance
+
+    def balance_after(self, index):
+        # Balance in cents after entry index.
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('journal index out of range')
+        for entry in self.running_balances(index, index + 1):
+            return entry[4]
+
+    def balance_at_time(self, timestamp):
+        # Balance in cents once every entry stamped at or before timestamp
+        # is applied, or None if there were no entries yet.
+        index = self.index_of_time(math.nextafter(timestamp, math.inf)) - 1
+        if index < 0:
+            return None
+        return self.balance_after(index)
+
+    def restore(self, seq, timestamp, action, cents):
+        self.codes.append(action_code(action))
+        self.amounts.append(cents)
+        self.timestamps.append(timestamp)
+        self.sequence.append(seq)
+
+    def extend(self, seqs, timestamps, codes, amounts, balances=None):
+        # Bulk form of restore for columns of already-interned action codes.
+        # With balances (the balance after each entry) the periodic
+        # checkpoints are kept as append() would have kept them.
+        count = len(self)
+        self.codes.extend(codes)
+        self.amounts.extend(amounts)
+        self.timestamps.extend(timestamps)
+        self.sequence.extend(seqs)
+        if balances is not None:
+            for offset in range(-(count + 1) % CHECKPOINT_EVERY, len(balances), CHECKPOINT_EVERY):
+                self.checkpoint_index.append(count + offset)
+                self.checkpoint_balance.append(balances[offset])
+
+    def spill(self, archive):
+        # Moves the in-memory entries to the end of archive (a
+        # history_store.HistoryFile); later entries stay in memory until the
+        # next spill.
+        if self.archive is not None and archive is not self.archive:
+            raise ValueError("Journal is already spilled to a different archive.")
+        archive.extend(zip(self.sequence, self.timestamps, self.codes, self.amounts))
+        self.archive = archive
+        for column in (self.codes, self.amounts, self.timestamps, self.sequence):
+            del column[:]
+
+    def archived(self):
+        return len(self.archive) if self.archive is not None else 0
+
+    def __len__(self):
+        if self.archive is None:
+            return len(self.codes)
+        return len(self.archive) + len(self.codes)
+
+    def __iter__(self):
+        actions = ACTIONS
+        if self.archive is not None:
+            for seq, timestamp, code, cents in self.archive.raw_entries():
+                yield actions[code], from_cents(cents)
+        for code, cents in zip(self.codes, self.amounts):
+            yield actions[code], from_cents(cents)
+
+    def __getitem__(self, index):
+        if self.archive is None:
+            if isinstance(index, slice):
+                return [(ACTIONS[code], from_cents(cents))
+                        for code, cents in zip(self.codes[index], self.amounts[index])]
+            return ACTIONS[self.codes[index]], from_cents(self.amounts[index])
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return [(action, amount) for _, _, action, amount in self.entries(start, stop)]
+            return [self[i] for i in range(start, stop, step)]
+        return self.entry(index)[2:]
+
+    def __eq__(self, other):
+        if isinstance(other, (TransactionJournal, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"TransactionJournal({list(self)!r})"
+
+    def entry(self, index):
+        archived = self.archived()
+        if index < 0:
+            index += len(self)
+            if index < 0:
+                raise IndexError('journal index out of range')
+        if index < archived:
+            return self.archive.entry(index)
+        index -= archived
+        return (self.sequence[index], self.timestamps[index],
+                ACTIONS[self.codes[index]], from_cents(self.amounts[index]))
+
+    def raw_entries(self, start=0, stop=None):
+        # (seq, timestamp, action code, cents) for entries start..stop,
+        # reading spilled entries straight from the archive.
+        start, stop, _ = slice(start, stop).indices(len(self))
+        archived = self.archived()
+        if start < archived:
+            yield from self.archive.raw_entries(start, min(stop, archived))
+        start = max(start - archived, 0)
+        stop -= archived
+        if start < stop:
+            yield from zip(self.sequence[start:stop], self.timestamps[start:stop],
+                           self.codes[start:stop], self.amounts[start:stop])
+
+    def entries(self, start=0, stop=None):
+        actions = ACTIONS
+        for seq, timestamp, code, cents in self.raw_entries(start, stop):
+            yield seq, timestamp, actions[code], from_cents(cents)
+
+    def pages(self, page_size, start=0, stop=None):
+        start, stop, _ = slice(start, stop).indices(len(self))
+        for page_start in range(start, stop, page_size):
+            yield list(self.entries(page_start, min(page_start + page_size, stop)))
+
+    def index_of_sequence(self, seq):
+        # Index of the first entry with sequence number >= seq.
+        archived = self.archived()
+        if archived and (not self.sequence or seq <= self.sequence[0]):
+            return self.archive.index_of_sequence(seq)
+        return archived + bisect.bisect_left(self.sequence, seq)
+
+    def index_of_time(self, timestamp):
+        # Index of the first entry stamped at or after timestamp.
+        archived = self.archived()
+        if archived and (not self.timestamps or timestamp <= self.timestamps[0]):
+            return self.archive.index_of_time(timestamp)
+        return archived + bisect.bisect_left(self.timestamps, timestamp)
+
+    def since(self, timestamp):
+        return self.entries(self.index_of_time(timestamp))
+
+    def nbytes(self):
+        # In-memory footprint only; spilled entries live in the archive file.
+        return sum(column.itemsize * len(column)
+                   for column in (self.codes, self.amounts, self.timestamps, self.sequence,
+                                  self.checkpoint_index, self.checkpoint_balance))
+
+    def to_numpy(self):
+        if np is None:
+            raise ImportError("numpy is required for TransactionJournal.to_numpy()")
+        return {
+            'codes': np.frombuffer(self.codes, dtype=np.uint16),
+            'amounts': np.frombuffer(self.amounts, dtype=np.int64),
+            'timestamps': np.frombuffer(self.timestamps, dtype=np.float64),
+            'sequence': np.frombuffer(self.sequence, dtype=np.uint64),
+        }
@@ -0,0 +1,613 @@
+import time
+from array import array
+
+from bank_accounts import BalanceException, BankAccount, ChildAccount, InterestRewardsAcct, SavingsAcct
+from journal import ACTION_CODES, ACTIONS, reserve_sequence
+from money import BASIS_POINTS, apply_rate
+from stats import Aggregate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Operation types
+DEPOSIT = 0
+WITHDRAW = 1
+TRANSFER = 2
+TRANSFER_TO_PARENT = 3
+
+# Result codes. Each one corresponds to what the scalar method would have done.
+OK = 0
+BLOCKED = 1             # the method returned early because the account is blocked
+INVALID_AMOUNT = 2      # BalanceException: amount must be positive
+INSUFFICIENT_FUNDS = 3  # BalanceException: insufficient funds, nothing applied
+SAME_ACCOUNT = 4        # BalanceException: cannot transfer to the same account
+MIN_BALANCE = 5         # SavingsAcct withdrawal applied, then blocked and BalanceException raised
+NOT_A_CHILD = 6         # transfer_to_parent on an account without a parent
+LIMIT_EXCEEDED = 7      # BalanceException from a guard (see rules.py), nothing applied
+
+KIND_BASIC = 0
+KIND_INTEREST = 1
+KIND_SAVINGS = 2
+KIND_CHILD = 3
+
+# Accounts the planned passes may write to directly; anything else (e.g. a
+# registry-evicted account) goes through the scalar helpers.
+_PLAIN_TYPES = frozenset((BankAccount, InterestRewardsAcct, SavingsAcct, ChildAccount))
+
+_DEPOSIT_CODE = ACTION_CODES['Deposit']
+_INTEREST_DEPOSIT_CODE = ACTION_CODES['Interest Deposit']
+_WITHDRAW_CODE = ACTION_CODES['Withdraw']
+_WITHDRAW_FEE_CODE = ACTION_CODES['Withdraw with Fee']
+_TRANSFER_CODE = ACTION_CODES['Transfer']
+_TRANSFER_TO_PARENT_CODE = ACTION_CODES['Transfer to Parent']
+
+# The vectorized pass plans windows of operations, doubling up to
+# _MAX_WINDOW while nothing needs the scalar helpers. When such operations
+# come closer together than _MIN_RUN, the next _LOOP_RUN operations are
+# left to the loop planner, which handles them more cheaply.
+_WINDOW = 256
+_MAX_WINDOW = 1 << 16
+_MIN_RUN = 32
+_LOOP_RUN = 1024
+
+
+def account_kind(account):
+    if isinstance(account, SavingsAcct):
+        return KIND_SAVINGS
+    if isinstance(account, InterestRewardsAcct):
+        return KIND_INTEREST
+    if isinstance(account, ChildAccount):
+        return KIND_CHILD
+    return KIND_BASIC
+
+
+def _deposit(account, kind, cents):
+    if account.is_blocked:
+        return BLOCKED
+    if cents <= 0:
+        return INVALID_AMOUNT
+    if kind == KIND_INTEREST or kind == KIND_SAVINGS:
+        cents += apply_rate(cents, account.bonus_rate_bp)
+        account._balance += cents
+        account.log_transaction('Interest Deposit', cents)
+    else:
+        account._balance += cents
+        account.log_transaction('Deposit', cents)
+    return OK
+
+
+def _guarded(account, operation, cents, target=None):
+    try:
+        for guard in account.guards:
+            guard.check(account, operation, cents, target)
+    except BalanceException:
+        return False
+    return True
+
+
+def _withdraw(account, kind, cents):
+    if kind == KIND_SAVINGS:
+        total = cents + account._fee
+        if total <= 0:
+            return INVALID_AMOUNT
+        if account.guards and not _guarded(account, 'withdraw', total):
+            return LIMIT_EXCEEDED
+        if account._balance - total < 0:
+            return INSUFFICIENT_FUNDS
+        account._balance -= total
+        account.log_transaction('Withdraw with Fee', -total)
+        account._stats.record_fee(account._fee)
+        if account._balance < account._min_balance:
+            account.is_blocked = True
+            account._state_changed()
+            return MIN_BALANCE
+        return OK
+    if cents <= 0:
+        return INVALID_AMOUNT
+    if account.guards and not _guarded(account, 'withdraw', cents):
+        return LIMIT_EXCEEDED
+    if account._balance - cents < 0:
+        return INSUFFICIENT_FUNDS
+    account._balance -= cents
+    account.log_transaction('Withdraw', -cents)
+    if account._balance < account._min_balance:
+        account.is_blocked = True
+        account._state_changed()
+    return OK
+
+
+def _transfer(source, kind, target, target_kind, cents, action):
+    if source.is_blocked:
+        return BLOCKED
+    if cents <= 0:
+        return INVALID_AMOUNT
+    if source is target:
+        return SAME_ACCOUNT
+    if source.guards:
+        operation = 'transfer' if action == 'Transfer' else 'transfer_to_parent'
+        if not _guarded(source, operation, cents, target):
+            return LIMIT_EXCEEDED
+    if source._balance < cents:
+        return INSUFFICIENT_FUNDS
+    result = _withdraw(source, kind, cents)
+    if result != OK:
+        return result
+    # A blocked target silently drops the deposit, exactly like account.deposit().
+    _deposit(target, target_kind, cents)
+    source.log_transaction(action, cents)
+    if action == 'Transfer' and source._balance < source._min_balance:
+        source.is_blocked = True
+        source._state_changed()
+    return OK
+
+
+def _apply_rate_np(cents, rate_bp):
+    # apply_rate over arrays of amounts and rates.
+    quotient, remainder = np.divmod(cents * rate_bp, BASIS_POINTS)
+    twice = remainder * 2
+    return quotient + ((twice > BASIS_POINTS) | ((twice == BASIS_POINTS) & (quotient & 1 == 1)))
+
+
+def _prevalidate(account_ids, op_types, amounts, targets):
+    # Vectorized checks that do not depend on balances: non-positive amounts
+    # and transfers to self. Savings withdrawals are left to the sequential
+    # pass because their fee is part of the amount check.
+    if np is not None:
+        return _prevalidate_np(account_ids, op_types, amounts, targets).tolist()
+    codes = [INVALID_AMOUNT if cents <= 0 and op != WITHDRAW else OK
+             for op, cents in zip(op_types, amounts)]
+    if targets is not None:
+        for i, op in enumerate(op_types):
+            if op == TRANSFER and codes[i] == OK and account_ids[i] == targets[i]:
+                codes[i] = SAME_ACCOUNT
+    return codes
+
+
+def _prevalidate_np(account_ids, op_types, amounts, targets):
+    ids = np.asarray(account_ids, dtype=np.int64)
+    ops = np.asarray(op_types, dtype=np.int8)
+    cents = np.asarray(amounts, dtype=np.int64)
+    codes = np.where((cents <= 0) & (ops != WITHDRAW), INVALID_AMOUNT, OK)
+    if targets is not None:
+        same = (ops == TRANSFER) & (ids == np.asarray(targets, dtype=np.int64)) & (codes == OK)
+        codes = np.where(same, SAME_ACCOUNT, codes)
+    return codes.astype(np.int8)
+
+
+class _Pending:
+    # Entries planned for one account but not yet written: parallel
+    # columns, the balance after each entry, and the batch position of each
+    # entry so sequence numbers follow the order of the batch.
+    __slots__ = ('codes', 'amounts', 'balances', 'positions', 'balance', 'fees')
+
+    def __init__(self, balance):
+        self.codes = []
+        self.amounts = []
+        self.balances = []
+        self.positions = []
+        self.balance = balance
+        self.fees = 0
+
+    def add(self, code, cents, change, position):
+        self.balance += change
+        self.codes.append(code)
+        self.amounts.append(cents)
+        self.balances.append(self.balance)
+        self.positions.append(position)
+
+
+class Ledger:
+    def __init__(self, accounts=()):
+        self.accounts = []
+        self.kinds = array('b')
+        self.positions = {}
+        for account in accounts:
+            self.add(account)
+
+    def add(self, account):
+        self.accounts.append(account)
+        self.kinds.append(account_kind(account))
+        self.positions.setdefault(id(account), len(self.accounts) - 1)
+        return len(self.accounts) - 1
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def __getitem__(self, account_id):
+        return self.accounts[account_id]
+
+    def apply_batch(self, account_ids, op_types, amounts, targets=None):
+        # Columns are parallel sequences; amounts are integer cents and
+        # targets holds the receiving account id of each TRANSFER.
+        # Results are those of applying the operations in order, so later
+        # operations see the balances and blocking left by earlier ones, as
+        # with the scalar methods.
+        # Guards and listeners must see each operation as it happens.
+        watched = BankAccount.guards or BankAccount.listeners
+        if np is not None and not watched and len(account_ids):
+            return self._apply_vectorized(account_ids, op_types, amounts, targets)
+        precheck = _prevalidate(account_ids, op_types, amounts, targets)
+        results = array('b', bytes(len(precheck)))
+        if watched:
+            for i, code in enumerate(precheck):
+                results[i] = self._apply_one(account_ids, op_types, amounts, targets, i, code)
+        else:
+            self._apply_planned(account_ids, op_types, amounts, targets, precheck, results)
+        return results
+
+    def _apply_one(self, account_ids, op_types, amounts, targets, i, code):
+        accounts = self.accounts
+        account_id = account_ids[i]
+        account = accounts[account_id]
+        op = op_types[i]
+        if code != OK:
+            # Rejected up front. The scalar methods check blocking first,
+            # so report BLOCKED where they would have returned early.
+            if op != WITHDRAW and account.is_blocked:
+                return BLOCKED
+            return code
+        kind = self.kinds[account_id]
+        if op == DEPOSIT:
+            return _deposit(account, kind, amounts[i])
+        if op == WITHDRAW:
+            return _withdraw(account, kind, amounts[i])
+        if op == TRANSFER:
+            target_id = targets[i]
+            return _transfer(account, kind, accounts[target_id], self.kinds[target_id],
+                             amounts[i], 'Transfer')
+        if op == TRANSFER_TO_PARENT:
+            if kind != KIND_CHILD:
+                return NOT_A_CHILD
+            parent = account.parent_account
+            return _transfer(account, kind, parent, account_kind(parent),
+                             amounts[i], 'Transfer to Parent')
+        raise ValueError(f"Unknown operation type {op!r}.")
+
+    def _apply_planned(self, account_ids, op_types, amounts, targets, precheck, results,
+                       start=0, stop=None):
+        # Plays the batch forward on predicted balances, collecting each
+        # account's entries, and writes them with one bulk extend per
+        # journal and one stats update per account. Refusals that change
+        # nothing are decided on the predicted balances too. Only an
+        # operation that would block an account, or involves an account
+        # outside the plain types or this ledger, is handed to the scalar
+        # helpers, after writing what was planned so far, so every
+        # operation still sees the state left by earlier ones.
+        accounts = self.accounts
+        kinds = self.kinds
+        pending = {}
+        position = 0
+        if stop is None:
+            stop = len(precheck)
+        for i in range(start, stop):
+            code = precheck[i]
+            account_id = account_ids[i]
+            account = accounts[account_id]
+            op = op_types[i]
+            if code != OK:
+                results[i] = BLOCKED if op != WITHDRAW and account.is_blocked else code
+                continue
+            kind = kinds[account_id]
+            cents = amounts[i]
+            if op == DEPOSIT:
+                if account.is_blocked:
+                    results[i] = BLOCKED
+                    continue
+                if type(account) in _PLAIN_TYPES:
+                    plan = pending.get(account_id)
+                    if plan is None:
+                        plan = pending[account_id] = _Pending(account._balance)
+                    if kind == KIND_INTEREST or kind == KIND_SAVINGS:
+                        cents += apply_rate(cents, account.bonus_rate_bp)
+                        plan.add(_INTEREST_DEPOSIT_CODE, cents, cents, position)
+                    else:
+                        plan.add(_DEPOSIT_CODE, cents, cents, position)
+                    position += 1
+                    continue
+            elif op == WITHDRAW or op == TRANSFER or op == TRANSFER_TO_PARENT:
+                if op == WITHDRAW:
+                    target = target_id = None
+                elif op == TRANSFER:
+                    target_id = targets[i]
+                    target = accounts[target_id]
+                else:
+                    if kind != KIND_CHILD:
+                        results[i] = NOT_A_CHILD
+                        continue
+                    target = account.parent_account
+                    target_id = self.positions.get(id(target))
+                if target is not None and account.is_blocked:
+                    results[i] = BLOCKED
+                    continue
+                if kind == KIND_SAVINGS:
+                    total = cents + account._fee
+                    debit_code = _WITHDRAW_FEE_CODE
+                else:
+                    total = cents
+                    debit_code = _WITHDRAW_CODE
+                plan = pending.get(account_id)
+                balance = account._balance if plan is None else plan.balance
+                if total <= 0 and target is None:
+                    results[i] = INVALID_AMOUNT
+                    continue
+                if (balance < cents and target is not None) or (total > 0 and balance - total < 0):
+                    results[i] = INSUFFICIENT_FUNDS
+                    continue
+                if (total > 0 and balance - total >= account._min_balance
+                        and type(account) in _PLAIN_TYPES
+                        and (target is None or (target_id is not None and type(target) in _PLAIN_TYPES))):
+                    if plan is None:
+                        plan = pending[account_id] = _Pending(balance)
+                    plan.add(debit_code, -total, -total, position)
+                    if kind == KIND_SAVINGS:
+                        plan.fees += account._fee
+                    position += 1
+                    if target is not None:
+                        # A blocked target drops the credit, as account.deposit() would.
+                        if not target.is_blocked:
+                            target_plan = pending.get(target_id)
+                            if target_plan is None:
+                                target_plan = pending[target_id] = _Pending(target._balance)
+                            target_kind = kinds[target_id]
+                            if target_kind == KIND_INTEREST or target_kind == KIND_SAVINGS:
+                                credit = cents + apply_rate(cents, target.bonus_rate_bp)
+                                target_plan.add(_INTEREST_DEPOSIT_CODE, credit, credit, position)
+                            else:
+                                target_plan.add(_DEPOSIT_CODE, cents, cents, position)
+                            position += 1
+                        memo = _TRANSFER_CODE if op == TRANSFER else _TRANSFER_TO_PARENT_CODE
+                        plan.add(memo, cents, 0, position)
+                        position += 1
+                    continue
+            if pending:
+                self._write_pending(pending, position)
+                pending = {}
+                position = 0
+            results[i] = self._apply_one(account_ids, op_types, amounts, targets, i, code)
+        if pending:
+            self._write_pending(pending, position)
+
+    def _write_pending(self, pending, count):
+        accounts = self.accounts
+        first = reserve_sequence(count)
+        timestamp = time.time()
+        for account_id, plan in pending.items():
+            account = accounts[account_id]
+            size = len(plan.codes)
+            account.transaction_history.extend(array('Q', map(first.__add__, plan.positions)),
+                                               array('d', (timestamp,)) * size,
+                                               plan.codes, plan.amounts, plan.balances)
+            account._balance = plan.balance
+            stats = account._stats
+            stats.record_many(plan.codes, plan.amounts, plan.balances, timestamp)
+            if plan.fees:
+                stats.record_fee(plan.fees)
+
+    def _apply_vectorized(self, account_ids, op_types, amounts, targets):
+        # numpy form of _apply_planned. A window of operations is laid out
+        # as journal entries, the entries are grouped by account and summed
+        # to predict every balance, and each operation is checked against
+        # those arrays. Everything before the first operation the plan
+        # cannot decide is written in bulk; that operation goes to the
+        # scalar helpers and planning resumes after it.
+        accounts = self.accounts
+        ids = np.asarray(account_ids, dtype=np.int64)
+        ops = np.asarray(op_types, dtype=np.int64)
+        cents = np.asarray(amounts, dtype=np.int64)
+        if targets is not None:
+            targets = np.asarray(targets, dtype=np.int64)
+        codes = _prevalidate_np(ids, ops, cents, targets)
+        precheck = codes.tolist()
+        count = len(precheck)
+        results = array('b', bytes(count))
+        kind = np.frombuffer(self.kinds, dtype=np.int8)[ids]
+
+        # Ledger id of the receiving account of each transfer, or -1 when
+        # there is none (including parents outside this ledger).
+        dst = np.full(count, -1, dtype=np.int64)
+        transfer = ops == TRANSFER
+        if targets is not None and transfer.any():
+            dst[transfer] = targets[transfer]
+            dst[(dst >= len(accounts))] = -1
+        to_parent = (ops == TRANSFER_TO_PARENT) & (kind == KIND_CHILD)
+        if to_parent.any():
+            positions = self.positions
+            parents = {child: positions.get(id(accounts[child].parent_account), -1)
+                       for child in np.unique(ids[to_parent]).tolist()}
+            dst[to_parent] = [parents[child] for child in ids[to_parent].tolist()]
+        moving = dst >= 0
+
+        # State of the accounts the batch touches, indexed locally. A mask
+        # over the ledger is cheaper than np.unique unless the ledger is
+        # much larger than the batch.
+        if len(accounts) > 4 * count:
+            touched_ids = np.unique(np.concatenate((ids, dst[moving])))
+            src = np.searchsorted(touched_ids, ids)
+            dst = np.where(moving, np.searchsorted(touched_ids, dst), 0)
+        else:
+            present = np.zeros(len(accounts), dtype=bool)
+            present[ids] = True
+            present[dst[moving]] = True
+            touched_ids = np.flatnonzero(present)
+            local_ids = np.cumsum(present) - 1
+            src = local_ids[ids]
+            dst = np.where(moving, local_ids[np.maximum(dst, 0)], 0)
+        touched = [accounts[account_id] for account_id in touched_ids.tolist()]
+        touched_kinds = np.frombuffer(self.kinds, dtype=np.int8)[touched_ids]
+        # Small local indexes keep the stable sorts below on radix sort.
+        index_type = np.uint16 if len(touched) <= 1 << 16 else np.int64
+        src = src.astype(index_type)
+        dst = dst.astype(index_type)
+        balance = np.array([account._balance for account in touched], dtype=np.int64)
+        blocked = np.array([account.is_blocked for account in touched], dtype=bool)
+        floor = np.array([max(account._min_balance, 0) for account in touched], dtype=np.int64)
+        plain = np.array([type(account) in _PLAIN_TYPES for account in touched], dtype=bool)
+        fee = np.array([account._fee if account_kind == KIND_SAVINGS else 0
+                        for account, account_kind in zip(touched, touched_kinds.tolist())], dtype=np.int64)
+        interest = (touched_kinds == KIND_INTEREST) | (touched_kinds == KIND_SAVINGS)
+        bonus = np.array([account.bonus_rate_bp if earns else 0
+                          for account, earns in zip(touched, interest.tolist())], dtype=np.int64)
+
+        # Entries each operation would write if it went through.
+        total = cents + fee[src]
+        debit_code = np.where(kind == KIND_SAVINGS, _WITHDRAW_FEE_CODE, _WITHDRAW_CODE)
+        receiver = np.where(ops == DEPOSIT, src, dst)
+        credit = cents + _apply_rate_np(cents, bonus[receiver])
+        credit_code = np.where(interest[receiver], _INTEREST_DEPOSIT_CODE, _DEPOSIT_CODE)
+        memo_code = np.where(transfer, _TRANSFER_CODE, _TRANSFER_TO_PARENT_CODE)
+
+        planned = []
+        start = 0
+        window = _WINDOW
+        while start < count:
+            stop = min(start + window, count)
+            part = slice(start, stop)
+            size = stop - start
+            op = ops[part]
+            source = src[part]
+            target = dst[part]
+            source_blocked = blocked[source]
+            deposit = op == DEPOSIT
+            withdraw = op == WITHDRAW
+            moves = (op == TRANSFER) | (op == TRANSFER_TO_PARENT)
+            decided = np.select(
+                [codes[part] != OK, deposit & source_blocked, withdraw & (total[part] <= 0),
+                 (op == TRANSFER_TO_PARENT) & (kind[part] != KIND_CHILD), moves & source_blocked],
+                [np.where(~withdraw & source_blocked, BLOCKED, codes[part]), BLOCKED, INVALID_AMOUNT,
+                 NOT_A_CHILD, BLOCKED],
+                default=-1)
+            legs = (decided < 0) & (deposit | withdraw | moves)
+            transfers = legs & moves
+            needs_scalar = (((decided < 0) & ~legs) | (legs & ~plain[source])
+                            | (transfers & (~moving[part] | ~plain[target] | (total[part] <= 0))))
+            # A blocked target drops the credit, as account.deposit() would.
+            credits = transfers & ~blocked[target]
+
+            # One row per operation: debit or deposit, transfer credit, memo.
+            entry_account = np.stack((source, target, source), axis=1).ravel()
+            entry_code = np.stack((np.where(deposit, credit_code[part], debit_code[part]),
+                                   credit_code[part], memo_code[part]), axis=1).ravel()
+            entry_cents = np.stack((np.where(deposit, credit[part], -total[part]),
+                                    credit[part], cents[part]), axis=1).ravel()
+            entry_change = np.stack((entry_cents[0::3], entry_cents[1::3],
+                                     np.zeros(size, dtype=np.int64)), axis=1).ravel()
+            valid = np.stack((legs, credits, transfers), axis=1).ravel()
+            entry_account = entry_account[valid]
+            entry_code = entry_code[valid]
+            entry_cents = entry_cents[valid]
+            entry_change = entry_change[valid]
+
+            # Balance after each entry: a running sum per account.
+            order = np.argsort(entry_account, kind='stable')
+            grouped = entry_account[order]
+            running = np.cumsum(entry_change[order])
+            first = np.ones(len(grouped), dtype=bool)
+            first[1:] = grouped[1:] != grouped[:-1]
+            group_start = np.flatnonzero(first)
+            offset = (running - entry_change[order])[group_start][np.cumsum(first) - 1]
+            after = np.empty_like(running)
+            after[order] = balance[grouped] + running - offset
+
+            rows = np.zeros(size * 3, dtype=np.int64)
+            rows[valid] = after
+            debit_after = rows[0::3]
+            short = legs & ~deposit & ((debit_after < floor[source])
+                                       | (moves & (debit_after + total[part] < cents[part])))
+            stopped = np.flatnonzero(needs_scalar | short)
+            run = int(stopped[0]) if len(stopped) else size
+
+            if run:
+                results[start:start + run] = array(
+                    'b', np.where(legs, OK, decided)[:run].astype(np.int8).tobytes())
+                kept = int(np.count_nonzero(valid[:run * 3]))
+                if kept:
+                    planned.append((entry_account[:kept], entry_code[:kept], entry_cents[:kept],
+                                    after[:kept]))
+                    # The next window starts from the last kept balance of each account.
+                    order = order[order < kept]
+                    grouped = entry_account[order]
+                    last = np.flatnonzero(np.concatenate((grouped[1:] != grouped[:-1], [True])))
+                    balance[grouped[last]] = after[order[last]]
+            if run == size:
+                start = stop
+                window = min(window * 2, _MAX_WINDOW)
+                continue
+
+            if planned:
+                self._write_entries(touched, planned, fee)
+                planned = []
+            i = start + run
+            results[i] = self._apply_one(account_ids, op_types, amounts, targets, i, precheck[i])
+            start = i + 1
+            refresh = [src[i], dst[i]] if moving[i] else [src[i]]
+            if run < _MIN_RUN:
+                stop = min(start + _LOOP_RUN, count)
+                self._apply_planned(account_ids, op_types, amounts, targets, precheck, results,
+                                    start, stop)
+                part = slice(start, stop)
+                refresh = np.unique(np.concatenate((refresh, src[part], dst[part][moving[part]])))
+                start = stop
+                window = _WINDOW
+            else:
+                window = max(run * 2, _WINDOW)
+            for local in np.asarray(refresh).tolist():
+                balance[local] = touched[local]._balance
+                blocked[local] = touched[local].is_blocked
+        if planned:
+            self._write_entries(touched, planned, fee)
+        return results
+
+    def _write_entries(self, touched, planned, fee):
+        # Appends planned entries to their journals and stats and sets the
+        # new balances. planned holds (local account, code, cents, balance
+        # after) columns in batch order.
+        accounts, codes, amounts, balances = (np.concatenate(column) for column in zip(*planned))
+        count = len(accounts)
+        timestamp = time.time()
+        order = np.argsort(accounts, kind='stable')
+        seqs = order.astype(np.uint64) + reserve_sequence(count)
+        accounts = accounts[order]
+        codes = codes[order].astype(np.uint16)
+        amounts = amounts[order]
+        balances = balances[order]
+        bounds = np.flatnonzero(accounts[1:] != accounts[:-1]) + 1
+        starts = np.concatenate(([0], bounds))
+        stops = np.concatenate((bounds, [count]))
+
+        # Count and total of each action per account, for the stats.
+        width = len(ACTIONS)
+        keys = accounts.astype(np.int64) * width + codes
+        key_counts = np.bincount(keys, minlength=len(touched) * width).reshape(-1, width)
+        key_sums = np.zeros(len(touched) * width, dtype=np.int64)
+        np.add.at(key_sums, keys, amounts)
+        key_sums = key_sums.reshape(-1, width)
+        fees = (key_counts[:, _WITHDRAW_FEE_CODE] * fee).tolist()
+        key_counts = key_counts.tolist()
+        key_sums = key_sums.tolist()
+
+        lows = np.minimum.reduceat(balances, starts).tolist()
+        highs = np.maximum.reduceat(balances, starts).tolist()
+        finals = balances[stops - 1].tolist()
+        owners = accounts[starts].tolist()
+        seqs = array('Q', seqs.tobytes())
+        codes = array('H', codes.tobytes())
+        amounts = array('q', amounts.tobytes())
+        balances = array('q', balances.tobytes())
+        stamps = array('d', (timestamp,))
+        for local, begin, end, low, high, final in zip(owners, starts.tolist(), stops.tolist(),
+                                                       lows, highs, finals):
+            account = touched[local]
+            account.transaction_history.extend(seqs[begin:end], stamps * (end - begin),
+                                               codes[begin:end], amounts[begin:end],
+                                               balances[begin:end])
+            account._balance = final
+            batch = Aggregate()
+            batch.add_totals(key_counts[local], key_sums[local], timestamp)
+            stats = account._stats
+            stats.record_batch(batch, final, low, high)
+            if fees[local]:
+                stats.record_fee(fees[local])
+
@@ -0,0 +1,286 @@
+import collections
+import functools
+import sys
+import threading
+import time
+
+from bank_accounts import BalanceException, BankAccount, ChildAccount, InterestRewardsAcct, SavingsAcct
+
+
+ACCOUNT_CLASSES = (BankAccount, InterestRewardsAcct, SavingsAcct, ChildAccount)
+OPERATIONS = ('deposit', 'withdraw', 'transfer', 'transfer_to_parent', 'close_account', 'create_child_account')
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    # HDR-style log-linear buckets over nanoseconds: values below
+    # 2**precision_bits get a bucket each, and every power of two above
+    # that is split into 2**(precision_bits - 1) buckets, so any recorded
+    # value is reported within 1 / 2**(precision_bits - 1) of itself.
+    __slots__ = ('precision_bits', 'counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self, precision_bits=7):
+        self.precision_bits = precision_bits
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        bits = self.precision_bits
+        if value < 1 << bits:
+            return value
+        shift = value.bit_length() - bits
+        half = 1 << (bits - 1)
+        return (1 << bits) + (shift - 1) * half + (value >> shift) - half
+
+    def _lowest(self, index):
+        bits = self.precision_bits
+        if index < 1 << bits:
+            return index
+        half = 1 << (bits - 1)
+        shift, mantissa = divmod(index - (1 << bits), half)
+        return (mantissa + half) << (shift + 1)
+
+    def record(self, value):
+        index = self._index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.precision_bits != self.precision_bits:
+            raise ValueError("Cannot merge histograms with different precision.")
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percent):
+        # Upper edge of the bucket holding the requested rank, capped at max.
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._lowest(index + 1) - 1, self.max)
+        return self.max
+
+    def as_dict(self):
+        result = {
+            'count': self.count,
+            'min_ns': self.min,
+            'max_ns': self.max,
+            'mean_ns': self.total / self.count if self.count else None,
+        }
+        for percent in PERCENTILES:
+            result[f'p{percent:g}_ns'] = self.percentile(percent)
+        return result
+
+
+class Metrics:
+    # Counters and latency histograms for the account operations. Nothing
+    # is measured until enable() swaps timing wrappers onto the account
+    # classes; disable() puts the original methods back, so a disabled
+    # layer costs nothing at all. Nested calls are measured too: the
+    # withdraw inside a transfer is recorded as a withdraw.
+    def __init__(self, precision_bits=7):
+        self.precision_bits = precision_bits
+        self.counters = collections.Counter()
+        self.histograms = {}
+        self.originals = []
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.originals)
+
+    def enable(self, classes=ACCOUNT_CLASSES, operations=OPERATIONS):
+        if self.originals:
+            return self
+        for cls in classes:
+            for operation in operations:
+                method = cls.__dict__.get(operation)
+                if method is not None:
+                    self.originals.append((cls, operation, method))
+                    setattr(cls, operation, self._timed(operation, method))
+            method = cls.__dict__.get('check_minimum_balance')
+            if method is not None:
+                self.originals.append((cls, 'check_minimum_balance', method))
+                setattr(cls, 'check_minimum_balance', self._count_blocks(method))
+        return self
+
+    def disable(self):
+        for cls, name, method in reversed(self.originals):
+            setattr(cls, name, method)
+        self.originals = []
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.disable()
+
+    def _timed(self, operation, method):
+        clock = time.perf_counter_ns
+        counters = self.counters
+
+        @functools.wraps(method)
+        def timed(account, *args, **kwargs):
+            start = clock()
+            try:
+                return method(account, *args, **kwargs)
+            except BalanceException:
+                counters[f'{operation}.{type(account).__name__}.errors'] += 1
+                raise
+            finally:
+                self.observe(operation, type(account).__name__, clock() - start)
+        return timed
+
+    def _count_blocks(self, method):
+        counters = self.counters
+
+        @functools.wraps(method)
+        def check_minimum_balance(account):
+            was_blocked = account.is_blocked
+            method(account)
+            if account.is_blocked and not was_blocked:
+                counters[f'blocked.{type(account).__name__}'] += 1
+        return check_minimum_balance
+
+    def observe(self, operation, class_name, elapsed_ns):
+        key = (operation, class_name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram(self.precision_bits))
+        histogram.record(elapsed_ns)
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+    def all_counters(self):
+        # Call counts live in the histograms, so the hot path does not
+        # also update a counter.
+        counters = collections.Counter(self.counters)
+        for (operation, class_name), histogram in self.histograms.items():
+            counters[f'{operation}.{class_name}.calls'] = histogram.count
+        return dict(sorted(counters.items()))
+
+    def snapshot(self):
+        # Plain dicts and numbers, ready for json.dumps.
+        latency = {}
+        for (operation, class_name), histogram in sorted(self.histograms.items()):
+            latency.setdefault(operation, {})[class_name] = histogram.as_dict()
+        for operation, by_class in latency.items():
+            total = LatencyHistogram(self.precision_bits)
+            for (name, _), histogram in self.histograms.items():
+                if name == operation:
+                    total.merge(histogram)
+            by_class['all'] = total.as_dict()
+        return {'counters': self.all_counters(), 'latency': latency}
+
+    def prometheus(self):
+        # Text exposition format: counters plus summary quantiles in seconds.
+        lines = []
+        for name, value in self.all_counters().items():
+            lines.append(f'bank_{name.replace(".", "_")}_total {value}')
+        for (operation, class_name), histogram in sorted(self.histograms.items()):
+            labels = f'operation="{operation}",account_class="{class_name}"'
+            for percent in PERCENTILES:
+                lines.append(f'bank_operation_seconds{{{labels},quantile="{percent / 100:g}"}} '
+                             f'{histogram.percentile(percent) / 1e9:.9f}')
+            lines.append(f'bank_operation_seconds_sum{{{labels}}} {histogram.total / 1e9:.9f}')
+            lines.append(f'bank_operation_seconds_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    # Samples one thread's stack every interval seconds from a background
+    # thread and counts the functions seen, innermost first. It can be
+    # started and stopped at any time, independently of Metrics.
+    def __init__(self, interval=0.005, thread_id=None, depth=8):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.depth = depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.depth:
+                code = frame.f_code
+                stack.append(f'{code.co_filename}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def top(self, n=10):
+        # The n most sampled innermost frames, as (frame, share of samples).
+        frames = collections.Counter()
+        for stack, count in self.stacks.items():
+            frames[stack[0]] += count
+        return [(frame, count / self.samples) for frame, count in frames.most_common(n)]
+
+
+_metrics = None
+
+
+def enable(precision_bits=7):
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics(precision_bits).enable()
+    return _metrics
+
+
+def disable():
+    global _metrics
+    if _metrics is not None:
+        _metrics.disable()
+        _metrics = None
+
+
+def snapshot():
+    return _metrics.snapshot() if _metrics is not None else {'counters': {}, 'latency': {}}
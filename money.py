@@ -0,0 +1,40 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+
+
+CENTS_PER_UNIT = 100
+BASIS_POINTS = 10000
+
+_WHOLE = Decimal(1)
+
+
+def to_cents(amount):
+    # Fast paths: ints, and floats that already sit on a whole cent (within
+    # float noise). Anything else goes through Decimal and is rounded to the
+    # nearest cent with banker's rounding.
+    if type(amount) is int:
+        return amount * CENTS_PER_UNIT
+    if type(amount) is float:
+        scaled = amount * CENTS_PER_UNIT
+        cents = round(scaled)
+        if abs(scaled - cents) < 1e-6:
+            return cents
+        amount = Decimal(repr(amount))
+    elif not isinstance(amount, Decimal):
+        amount = Decimal(amount)
+    return int((amount * CENTS_PER_UNIT).quantize(_WHOLE, rounding=ROUND_HALF_EVEN))
+
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def div_round_half_even(numerator, denominator):
+    quotient, remainder = divmod(numerator, denominator)
+    twice = remainder * 2
+    if twice > denominator or (twice == denominator and quotient & 1):
+        quotient += 1
+    return quotient
+
+
+def apply_rate(cents, rate_bp):
+    return div_round_half_even(cents * rate_bp, BASIS_POINTS)
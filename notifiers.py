@@ -0,0 +1,84 @@
+import logging
+from collections import deque
+
+
+MESSAGES = {
+    'opened': "\nAccount '{name}' created.\nBalance = ${balance:.2f}",
+    'child_created': "\nChild account '{other}' created under parent account '{name}'.",
+    'child_refused': "\nAccount '{name}' is currently blocked and cannot create a child account.",
+    'blocked': "\nAccount '{name}' is currently blocked.",
+    'balance': "\nAccount '{name}' balance = ${balance:.2f}",
+    'deposit': "\nDeposit complete.\n\nAccount '{name}' balance = ${balance:.2f}",
+    'interest_deposit': "\nInterest deposit complete.\n\nAccount '{name}' balance = ${balance:.2f}",
+    'withdraw': "\nWithdraw complete.",
+    'withdraw_fee': "\nWithdraw complete with fee.",
+    'below_minimum': "\nAccount '{name}' has fallen below the minimum balance and is now blocked.",
+    'savings_blocked': "Account '{name}' has been blocked due to falling below the minimum balance.",
+    'unblocked': "\nAccount '{name}' is now unblocked.",
+    'unblock_refused': "\nAccount '{name}' cannot be unblocked. Balance is below the minimum requirement.",
+    'transfer': "\nTransfer complete!",
+    'child_blocked': "\nChild account '{name}' is currently blocked.",
+    'transfer_to_parent': "\nTransfer to parent account complete: ${amount:.2f}",
+    'close_blocked': "\nAccount '{name}' is currently blocked and cannot be closed.",
+    'close_refused': "\nAccount '{name}' cannot be closed because the balance is below the minimum requirement.",
+    'closed': "\nAccount '{name}' has been closed.",
+}
+
+WARNING_EVENTS = frozenset([
+    'child_refused', 'blocked', 'below_minimum', 'savings_blocked',
+    'unblock_refused', 'child_blocked', 'close_blocked', 'close_refused',
+])
+
+
+def format_message(event, name, balance, amount=None, other=None):
+    return MESSAGES[event].format(name=name, balance=balance, amount=amount, other=other)
+
+
+class Notifier:
+    # Backends receive the raw event and build any text themselves, so a
+    # backend that drops events never pays for string formatting.
+    def notify(self, event, account, amount=None, other=None):
+        raise NotImplementedError
+
+
+class SilentNotifier(Notifier):
+    def notify(self, event, account, amount=None, other=None):
+        pass
+
+
+class StdoutNotifier(Notifier):
+    def notify(self, event, account, amount=None, other=None):
+        print(format_message(event, account.name, account.balance, amount,
+                             other.name if other is not None else None))
+
+
+class BufferedNotifier(Notifier):
+    def __init__(self, maxlen=None):
+        self.events = deque(maxlen=maxlen)
+
+    def notify(self, event, account, amount=None, other=None):
+        self.events.append((event, account.name, account.balance, amount,
+                            other.name if other is not None else None))
+
+    def messages(self):
+        return [format_message(*event) for event in self.events]
+
+    def clear(self):
+        self.events.clear()
+
+
+class LoggingNotifier(Notifier):
+    def __init__(self, logger=None, level=logging.INFO, warning_level=logging.WARNING):
+        self.logger = logger if logger is not None else logging.getLogger('bank_accounts')
+        self.level = level
+        self.warning_level = warning_level
+
+    def notify(self, event, account, amount=None, other=None):
+        level = self.warning_level if event in WARNING_EVENTS else self.level
+        if not self.logger.isEnabledFor(level):
+            return
+        other_name = other.name if other is not None else None
+        balance = account.balance
+        self.logger.log(level, format_message(event, account.name, balance, amount, other_name).strip(),
+                        extra={'event': event, 'account': account.name, 'balance': balance,
+                               'amount': amount, 'other': other_name})
@@ -0,0 +1,275 @@
+import os
+import pickle
+from collections import OrderedDict
+
+import bank_accounts
+from history_store import HistoryFile
+from ledger import KIND_CHILD, account_kind
+from wal import blank_account
+
+
+STORE_FILE = 'accounts.dat'
+
+# Everything that can change an account, refused once it has been evicted.
+FENCED_METHODS = ('deposit', 'withdraw', 'transfer', 'transfer_to_parent', 'close_account',
+                  'create_child_account', 'unblock_account', 'check_minimum_balance',
+                  'log_transaction', '_state_changed')
+FENCED_PROPERTIES = ('balance', 'min_balance', 'fee')
+
+
+class EvictedAccountError(RuntimeError):
+    pass
+
+
+def _refuse(account, *args, **kwargs):
+    raise EvictedAccountError(f"Account {account.account_id} was evicted from the registry; "
+                              f"look it up again before changing it.")
+
+
+_fenced_classes = {}
+
+
+def fenced_class(cls):
+    # A subclass with the same slots whose mutators all raise, so an evicted
+    # object can be switched to it in place. Reading it still works.
+    fenced = _fenced_classes.get(cls)
+    if fenced is None:
+        namespace = {'__slots__': ()}
+        for name in FENCED_METHODS:
+            namespace[name] = _refuse
+        for name in FENCED_PROPERTIES:
+            prop = getattr(cls, name, None)
+            if isinstance(prop, property):
+                namespace[name] = property(prop.fget, _refuse)
+        fenced = _fenced_classes[cls] = type('Evicted' + cls.__name__, (cls,), namespace)
+    return fenced
+
+
+class _TransferFence:
+    # Guard refusing a transfer into an evicted account before the source
+    # is debited. It also catches evicted sources on the batch Ledger path,
+    # which changes balances without going through the account's methods.
+    # It is installed only while an attached registry has evicted accounts
+    # (the holders), since any guard sends Ledger batches down the per-op path.
+    fenced = set()
+    holders = set()
+
+    def check(self, account, operation, cents, target):
+        if type(account) in self.fenced:
+            _refuse(account)
+        if target is not None and type(target) in self.fenced:
+            _refuse(target)
+
+
+_FENCE = _TransferFence()
+
+
+class AccountRegistry:
+    # Finds accounts by account_id or name and keeps at most capacity of
+    # them in memory. The least recently used account is written to an
+    # append-only store file and dropped; get() loads it back on demand.
+    # A child is never resident without its parent, so parent links and
+    # family stats stay intact: children are evicted before their parents
+    # and a parent is loaded before its child. An evicted object is fenced:
+    # changing it, or transferring into it, raises EvictedAccountError
+    # instead of silently diverging from the stored copy, so callers should
+    # look accounts up again rather than keep references across evictions.
+    # Transfers into an evicted object are refused while the registry is
+    # attached; changing the object itself is refused for good.
+    def __init__(self, directory, capacity=100000, accounts=()):
+        os.makedirs(directory, exist_ok=True)
+        self.capacity = capacity
+        self.resident = OrderedDict()
+        self.count = 0
+        self.offsets = {}
+        self.names = {}
+        self.parents = {}
+        self.resident_children = {}
+        self.dirty = set()
+        self.loads = 0
+        self.evictions = 0
+        # The store only backs this registry's lifetime; durability across
+        # restarts is the WAL's job.
+        self.path = os.path.join(directory, STORE_FILE)
+        self.file = open(self.path, 'w+b')
+        for account in accounts:
+            self.register(account)
+
+    def attach(self):
+        bank_accounts.add_listener(self)
+        return self
+
+    def detach(self):
+        bank_accounts.remove_listener(self)
+        _TransferFence.holders.discard(self)
+        if not _TransferFence.holders:
+            bank_accounts.remove_guard(_FENCE)
+
+    def close(self):
+        self.detach()
+        self.file.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, account_id):
+        return account_id in self.resident or account_id in self.offsets
+
+    def register(self, account):
+        account_id = account.account_id
+        if account_id in self:
+            return
+        self.names.setdefault(account.name, []).append(account_id)
+        self.count += 1
+        parent = getattr(account, 'parent_account', None)
+        if parent is not None:
+            self.register(parent)
+            self.get(parent.account_id)
+            self.parents[account_id] = parent.account_id
+        self._admit(account)
+
+    def on_transaction(self, account, action, cents):
+        if action == 'Account opened':
+            self.register(account)
+        self._touch(account)
+
+    def on_state(self, account):
+        self._touch(account)
+
+    def _touch(self, account):
+        account_id = account.account_id
+        if self.resident.get(account_id) is account:
+            self.resident.move_to_end(account_id)
+            self.dirty.add(account_id)
+
+    def get(self, account_id):
+        account = self.resident.get(account_id)
+        if account is not None:
+            self.resident.move_to_end(account_id)
+            return account
+        if account_id not in self.offsets:
+            raise KeyError(account_id)
+        parent = None
+        if account_id in self.parents:
+            parent = self.get(self.parents[account_id])
+        account = self._load(account_id, parent)
+        self.loads += 1
+        self._admit(account, dirty=False)
+        return account
+
+    def find(self, name):
+        return [self.get(account_id) for account_id in self.names.get(name, ())]
+
+    def get_by_name(self, name):
+        ids = self.names.get(name)
+        if not ids:
+            raise KeyError(name)
+        if len(ids) > 1:
+            raise LookupError(f"{len(ids)} accounts are named {name!r}.")
+        return self.get(ids[0])
+
+    def _admit(self, account, dirty=True):
+        account_id = account.account_id
+        self.resident[account_id] = account
+        if dirty:
+            self.dirty.add(account_id)
+        parent_id = self.parents.get(account_id)
+        if parent_id is not None:
+            self.resident_children[parent_id] = self.resident_children.get(parent_id, 0) + 1
+        self._shrink()
+
+    def _shrink(self):
+        # Walks from the cold end, skipping parents with resident children
+        # and the account that was just admitted.
+        newest = next(reversed(self.resident))
+        while len(self.resident) > self.capacity:
+            for account_id in self.resident:
+                if account_id != newest and not self.resident_children.get(account_id):
+                    break
+            else:
+                return
+            self.evict(account_id)
+
+    def evict(self, account_id):
+        if self.resident_children.get(account_id):
+            raise ValueError(f"Account {account_id} has resident children and cannot be evicted.")
+        account = self.resident.pop(account_id)
+        if account_id in self.dirty or account_id not in self.offsets:
+            self._store(account)
+            self.dirty.discard(account_id)
+        if account.transaction_history.archive is not None:
+            account.transaction_history.archive.close()
+        self._fence(account)
+        parent_id = self.parents.get(account_id)
+        if parent_id is not None:
+            self.resident_children[parent_id] -= 1
+            if not self.resident_children[parent_id]:
+                del self.resident_children[parent_id]
+        self.evictions += 1
+
+    def _fence(self, account):
+        fenced = fenced_class(type(account))
+        _TransferFence.fenced.add(fenced)
+        _TransferFence.holders.add(self)
+        if _FENCE not in bank_accounts.BankAccount.guards:
+            bank_accounts.add_guard(_FENCE)
+        account.__class__ = fenced
+
+    def _store(self, account):
+        # Only the account's own fields go to disk: the parent is stored as
+        # its id, and pickled stats leave out their parent link.
+        history = account.transaction_history
+        payload = pickle.dumps((
+            account_kind(account), account.account_id, account.name, account._balance,
+            account._min_balance, getattr(account, '_fee', 0), account.is_blocked,
+            history.codes.tobytes(), history.amounts.tobytes(), history.timestamps.tobytes(),
+            history.sequence.tobytes(), history.checkpoint_index.tobytes(), history.checkpoint_balance.tobytes(),
+            history.archive.path if history.archive is not None else None, account._stats,
+        ), pickle.HIGHEST_PROTOCOL)
+        self.file.seek(0, os.SEEK_END)
+        self.offsets[account.account_id] = (self.file.tell(), len(payload))
+        self.file.write(payload)
+
+    def _load(self, account_id, parent):
+        offset, length = self.offsets[account_id]
+        self.file.seek(offset)
+        (kind, account_id, name, balance, min_balance, fee, blocked, codes, amounts, timestamps, sequence,
+         checkpoint_index, checkpoint_balance, archive_path, stats) = pickle.loads(self.file.read(length))
+        account = blank_account(kind, account_id, name, min_balance, fee)
+        account._balance = balance
+        account.is_blocked = blocked
+        history = account.transaction_history
+        history.codes.frombytes(codes)
+        history.amounts.frombytes(amounts)
+        history.timestamps.frombytes(timestamps)
+        history.sequence.frombytes(sequence)
+        history.checkpoint_index.frombytes(checkpoint_index)
+        history.checkpoint_balance.frombytes(checkpoint_balance)
+        if archive_path is not None:
+            history.archive = HistoryFile(archive_path)
+        # The parent's family totals still include this account, so the
+        # stats are relinked without merging them in again.
+        account._stats = stats
+        if kind == KIND_CHILD:
+            account.parent_account = parent
+            stats.parent = parent._stats if parent is not None else None
+        return account
+
+    def flush(self):
+        # Writes every resident account that changed since it was last stored.
+        for account_id in list(self.dirty):
+            self._store(self.resident[account_id])
+        self.dirty.clear()
+
+    def compact(self):
+        # Rewrites the store with only the latest record of each account.
+        self.flush()
+        records = []
+        for account_id, (offset, length) in self.offsets.items():
+            self.file.seek(offset)
+            records.append((account_id, self.file.read(length)))
+        self.file.seek(0)
+        self.file.truncate()
+        for account_id, payload in records:
+            self.offsets[account_id] = (self.file.tell(), len(payload))
+            self.file.write(payload)
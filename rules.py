@@ -0,0 +1,300 @@
+import sys
+import time
+
+import bank_accounts
+from bank_accounts import BalanceException
+from money import to_cents
+
+
+OPERATIONS = ('withdraw', 'transfer', 'transfer_to_parent')
+ACCOUNT = 'account'
+FAMILY = 'family'
+
+# Journal actions that record a completed operation. Only these feed the
+# windows, so an operation refused part way through is never counted.
+RECORDED_ACTIONS = {
+    'Withdraw': 'withdraw',
+    'Withdraw with Fee': 'withdraw',
+    'Transfer': 'transfer',
+    'Transfer to Parent': 'transfer_to_parent',
+}
+
+_UNLIMITED = sys.maxsize
+_TRIM_AFTER = 64
+
+
+class LimitExceeded(BalanceException):
+    def __init__(self, message, rule):
+        super().__init__(message)
+        self.rule = rule
+
+    def __reduce__(self):
+        return type(self), (self.args[0], self.rule)
+
+
+class VelocityRule:
+    # At most max_count operations and/or max_amount dollars of one
+    # operation type within any window seconds, per account or per family
+    # (every account under the same top-level parent). Withdraw rules also
+    # see the withdraw inside each transfer, so they cover all outflows.
+    __slots__ = ('name', 'operation', 'window', 'max_count', 'max_cents', 'scope')
+
+    def __init__(self, name, operation, window, max_count=None, max_amount=None, scope=ACCOUNT):
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation {operation!r}.")
+        if scope not in (ACCOUNT, FAMILY):
+            raise ValueError(f"Unknown scope {scope!r}.")
+        if window <= 0:
+            raise ValueError("Window must be positive.")
+        if max_count is None and max_amount is None:
+            raise ValueError("A rule needs max_count, max_amount or both.")
+        self.name = name
+        self.operation = operation
+        self.window = window
+        self.max_count = max_count
+        self.max_cents = to_cents(max_amount) if max_amount is not None else None
+        self.scope = scope
+
+    def __repr__(self):
+        return (f"VelocityRule({self.name!r}, {self.operation!r}, {self.window!r}, "
+                f"max_count={self.max_count!r}, max_cents={self.max_cents!r}, scope={self.scope!r})")
+
+
+class SlidingWindows:
+    # The recent events of one account or family, shared by windows of
+    # several lengths (ascending). Each length keeps the position of its
+    # oldest event and a running total; an event is appended once and
+    # passed once per length, so updates are amortized O(1) per window.
+    # Events older than the longest window are trimmed in bulk.
+    __slots__ = ('times', 'amounts', 'offset', 'starts', 'totals')
+
+    def __init__(self, windows):
+        self.times = []
+        self.amounts = []
+        self.offset = 0
+        self.starts = [0] * windows
+        self.totals = [0] * windows
+
+    def reset(self, windows):
+        # Every window starts over from all retained events; the next
+        # expire() drops what falls outside each one.
+        total = sum(self.amounts)
+        self.starts = [self.offset] * windows
+        self.totals = [total] * windows
+
+    def expire(self, now, lengths):
+        times = self.times
+        amounts = self.amounts
+        starts = self.starts
+        totals = self.totals
+        offset = self.offset
+        end = offset + len(times)
+        for i, length in enumerate(lengths):
+            cutoff = now - length
+            start = starts[i]
+            while start < end and times[start - offset] <= cutoff:
+                totals[i] -= amounts[start - offset]
+                start += 1
+            starts[i] = start
+        passed = starts[-1] - offset
+        if passed > _TRIM_AFTER and passed * 2 > len(times):
+            del times[:passed]
+            del amounts[:passed]
+            self.offset = starts[-1]
+
+    def add(self, now, cents):
+        self.times.append(now)
+        self.amounts.append(cents)
+        totals = self.totals
+        for i in range(len(totals)):
+            totals[i] += cents
+
+    def count(self, index):
+        return self.offset + len(self.times) - self.starts[index]
+
+
+class _RuleGroup:
+    # All rules for one operation and scope. Their distinct window lengths
+    # share one SlidingWindows per account or family, and for each length
+    # only the tightest count and amount limits have to be checked.
+    __slots__ = ('key', 'scope', 'lengths', 'limits', 'count_rules', 'amount_rules', 'windows')
+
+    def __init__(self, key, rules, windows):
+        self.key = key
+        self.scope = key[1]
+        self.lengths = tuple(sorted({rule.window for rule in rules}))
+        limits = [[_UNLIMITED, _UNLIMITED] for _ in self.lengths]
+        self.count_rules = [None] * len(self.lengths)
+        self.amount_rules = [None] * len(self.lengths)
+        for rule in rules:
+            i = self.lengths.index(rule.window)
+            if rule.max_count is not None and rule.max_count < limits[i][0]:
+                limits[i][0] = rule.max_count
+                self.count_rules[i] = rule
+            if rule.max_cents is not None and rule.max_cents < limits[i][1]:
+                limits[i][1] = rule.max_cents
+                self.amount_rules[i] = rule
+        self.limits = tuple(map(tuple, limits))
+        self.windows = windows
+
+
+def family_id(account):
+    parent = getattr(account, 'parent_account', None)
+    while parent is not None:
+        account = parent
+        parent = getattr(account, 'parent_account', None)
+    return account.account_id
+
+
+class RuleEngine:
+    # Velocity limits checked on every withdraw, transfer and
+    # transfer_to_parent once attached. As a guard it refuses an operation
+    # that would break a rule by raising LimitExceeded before anything is
+    # applied; as a listener it records the operations that went through.
+    # Rules are compiled into one group per operation and scope, so a check
+    # touches at most two event logs whatever the number of rules, and
+    # never scans history. Windows only count operations seen while
+    # attached. Like the listeners, the engine takes no lock: concurrent
+    # operations in one family should be serialized by the caller if
+    # family limits must hold exactly.
+    def __init__(self, rules=(), clock=time.monotonic):
+        self.clock = clock
+        self.rules = list(rules)
+        self.compiled = {}
+        self.rejections = 0
+        self.compile()
+
+    def attach(self):
+        bank_accounts.add_guard(self)
+        bank_accounts.add_listener(self)
+        return self
+
+    def detach(self):
+        bank_accounts.remove_guard(self)
+        bank_accounts.remove_listener(self)
+
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.detach()
+
+    def add_rule(self, rule):
+        self.rules.append(rule)
+        self.compile()
+
+    def remove_rule(self, name):
+        self.rules = [rule for rule in self.rules if rule.name != name]
+        self.compile()
+
+    def compile(self):
+        # Groups that survive a recompile keep their events, so adding or
+        # removing a rule does not forget recent activity; events older
+        # than the previous longest window are already gone, though.
+        old = {group.key: group for groups in self.compiled.values() for group in groups}
+        by_key = {}
+        for rule in self.rules:
+            by_key.setdefault((rule.operation, rule.scope), []).append(rule)
+        compiled = {operation: [] for operation in OPERATIONS}
+        for key, rules in by_key.items():
+            previous = old.get(key)
+            group = _RuleGroup(key, rules, previous.windows if previous is not None else {})
+            if previous is not None and previous.lengths != group.lengths:
+                for windows in group.windows.values():
+                    windows.reset(len(group.lengths))
+            compiled[key[0]].append(group)
+        self.compiled = {operation: tuple(groups) for operation, groups in compiled.items()}
+
+    def _windows(self, group, account):
+        scope_id = account.account_id if group.scope == ACCOUNT else family_id(account)
+        windows = group.windows.get(scope_id)
+        if windows is None:
+            windows = group.windows[scope_id] = SlidingWindows(len(group.lengths))
+        return windows
+
+    def check(self, account, operation, cents, target=None):
+        groups = self.compiled.get(operation)
+        if not groups:
+            return
+        now = self.clock()
+        for group in groups:
+            windows = self._windows(group, account)
+            windows.expire(now, group.lengths)
+            end = windows.offset + len(windows.times)
+            starts = windows.starts
+            totals = windows.totals
+            for i, (max_count, max_cents) in enumerate(group.limits):
+                if end - starts[i] >= max_count:
+                    self._reject(account, group.count_rules[i])
+                if totals[i] + cents > max_cents:
+                    self._reject(account, group.amount_rules[i])
+
+    def check_many(self, operations):
+        # Checks (account, operation, cents, target) tuples that are about to
+        # be applied together, each one counting the earlier ones as done,
+        # so a batch is refused as a whole before any of it is applied.
+        now = self.clock()
+        pending = {}
+        for account, operation, cents, target in operations:
+            for group in self.compiled.get(operation, ()):
+                windows = self._windows(group, account)
+                extra = pending.get(id(windows))
+                if extra is None:
+                    windows.expire(now, group.lengths)
+                    extra = pending[id(windows)] = [0, 0]
+                end = windows.offset + len(windows.times) + extra[0]
+                starts = windows.starts
+                totals = windows.totals
+                for i, (max_count, max_cents) in enumerate(group.limits):
+                    if end - starts[i] >= max_count:
+                        self._reject(account, group.count_rules[i])
+                    if totals[i] + extra[1] + cents > max_cents:
+                        self._reject(account, group.amount_rules[i])
+                extra[0] += 1
+                extra[1] += cents
+
+    def _reject(self, account, rule):
+        self.rejections += 1
+        raise LimitExceeded(f"Transaction on account '{account.name}' exceeds limit '{rule.name}'.", rule)
+
+    def on_transaction(self, account, action, cents):
+        operation = RECORDED_ACTIONS.get(action)
+        if operation is None:
+            return
+        groups = self.compiled[operation]
+        if not groups:
+            return
+        # check() expired these windows moments ago, so only the new event is added.
+        now = self.clock()
+        cents = abs(cents)
+        for group in groups:
+            self._windows(group, account).add(now, cents)
+
+    def on_state(self, account):
+        pass
+
+    def usage(self, account, rule):
+        # (count, amount in cents) the rule currently sees for this account.
+        for group in self.compiled[rule.operation]:
+            if group.scope == rule.scope and rule.window in group.lengths:
+                windows = self._windows(group, account)
+                windows.expire(self.clock(), group.lengths)
+                i = group.lengths.index(rule.window)
+                return windows.count(i), windows.totals[i]
+        raise KeyError(rule.name)
+
+    def prune(self):
+        # Drops accounts and families with no events left in any window,
+        # e.g. after a quiet period.
+        now = self.clock()
+        dropped = 0
+        for groups in self.compiled.values():
+            for group in groups:
+                by_scope = group.windows
+                for scope_id in list(by_scope):
+                    windows = by_scope[scope_id]
+                    windows.expire(now, group.lengths)
+                    if not windows.count(len(group.lengths) - 1):
+                        del by_scope[scope_id]
+                        dropped += 1
+        return dropped
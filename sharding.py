@@ -0,0 +1,319 @@
+import itertools
+import multiprocessing
+import os
+import zlib
+
+import bank_accounts
+from bank_accounts import BalanceException, BankAccount, ChildAccount, InterestRewardsAcct, SavingsAcct
+from money import to_cents
+from notifiers import SilentNotifier
+
+
+ACCOUNT_CLASSES = {cls.__name__: cls for cls in (BankAccount, InterestRewardsAcct, SavingsAcct, ChildAccount)}
+
+
+class _Shard:
+    # Runs inside a worker process and owns the accounts hashed to it.
+    # Funds reserved by phase one of a cross-shard transfer stay in the
+    # balance but cannot be spent by anything else until commit or abort.
+    def __init__(self):
+        self.accounts = {}
+        self.reserved = {}
+        self.reservations = {}
+
+    def execute(self, command):
+        try:
+            return 'ok', getattr(self, 'do_' + command[0])(*command[1:])
+        except BalanceException as exc:
+            return 'error', (BalanceException, str(exc))
+        except KeyError as exc:
+            return 'missing', exc.args[0]
+        except Exception as exc:
+            # Reported like any other failure: letting it escape would end
+            # the worker and lose every account on the shard.
+            return 'error', (type(exc), str(exc))
+
+    def _check_available(self, account, cents, message):
+        reserved = self.reserved.get(account.name)
+        if reserved and account._balance - reserved - cents < 0:
+            raise BalanceException(message.format(name=account.name))
+
+    def _withdraw_cost(self, account, amount):
+        return to_cents(amount) + getattr(account, '_fee', 0)
+
+    def do_open(self, cls_name, initial_amount, name, *args):
+        if name in self.accounts:
+            raise BalanceException(f"Account '{name}' already exists.")
+        self.accounts[name] = ACCOUNT_CLASSES[cls_name](initial_amount, name, *args)
+
+    def do_open_child(self, parent_name, initial_amount, name):
+        if name in self.accounts:
+            raise BalanceException(f"Account '{name}' already exists.")
+        child = self.accounts[parent_name].create_child_account(initial_amount, name)
+        if child is not None:
+            self.accounts[name] = child
+        return child is not None
+
+    def do_balance(self, name):
+        return self.accounts[name].balance
+
+    def do_is_blocked(self, name):
+        return self.accounts[name].is_blocked
+
+    def do_deposit(self, name, amount):
+        self.accounts[name].deposit(amount)
+
+    def do_withdraw(self, name, amount):
+        account = self.accounts[name]
+        if to_cents(amount) > 0:
+            self._check_available(account, self._withdraw_cost(account, amount),
+                                  "Insufficient funds in account '{name}'.")
+        account.withdraw(amount)
+
+    def do_transfer(self, name, amount, target_name):
+        account = self.accounts[name]
+        target = self.accounts[target_name]
+        if not account.is_blocked and to_cents(amount) > 0:
+            self._check_available(account, self._withdraw_cost(account, amount),
+                                  "Insufficient funds for the transaction in account '{name}'.")
+        account.transfer(amount, target)
+
+    def do_transfer_to_parent(self, name, amount):
+        account = self.accounts[name]
+        if not account.is_blocked and to_cents(amount) > 0:
+            self._check_available(account, self._withdraw_cost(account, amount),
+                                  "Insufficient funds for the transaction in account '{name}'.")
+        account.transfer_to_parent(amount)
+
+    def do_reserve(self, txid, name, amount):
+        # Phase one on the source shard: the same checks BankAccount.transfer
+        # and withdraw make, against the balance minus earlier reservations.
+        account = self.accounts[name]
+        if account.is_blocked:
+            return 'blocked'
+        cents = to_cents(amount)
+        if cents <= 0:
+            raise BalanceException("Transfer amount must be positive.")
+        available = account._balance - self.reserved.get(name, 0)
+        if available < cents:
+            raise BalanceException(f"Insufficient funds for the transaction in account '{name}'.")
+        cost = self._withdraw_cost(account, amount)
+        if available - cost < 0:
+            raise BalanceException(f"Insufficient funds in account '{name}'.")
+        self.reserved[name] = self.reserved.get(name, 0) + cost
+        self.reservations[txid] = (name, cost)
+        return 'reserved'
+
+    def do_prepare(self, name):
+        # Phase one on the target shard: the account must exist.
+        self.accounts[name]
+        return 'prepared'
+
+    def _release(self, txid):
+        name, cost = self.reservations.pop(txid)
+        self.reserved[name] -= cost
+        if not self.reserved[name]:
+            del self.reserved[name]
+        return self.accounts[name]
+
+    def do_abort(self, txid):
+        self._release(txid)
+
+    def do_commit(self, txid, amount):
+        # Phase two on the source shard: the debit half of BankAccount.transfer.
+        account = self._release(txid)
+        account.withdraw(amount)
+        account.log_transaction('Transfer', to_cents(amount))
+        account.notifier.notify('transfer', account)
+        account.check_minimum_balance()
+
+    def do_credit(self, name, amount):
+        # Phase two on the target shard. A blocked target ignores the deposit,
+        # as it does for a local transfer.
+        self.accounts[name].deposit(amount)
+
+
+def _shard_main(connection):
+    bank_accounts.set_notifier(SilentNotifier())
+    shard = _Shard()
+    while True:
+        commands = connection.recv()
+        if commands is None:
+            break
+        connection.send([shard.execute(command) for command in commands])
+    connection.close()
+
+
+def _unwrap(reply):
+    status, value = reply
+    if status == 'ok':
+        return value
+    if status == 'missing':
+        return KeyError(value)
+    exc_type, message = value
+    return exc_type(message)
+
+
+def _raise_or_return(result):
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+class ShardedLedger:
+    # Accounts are partitioned by a stable hash of their name across worker
+    # processes; a child account lives on its parent's shard. Transfers
+    # between shards use reserve/prepare, then commit/credit.
+    def __init__(self, num_shards=None, context=None):
+        ctx = multiprocessing.get_context(context)
+        self.num_shards = num_shards or os.cpu_count() or 1
+        self.connections = []
+        self.processes = []
+        for _ in range(self.num_shards):
+            parent_end, child_end = ctx.Pipe()
+            process = ctx.Process(target=_shard_main, args=(child_end,), daemon=True)
+            process.start()
+            child_end.close()
+            self.connections.append(parent_end)
+            self.processes.append(process)
+        self.placement = {}
+        self._txids = itertools.count(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def shard_of(self, name):
+        shard = self.placement.get(name)
+        if shard is None:
+            shard = zlib.crc32(name.encode('utf-8')) % self.num_shards
+        return shard
+
+    def _roundtrip(self, commands_by_shard):
+        # Sends every shard its commands before waiting on any reply, so the
+        # shards work in parallel.
+        busy = [shard for shard, commands in enumerate(commands_by_shard) if commands]
+        for shard in busy:
+            self.connections[shard].send(commands_by_shard[shard])
+        replies = [[] for _ in range(self.num_shards)]
+        for shard in busy:
+            replies[shard] = self.connections[shard].recv()
+        return replies
+
+    def open(self, account_cls, initial_amount, name, *args):
+        shard = self.shard_of(name)
+        result = _unwrap(self._roundtrip(self._single(shard, ('open', account_cls.__name__,
+                                                              initial_amount, name) + args))[shard][0])
+        _raise_or_return(result)
+        self.placement[name] = shard
+
+    def open_child(self, parent_name, initial_amount, name):
+        shard = self.shard_of(parent_name)
+        created = _raise_or_return(_unwrap(self._roundtrip(
+            self._single(shard, ('open_child', parent_name, initial_amount, name)))[shard][0]))
+        if created:
+            self.placement[name] = shard
+        return created
+
+    def _single(self, shard, command):
+        commands = [[] for _ in range(self.num_shards)]
+        commands[shard].append(command)
+        return commands
+
+    def deposit(self, name, amount):
+        return _raise_or_return(self.submit([('deposit', name, amount)])[0])
+
+    def withdraw(self, name, amount):
+        return _raise_or_return(self.submit([('withdraw', name, amount)])[0])
+
+    def transfer(self, name, amount, target_name):
+        return _raise_or_return(self.submit([('transfer', name, amount, target_name)])[0])
+
+    def transfer_to_parent(self, name, amount):
+        return _raise_or_return(self.submit([('transfer_to_parent', name, amount)])[0])
+
+    def balance(self, name):
+        return _raise_or_return(self.submit([('balance', name)])[0])
+
+    def is_blocked(self, name):
+        return _raise_or_return(self.submit([('is_blocked', name)])[0])
+
+    def submit(self, ops):
+        # ops are tuples such as ('deposit', name, amount) or
+        # ('transfer', name, amount, target_name). Returns one result per op:
+        # its value, or the exception it failed with: a BalanceException,
+        # a KeyError for an unknown account, or whatever else was raised.
+        # Operations on one shard run in order. Cross-shard transfers reserve
+        # their funds in that order, and their credits land after the batch's
+        # other operations on the target shard.
+        results = [None] * len(ops)
+        first = [[] for _ in range(self.num_shards)]
+        first_slots = [[] for _ in range(self.num_shards)]
+        transfers = []
+        for index, op in enumerate(ops):
+            shard = self.shard_of(op[1])
+            if op[0] == 'transfer' and self.shard_of(op[3]) != shard:
+                txid = next(self._txids)
+                target_shard = self.shard_of(op[3])
+                first[shard].append(('reserve', txid, op[1], op[2]))
+                first_slots[shard].append((index, 'reserve'))
+                first[target_shard].append(('prepare', op[3]))
+                first_slots[target_shard].append((index, 'prepare'))
+                transfers.append((index, txid, shard, target_shard, op))
+            else:
+                first[shard].append(op)
+                first_slots[shard].append((index, 'op'))
+
+        phase_one = {}
+        for shard, replies in enumerate(self._roundtrip(first)):
+            for (index, kind), reply in zip(first_slots[shard], replies):
+                if kind == 'op':
+                    results[index] = _unwrap(reply)
+                else:
+                    phase_one.setdefault(index, {})[kind] = reply
+
+        second = [[] for _ in range(self.num_shards)]
+        second_slots = [[] for _ in range(self.num_shards)]
+        for index, txid, shard, target_shard, op in transfers:
+            reserve = _unwrap(phase_one[index]['reserve'])
+            prepare = _unwrap(phase_one[index]['prepare'])
+            if isinstance(reserve, Exception) or reserve == 'blocked':
+                results[index] = reserve if isinstance(reserve, Exception) else None
+                continue
+            if isinstance(prepare, Exception):
+                second[shard].append(('abort', txid))
+                second_slots[shard].append(None)
+                results[index] = prepare
+                continue
+            second[shard].append(('commit', txid, op[2]))
+            second_slots[shard].append((index, target_shard, op))
+
+        third = [[] for _ in range(self.num_shards)]
+        third_slots = [[] for _ in range(self.num_shards)]
+        for shard, replies in enumerate(self._roundtrip(second)):
+            for slot, reply in zip(second_slots[shard], replies):
+                if slot is None:
+                    continue
+                index, target_shard, op = slot
+                committed = _unwrap(reply)
+                if isinstance(committed, Exception):
+                    results[index] = committed
+                    continue
+                third[target_shard].append(('credit', op[3], op[2]))
+                third_slots[target_shard].append(index)
+
+        for shard, replies in enumerate(self._roundtrip(third)):
+            for index, reply in zip(third_slots[shard], replies):
+                results[index] = _unwrap(reply)
+        return results
@@ -0,0 +1,54 @@
+import csv
+
+import journal
+from money import from_cents
+
+
+STATEMENT_FIELDS = ['account_id', 'name', 'seq', 'timestamp', 'action', 'amount', 'balance']
+
+
+def statement(account, start_time, end_time):
+    # Entries stamped in [start_time, end_time) with the balance after each
+    # one, plus the opening and closing balances of the period. Only the
+    # period itself and at most CHECKPOINT_EVERY earlier entries are read.
+    history = account.transaction_history
+    first = history.index_of_time(start_time)
+    last = history.index_of_time(end_time)
+    opening = history.balance_after(first - 1) if first else 0
+    actions = journal.ACTIONS
+    entries = [(seq, timestamp, actions[code], from_cents(cents), from_cents(balance))
+               for seq, timestamp, code, cents, balance in history.running_balances(first, last)]
+    return {
+        'account_id': account.account_id,
+        'name': account.name,
+        'start': start_time,
+        'end': end_time,
+        'opening_balance': from_cents(opening),
+        'closing_balance': entries[-1][4] if entries else from_cents(opening),
+        'entries': entries,
+    }
+
+
+def stream_statements(accounts, start_time, end_time):
+    # One statement at a time, so a run over millions of accounts only
+    # ever holds the current one.
+    for account in accounts:
+        yield statement(account, start_time, end_time)
+
+
+def write_statements(accounts, start_time, end_time, path):
+    # CSV with an 'Opening balance' row, then the period's entries, per
+    # account. Returns the number of accounts written.
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(STATEMENT_FIELDS)
+        for report in stream_statements(accounts, start_time, end_time):
+            account_id = report['account_id']
+            name = report['name']
+            writer.writerow([account_id, name, '', repr(start_time), 'Opening balance', '',
+                             report['opening_balance']])
+            writer.writerows([account_id, name, seq, repr(timestamp), action, amount, balance]
+                             for seq, timestamp, action, amount, balance in report['entries'])
+            count += 1
+    return count
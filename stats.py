@@ -0,0 +1,193 @@
+import journal
+from journal import MEMO_CODES, OPENING_CODE
+from money import from_cents
+
+
+class Aggregate:
+    __slots__ = ('counts', 'sums', 'inflow', 'outflow', 'fees', 'balance', 'last_activity')
+
+    def __init__(self):
+        self.counts = []
+        self.sums = []
+        self.inflow = 0
+        self.outflow = 0
+        self.fees = 0
+        self.balance = 0
+        self.last_activity = None
+
+    def _grow(self, size):
+        grow = size - len(self.counts)
+        if grow > 0:
+            self.counts.extend([0] * grow)
+            self.sums.extend([0] * grow)
+
+    def add(self, code, cents, delta, timestamp):
+        counts = self.counts
+        if code >= len(counts):
+            self._grow(code + 1)
+        counts[code] += 1
+        self.sums[code] += cents
+        if code != OPENING_CODE and code not in MEMO_CODES:
+            if cents > 0:
+                self.inflow += cents
+            else:
+                self.outflow += cents
+        self.balance += delta
+        self.last_activity = timestamp
+
+    def add_totals(self, counts, sums, timestamp):
+        # Entry counts and totals indexed by action code, where all entries
+        # of one code move money the same way; the balance is left to the
+        # caller.
+        self._grow(len(counts))
+        own_counts = self.counts
+        own_sums = self.sums
+        for code, count in enumerate(counts):
+            if count:
+                cents = sums[code]
+                own_counts[code] += count
+                own_sums[code] += cents
+                if code != OPENING_CODE and code not in MEMO_CODES:
+                    if cents > 0:
+                        self.inflow += cents
+                    else:
+                        self.outflow += cents
+        self.last_activity = timestamp
+
+    def merge(self, other):
+        self._grow(len(other.counts))
+        counts = self.counts
+        sums = self.sums
+        for code, count in enumerate(other.counts):
+            counts[code] += count
+            sums[code] += other.sums[code]
+        self.inflow += other.inflow
+        self.outflow += other.outflow
+        self.fees += other.fees
+        self.balance += other.balance
+        if other.last_activity is not None and (self.last_activity is None
+                                                or other.last_activity > self.last_activity):
+            self.last_activity = other.last_activity
+
+    def __getstate__(self):
+        return self.counts, self.sums, self.inflow, self.outflow, self.fees, self.balance, self.last_activity
+
+    def __setstate__(self, state):
+        self.counts, self.sums, self.inflow, self.outflow, self.fees, self.balance, self.last_activity = state
+
+    def copy(self):
+        aggregate = Aggregate()
+        aggregate.merge(self)
+        return aggregate
+
+    def as_dict(self):
+        actions = journal.ACTIONS
+        return {
+            'count': sum(self.counts),
+            'actions': {actions[code]: {'count': count, 'total': from_cents(self.sums[code])}
+                        for code, count in enumerate(self.counts) if count},
+            'inflow': from_cents(self.inflow),
+            'outflow': from_cents(self.outflow),
+            'net_flow': from_cents(self.inflow + self.outflow),
+            'fees': from_cents(self.fees),
+            'balance': from_cents(self.balance),
+            'last_activity': self.last_activity,
+        }
+
+
+class AccountStats(Aggregate):
+    # Running totals for one account, updated by log_transaction. Accounts
+    # with children also keep a family aggregate covering all descendants,
+    # and every change is pushed up the parent chain, so family queries are
+    # answered without visiting the children.
+    __slots__ = ('min_balance', 'max_balance', 'family', 'parent')
+
+    def __init__(self):
+        super().__init__()
+        self.min_balance = None
+        self.max_balance = None
+        self.family = None
+        self.parent = None
+
+    def record(self, code, cents, balance, timestamp):
+        delta = balance - self.balance
+        self.add(code, cents, delta, timestamp)
+        if self.min_balance is None or balance < self.min_balance:
+            self.min_balance = balance
+        if self.max_balance is None or balance > self.max_balance:
+            self.max_balance = balance
+        stats = self if self.family is not None else self.parent
+        while stats is not None:
+            stats.family.add(code, cents, delta, timestamp)
+            stats = stats.parent
+
+    def record_many(self, codes, amounts, balances, timestamp):
+        # Same totals as record() for each entry in turn, for entries
+        # written together at timestamp.
+        batch = Aggregate()
+        add = batch.add
+        for code, cents in zip(codes, amounts):
+            add(code, cents, 0, timestamp)
+        self.record_batch(batch, balances[-1], min(balances), max(balances))
+
+    def record_batch(self, batch, balance, low, high):
+        # Folds in batch, the totals of entries that end at balance and
+        # pass through low and high at the extremes.
+        batch.balance = balance - self.balance
+        self.merge(batch)
+        if self.min_balance is None or low < self.min_balance:
+            self.min_balance = low
+        if self.max_balance is None or high > self.max_balance:
+            self.max_balance = high
+        stats = self if self.family is not None else self.parent
+        while stats is not None:
+            stats.family.merge(batch)
+            stats = stats.parent
+
+    def sync_balance(self, balance):
+        # Balance changed without a journal entry (e.g. a direct assignment).
+        delta = balance - self.balance
+        if not delta:
+            return
+        self.balance = balance
+        stats = self if self.family is not None else self.parent
+        while stats is not None:
+            stats.family.balance += delta
+            stats = stats.parent
+
+    def record_fee(self, cents):
+        self.fees += cents
+        stats = self if self.family is not None else self.parent
+        while stats is not None:
+            stats.family.fees += cents
+            stats = stats.parent
+
+    def attach(self, parent):
+        # Links this account under parent and adds its family totals to
+        # every ancestor.
+        self.parent = parent
+        totals = self.family if self.family is not None else self
+        stats = parent
+        while stats is not None:
+            if stats.family is None:
+                stats.family = stats.copy()
+            stats.family.merge(totals)
+            stats = stats.parent
+
+    def __getstate__(self):
+        # The parent link is left out: it points into another account's stats.
+        return super().__getstate__(), self.min_balance, self.max_balance, self.family
+
+    def __setstate__(self, state):
+        aggregate, self.min_balance, self.max_balance, self.family = state
+        super().__setstate__(aggregate)
+        self.parent = None
+
+    def as_dict(self):
+        result = super().as_dict()
+        result['min_balance'] = from_cents(self.min_balance) if self.min_balance is not None else None
+        result['max_balance'] = from_cents(self.max_balance) if self.max_balance is not None else None
+        return result
+
+    def family_dict(self):
+        return (self.family if self.family is not None else self).as_dict()
@@ -0,0 +1,95 @@
+import unittest
+from decimal import Decimal
+
+import accrual
+import bank_accounts
+from accrual import EndOfDay, daily_interest
+from bank_accounts import BankAccount, InterestRewardsAcct, SavingsAcct
+from notifiers import SilentNotifier, StdoutNotifier
+
+
+class TestDailyInterest(unittest.TestCase):
+
+    def test_rounds_half_even(self):
+        # 365 bp a year is exactly 1 bp a day
+        self.assertEqual(list(daily_interest([10000, 5000, 15000, 25000, 0, -500], 365)),
+                         [1, 0, 2, 2, 0, 0])
+
+    def test_fallback_matches_numpy(self):
+        balances = list(range(-1000, 200000, 997))
+        expected = list(daily_interest(balances, 275))
+        saved = accrual.np
+        accrual.np = None
+        self.addCleanup(setattr, accrual, 'np', saved)
+        self.assertEqual(list(daily_interest(balances, 275)), expected)
+
+
+class TestEndOfDay(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+
+    def test_posts_interest_to_interest_bearing_accounts(self):
+        basic = BankAccount(1000, 'Basic')
+        rewards = InterestRewardsAcct(3650, 'Rewards')
+        savings = SavingsAcct(7300, 'Savings')
+        report = EndOfDay([basic, rewards, savings], annual_rate_bp=1000).run()
+        self.assertEqual(basic.balance, 1000)
+        self.assertEqual(rewards.balance, Decimal('3651.00'))
+        self.assertEqual(savings.balance, Decimal('7302.00'))
+        self.assertEqual(rewards.transaction_history[-1], ('Interest Accrued', Decimal('1.00')))
+        self.assertEqual(report['interest_posted'], 2)
+        self.assertEqual(report['interest'], Decimal('3.00'))
+        self.assertTrue(report['complete'])
+
+    def test_skips_blocked_accounts(self):
+        account = InterestRewardsAcct(3650, 'Frozen', 100)
+        account.is_blocked = True
+        report = EndOfDay([account], annual_rate_bp=1000).run()
+        self.assertEqual(account.balance, 3650)
+        self.assertEqual(report['interest_posted'], 0)
+
+    def test_maintenance_fee_blocks_below_minimum(self):
+        healthy = SavingsAcct(1000, 'Healthy', 5, 100)
+        marginal = SavingsAcct(102, 'Marginal', 5, 100)
+        rewards = InterestRewardsAcct(1000, 'NoFee')
+        engine = EndOfDay([healthy, marginal, rewards], annual_rate_bp=0, maintenance_fee=3)
+        self.assertEqual(engine.run()['fees_charged'], 0)
+        report = engine.run(charge_fees=True)
+        self.assertEqual(healthy.balance, 997)
+        self.assertEqual(marginal.balance, 99)
+        self.assertTrue(marginal.is_blocked)
+        self.assertFalse(healthy.is_blocked)
+        self.assertEqual(rewards.balance, 1000)
+        self.assertEqual(report['fees_charged'], 2)
+        self.assertEqual(report['fees'], Decimal('6.00'))
+        self.assertEqual(report['blocked'], 1)
+        self.assertEqual(healthy.stats()['fees'], Decimal('3.00'))
+
+    def test_maintenance_fee_never_overdraws(self):
+        poor = SavingsAcct(Decimal('0.02'), 'Poor', 5, 100)
+        empty = SavingsAcct(0, 'Empty', 5, 100)
+        report = EndOfDay([poor, empty], annual_rate_bp=0, maintenance_fee=3).run(charge_fees=True)
+        self.assertEqual(poor.balance, 0)
+        self.assertEqual(empty.balance, 0)
+        self.assertEqual(report['fees_charged'], 1)
+        self.assertEqual(report['fees'], Decimal('0.02'))
+        self.assertEqual(report['fees_uncollected'], 2)
+        self.assertEqual(poor.stats()['fees'], Decimal('0.02'))
+        self.assertEqual(len(empty.transaction_history), 1)
+
+    def test_time_budget_resumes_between_chunks(self):
+        accounts = [InterestRewardsAcct(3650, f'Chunk{i}') for i in range(10)]
+        engine = EndOfDay(accounts, annual_rate_bp=1000, chunk_size=3)
+        report = engine.run(time_budget=0)
+        self.assertEqual(report['processed'], 0)
+        self.assertFalse(report['complete'])
+        report = engine.run(start=report['next_start'])
+        self.assertTrue(report['complete'])
+        self.assertEqual(report['processed'], 10)
+        self.assertTrue(all(account.balance == Decimal('3651.00') for account in accounts))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+
+import bank_accounts
+from async_ledger import AsyncLedger
+from bank_accounts import BalanceException, ChildAccount, open_accounts_bulk
+from notifiers import SilentNotifier, StdoutNotifier
+
+
+class TestAsyncLedger(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        self.source, self.target = open_accounts_bulk([(1000, 'AsyncSource'), (0, 'AsyncTarget')])
+
+    async def test_operations(self):
+        async with AsyncLedger() as ledger:
+            await ledger.deposit(self.source, 100)
+            await ledger.withdraw(self.source, 50)
+            await ledger.transfer(self.source, 300, self.target)
+            self.assertEqual(await ledger.balance(self.source), 750)
+            self.assertEqual(await ledger.balance(self.target), 300)
+
+    async def test_errors_propagate(self):
+        async with AsyncLedger() as ledger:
+            with self.assertRaises(BalanceException):
+                await ledger.withdraw(self.target, 10)
+            with self.assertRaises(BalanceException):
+                await ledger.transfer(self.source, 5000, self.target)
+
+    async def test_transfer_to_parent(self):
+        child, = open_accounts_bulk([(100, 'AsyncChild', self.source)], ChildAccount)
+        async with AsyncLedger() as ledger:
+            await ledger.transfer_to_parent(child, 40)
+            self.assertEqual(await ledger.balance(self.source), 1040)
+
+    async def test_many_concurrent_clients(self):
+        async with AsyncLedger(queue_size=8) as ledger:
+            await asyncio.gather(*(ledger.transfer(self.source, 1, self.target) for _ in range(500)))
+            self.assertEqual(await ledger.balance(self.target), 500)
+            self.assertEqual(await ledger.balance(self.source), 500)
+
+    async def test_reads_are_coalesced_and_see_prior_writes(self):
+        ledger = AsyncLedger()
+        reads = 0
+        original_read = ledger._read
+
+        def counting_read(account, future):
+            nonlocal reads
+            reads += 1
+            return original_read(account, future)
+
+        ledger._read = counting_read
+        write = asyncio.ensure_future(ledger.deposit(self.source, 10))
+        balances = await asyncio.gather(*(ledger.balance(self.source) for _ in range(50)))
+        await write
+        await ledger.close()
+        self.assertEqual(set(balances), {1010})
+        self.assertEqual(reads, 1)
+
+    async def test_cancelled_read_does_not_block_later_reads(self):
+        ledger = AsyncLedger(queue_size=1)
+        await ledger.deposit(self.source, 1)
+        queue = ledger._queues[self.source.account_id]
+        ledger._workers.pop(self.source.account_id).cancel()
+        queue.put_nowait((lambda: None, (), asyncio.get_running_loop().create_future()))
+        blocked = asyncio.ensure_future(ledger.balance(self.source))
+        await asyncio.sleep(0)
+        blocked.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await blocked
+        ledger._workers[self.source.account_id] = asyncio.ensure_future(ledger._drain(queue))
+        self.assertEqual(await asyncio.wait_for(ledger.balance(self.source), 1), 1001)
+        await ledger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+import benchmark_suite
+from benchmark_suite import CASES, compare, load, run_suite, save, summarize
+
+
+def results(**means):
+    return {'results': {name: summarize([mean, mean]) for name, mean in means.items()}}
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_covers_every_account_type(self):
+        for cls in benchmark_suite.ACCOUNT_TYPES:
+            for operation in ('open', 'deposit', 'withdraw', 'transfer'):
+                self.assertIn(f'{operation}.{cls.__name__}', CASES)
+
+    def test_run_save_and_load(self):
+        names = ['deposit.SavingsAcct', 'transfer.ChildAccount', 'transfer_to_parent.ChildAccount']
+        current = run_suite(ops=200, warmup=1, repeats=3, names=names, memory=False)
+        self.assertEqual(sorted(current['results']), sorted(names))
+        for result in current['results'].values():
+            self.assertEqual(len(result['samples']), 3)
+            self.assertGreater(result['mean'], 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            save(current, path)
+            self.assertEqual(load(path), current)
+
+    def test_compare_flags_only_significant_regressions(self):
+        baseline = results(fast=1000.0, steady=1000.0, better=1000.0)
+        current = results(fast=800.0, steady=970.0, better=1500.0)
+        report = {row['name']: row for row in compare(current, baseline)}
+        self.assertTrue(report['fast']['regression'])
+        self.assertFalse(report['steady']['regression'])
+        self.assertTrue(report['better']['improvement'])
+        self.assertAlmostEqual(report['fast']['change'], -0.2)
+
+    def test_compare_ignores_noisy_results(self):
+        baseline = {'results': {'noisy': summarize([500.0, 1500.0])}}
+        current = {'results': {'noisy': summarize([700.0, 900.0])}}
+        self.assertFalse(compare(current, baseline)[0]['regression'])
+
+    def test_memory_regresses_when_it_grows(self):
+        baseline = {'results': {'memory': benchmark_suite._memory(100.0)}}
+        current = {'results': {'memory': benchmark_suite._memory(130.0)}}
+        self.assertTrue(compare(current, baseline)[0]['regression'])
+
+
+if __name__ == '__main__':
+    unittest.main()
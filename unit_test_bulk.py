@@ -0,0 +1,52 @@
+import contextlib
+import io
+import unittest
+
+from bank_accounts import BankAccount, ChildAccount, InterestRewardsAcct, SavingsAcct, open_accounts_bulk
+
+
+class TestSlots(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+        for account in (BankAccount(10, 'SlotBank'), InterestRewardsAcct(10, 'SlotInterest'),
+                        SavingsAcct(10, 'SlotSavings')):
+            self.assertFalse(hasattr(account, '__dict__'))
+        parent = BankAccount(10, 'SlotParent')
+        self.assertFalse(hasattr(parent.create_child_account(5, 'SlotChild'), '__dict__'))
+
+    def test_unknown_attribute_rejected(self):
+        with self.assertRaises(AttributeError):
+            BankAccount(10, 'SlotStrict').nickname = 'x'
+
+
+class TestOpenAccountsBulk(unittest.TestCase):
+
+    def test_bulk_bank_accounts(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            accounts = open_accounts_bulk([(100, 'BulkA'), (200, 'BulkB', 50)])
+        self.assertEqual(out.getvalue(), '')
+        self.assertEqual([a.name for a in accounts], ['BulkA', 'BulkB'])
+        self.assertEqual(accounts[1].balance, 200)
+        self.assertEqual(accounts[1].min_balance, 50)
+        self.assertFalse(accounts[1].is_blocked)
+        self.assertEqual(accounts[0].transaction_history, [('Account opened', 100)])
+
+    def test_bulk_savings_accounts(self):
+        account, = open_accounts_bulk([(1000, 'BulkSavings', 7, 100)], SavingsAcct)
+        self.assertIsInstance(account, SavingsAcct)
+        self.assertEqual(account.fee, 7)
+        self.assertEqual(account.min_balance, 100)
+        account.withdraw(93)
+        self.assertEqual(account.balance, 900)
+
+    def test_bulk_child_accounts(self):
+        parent = BankAccount(100, 'BulkParent')
+        children = open_accounts_bulk(((10, f'BulkChild{i}', parent) for i in range(3)), ChildAccount)
+        self.assertTrue(all(child.parent_account is parent for child in children))
+        children[0].transfer_to_parent(10)
+        self.assertEqual(parent.balance, 110)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import csv
+import os
+import tempfile
+import unittest
+
+import bank_accounts
+import history_store
+from bank_accounts import BankAccount, InterestRewardsAcct, SavingsAcct
+from bulk_io import export_columnar, export_csv, import_columnar, import_csv
+from notifiers import BufferedNotifier, SilentNotifier, StdoutNotifier
+
+
+class BulkIOTestCase(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def populate(self):
+        parent = BankAccount(1000, 'IoParent', min_balance=100)
+        child = parent.create_child_account(300, 'IoChild')
+        grandchild = child.create_child_account(40, 'IoGrandchild')
+        savings = SavingsAcct(500, 'IoSavings', fee=2, min_balance=50)
+        rewards = InterestRewardsAcct(100, 'IoRewards')
+        parent.deposit(50.25)
+        child.transfer_to_parent(120)
+        savings.withdraw(10)
+        rewards.deposit(10)
+        parent.withdraw(1000)
+        parent.transfer(20, savings)
+        return [parent, child, grandchild, savings, rewards]
+
+    def assertImported(self, originals, imported):
+        self.assertEqual(sorted(imported), sorted(account.account_id for account in originals))
+        for original in originals:
+            account = imported[original.account_id]
+            self.assertIs(type(account), type(original))
+            self.assertEqual(account.name, original.name)
+            self.assertEqual(account.balance, original.balance)
+            self.assertEqual(account.min_balance, original.min_balance)
+            self.assertEqual(account.is_blocked, original.is_blocked)
+            self.assertEqual(list(account.transaction_history.raw_entries()),
+                             list(original.transaction_history.raw_entries()))
+            self.assertEqual(account.stats(), original.stats())
+            self.assertEqual(account.family_stats(), original.family_stats())
+        parent, child, grandchild = (imported[account.account_id] for account in originals[:3])
+        self.assertIs(child.parent_account, parent)
+        self.assertIs(grandchild.parent_account, child)
+        self.assertEqual(imported[originals[3].account_id].fee, 2)
+
+    def test_csv_round_trip(self):
+        accounts = self.populate()
+        export_csv(accounts, self.path('accounts.csv'), self.path('entries.csv'))
+        imported = import_csv(self.path('accounts.csv'), self.path('entries.csv'), chunk_size=4)
+        self.assertImported(accounts, imported)
+
+    def test_columnar_round_trip(self):
+        accounts = self.populate()
+        export_columnar(accounts, self.path('accounts.col'), chunk_size=3)
+        self.assertImported(accounts, import_columnar(self.path('accounts.col')))
+
+    def test_import_is_silent_and_keeps_counters_ahead(self):
+        accounts = self.populate()
+        export_columnar(accounts, self.path('accounts.col'))
+        notifier = BufferedNotifier()
+        bank_accounts.set_notifier(notifier)
+        imported = import_columnar(self.path('accounts.col'))
+        self.assertEqual(len(notifier.events), 0)
+        fresh = BankAccount(1, 'AfterImport')
+        self.assertGreater(fresh.account_id, max(imported))
+        last_seq = max(seq for account in imported.values()
+                       for seq, _, _, _ in account.transaction_history.raw_entries())
+        self.assertGreater(fresh.transaction_history.entry(0)[0], last_seq)
+
+    def test_import_spills_to_history_files(self):
+        accounts = self.populate()
+        export_columnar(accounts, self.path('accounts.col'), chunk_size=2)
+        imported = import_columnar(self.path('accounts.col'), history_dir=self.path('history'))
+        for account in imported.values():
+            self.addCleanup(account.transaction_history.archive.close)
+            self.assertEqual(account.transaction_history.nbytes(), 0)
+        self.assertImported(accounts, imported)
+
+    def test_spilled_import_keeps_few_files_open(self):
+        self.addCleanup(setattr, history_store, 'MAX_OPEN_FILES', history_store.MAX_OPEN_FILES)
+        history_store.MAX_OPEN_FILES = 4
+        accounts = []
+        for i in range(20):
+            account = BankAccount(100, f'IoMany{i}')
+            account.deposit(i + 1)
+            accounts.append(account)
+        export_csv(accounts, self.path('accounts.csv'), self.path('entries.csv'))
+        for _ in range(2):
+            imported = import_csv(self.path('accounts.csv'), self.path('entries.csv'), chunk_size=8,
+                                  history_dir=self.path('history'))
+            self.assertLessEqual(len(history_store._open_files), 4)
+        for account in imported.values():
+            self.addCleanup(account.transaction_history.archive.close)
+        for original in accounts:
+            self.assertEqual(list(imported[original.account_id].transaction_history.raw_entries()),
+                             list(original.transaction_history.raw_entries()))
+        self.assertLessEqual(len(history_store._open_files), 4)
+
+    def test_rejects_out_of_order_history(self):
+        accounts = self.populate()
+        export_csv(accounts, self.path('accounts.csv'), self.path('entries.csv'))
+        with open(self.path('entries.csv'), newline='') as f:
+            rows = list(csv.reader(f))
+        rows[2], rows[3] = rows[3], rows[2]
+        with open(self.path('entries.csv'), 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+        with self.assertRaises(ValueError):
+            import_csv(self.path('accounts.csv'), self.path('entries.csv'))
+
+    def test_rejects_missing_parent(self):
+        accounts = self.populate()
+        export_csv(accounts[1:], self.path('accounts.csv'), self.path('entries.csv'))
+        with self.assertRaises(ValueError):
+            import_csv(self.path('accounts.csv'))
+
+    def test_rejects_corrupt_columnar_file(self):
+        export_columnar(self.populate(), self.path('accounts.col'))
+        with open(self.path('accounts.col'), 'r+b') as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b'\xff\xff\xff')
+        with self.assertRaises(ValueError):
+            import_columnar(self.path('accounts.col'))
+
+
+if __name__ == '__main__':
+    unittest.main()
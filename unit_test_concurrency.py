@@ -0,0 +1,85 @@
+import random
+import sys
+import threading
+import unittest
+
+import bank_accounts
+from bank_accounts import BalanceException, open_accounts_bulk
+from concurrency import StripedLocks, ThreadSafeBank
+from notifiers import SilentNotifier, StdoutNotifier
+
+
+class TestStripedLocks(unittest.TestCase):
+
+    def test_shared_stripe_taken_once(self):
+        locks = StripedLocks(stripes=1)
+        first, second = open_accounts_bulk([(10, 'StripeA'), (10, 'StripeB')])
+        with locks.hold(first, second):
+            with locks.hold(first):
+                pass
+
+
+class TestThreadSafeBank(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def run_workers(self, worker, count=8):
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+            self.assertFalse(thread.is_alive(), 'worker deadlocked')
+
+    def test_concurrent_transfers_conserve_money(self):
+        bank = ThreadSafeBank(StripedLocks(stripes=8))
+        accounts = open_accounts_bulk([(100, f'Stress{i}') for i in range(20)])
+
+        def worker(seed):
+            rng = random.Random(seed)
+            for _ in range(2000):
+                source, target = rng.sample(accounts, 2)
+                try:
+                    bank.transfer(source, rng.randint(1, 30), target)
+                except BalanceException:
+                    pass
+
+        self.run_workers(worker)
+        self.assertEqual(sum(account.balance for account in accounts), 2000)
+        self.assertTrue(all(account.balance >= 0 for account in accounts))
+
+    def test_opposite_transfers_do_not_deadlock(self):
+        bank = ThreadSafeBank()
+        left, right = open_accounts_bulk([(1000, 'Left'), (1000, 'Right')])
+
+        def worker(seed):
+            source, target = (left, right) if seed % 2 else (right, left)
+            for _ in range(1000):
+                try:
+                    bank.transfer(source, 1, target)
+                except BalanceException:
+                    pass
+
+        self.run_workers(worker)
+        self.assertEqual(left.balance + right.balance, 2000)
+
+    def test_concurrent_deposits_are_not_lost(self):
+        bank = ThreadSafeBank()
+        account, = open_accounts_bulk([(0, 'Deposits')])
+
+        def worker(seed):
+            for _ in range(1000):
+                bank.deposit(account, 1)
+
+        self.run_workers(worker)
+        self.assertEqual(account.balance, 8000)
+        self.assertEqual(len(account.transaction_history), 8001)
+
+
+if __name__ == '__main__':
+    unittest.main()
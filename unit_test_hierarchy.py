@@ -0,0 +1,106 @@
+import unittest
+
+import bank_accounts
+from bank_accounts import BalanceException, BankAccount, InterestRewardsAcct
+from concurrency import StripedLocks
+from hierarchy import HierarchyRegistry
+from notifiers import SilentNotifier, StdoutNotifier
+from rules import FAMILY, LimitExceeded, RuleEngine, VelocityRule
+
+
+class HierarchyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        self.registry = HierarchyRegistry().attach()
+        self.addCleanup(self.registry.detach)
+        self.parent = BankAccount(1000, 'HierarchyParent', min_balance=100)
+        self.first = self.parent.create_child_account(200, 'FirstChild')
+        self.second = self.parent.create_child_account(300, 'SecondChild')
+        self.grandchild = self.first.create_child_account(50, 'Grandchild')
+
+
+class TestHierarchyIndex(HierarchyTestCase):
+
+    def test_children_and_descendants(self):
+        self.assertEqual(self.registry.children(self.parent), [self.first, self.second])
+        self.assertEqual(self.registry.children(self.first), [self.grandchild])
+        self.assertEqual(list(self.registry.descendants(self.parent)),
+                         [self.first, self.grandchild, self.second])
+        self.assertEqual(self.registry.children(self.second), [])
+
+    def test_family_balance_tracks_changes(self):
+        self.assertEqual(self.registry.family_balance(self.parent), 1550)
+        self.grandchild.deposit(10)
+        self.second.withdraw(100)
+        self.assertEqual(self.registry.family_balance(self.parent), 1460)
+        self.assertEqual(self.registry.family_balance(self.first), 260)
+
+    def test_index_existing_accounts(self):
+        registry = HierarchyRegistry([self.parent, self.first, self.second, self.grandchild])
+        self.assertEqual(registry.children(self.parent), [self.first, self.second])
+
+
+class TestSweep(HierarchyTestCase):
+
+    def test_sweep_direct_children(self):
+        swept = self.registry.sweep_to_parent(self.parent)
+        self.assertEqual(swept, 500)
+        self.assertEqual(self.parent.balance, 1500)
+        self.assertEqual((self.first.balance, self.second.balance), (0, 0))
+        self.assertEqual(self.grandchild.balance, 50)
+        self.assertEqual(self.first.transaction_history[-1], ('Transfer to Parent', 200))
+
+    def test_recursive_sweep(self):
+        self.registry.sweep_to_parent(self.parent, recursive=True, locks=StripedLocks())
+        self.assertEqual(self.parent.balance, 1550)
+        self.assertEqual(self.registry.family_balance(self.parent), 1550)
+        self.assertTrue(all(child.balance == 0 for child in self.registry.descendants(self.parent)))
+
+    def test_sweep_skips_blocked_children(self):
+        blocked = self.parent.create_child_account(80, 'BlockedChild')
+        blocked.min_balance = 100
+        blocked.check_minimum_balance()
+        self.registry.sweep_to_parent(self.parent)
+        self.assertEqual(blocked.balance, 80)
+        self.assertEqual(self.parent.balance, 1500)
+
+    def test_sweep_stops_at_zero_below_a_negative_minimum(self):
+        parent = BankAccount(100, 'OverdraftParent')
+        first = parent.create_child_account(50, 'OverdraftFirst')
+        second = parent.create_child_account(50, 'OverdraftSecond')
+        second.min_balance = -10
+        self.assertEqual(self.registry.sweep_to_parent(parent), 100)
+        self.assertEqual((first.balance, second.balance, parent.balance), (0, 0, 200))
+
+    def test_sweep_into_blocked_parent_is_refused(self):
+        self.parent.withdraw(950)
+        with self.assertRaises(BalanceException):
+            self.registry.sweep_to_parent(self.parent)
+        self.assertEqual((self.first.balance, self.second.balance), (200, 300))
+
+    def test_sweep_refused_by_rule_moves_nothing(self):
+        engine = RuleEngine([VelocityRule('one-sweep', 'transfer_to_parent', 60, max_count=1,
+                                          scope=FAMILY)]).attach()
+        self.addCleanup(engine.detach)
+        with self.assertRaises(LimitExceeded):
+            self.registry.sweep_to_parent(self.parent)
+        self.assertEqual(self.parent.balance, 1000)
+        self.assertEqual((self.first.balance, self.second.balance), (200, 300))
+        with self.assertRaises(LimitExceeded):
+            self.registry.sweep_to_parent(self.parent, recursive=True)
+        self.assertEqual(self.grandchild.balance, 50)
+        engine.remove_rule('one-sweep')
+        engine.add_rule(VelocityRule('two-sweeps', 'transfer_to_parent', 60, max_count=2, scope=FAMILY))
+        self.assertEqual(self.registry.sweep_to_parent(self.parent), 500)
+
+    def test_sweep_into_interest_parent_earns_bonus(self):
+        parent = InterestRewardsAcct(0, 'InterestParent')
+        parent.create_child_account(100, 'InterestChild')
+        self.registry.sweep_to_parent(parent)
+        self.assertEqual(parent.balance, 105)
+
+
+if __name__ == '__main__':
+    unittest.main()
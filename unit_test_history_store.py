@@ -0,0 +1,118 @@
+import tempfile
+import unittest
+
+import bank_accounts
+from bank_accounts import BankAccount, open_accounts_bulk
+from history_store import RECORD, HistoryFile, spill_history
+from journal import TransactionJournal
+from notifiers import SilentNotifier, StdoutNotifier
+
+
+class HistoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_journal(self, count):
+        history = TransactionJournal()
+        for i in range(count):
+            history.restore(i + 1, 1000.0 + i, 'Deposit' if i % 2 else 'Withdraw', i * 100)
+        return history
+
+    def open_file(self, name='test.hist'):
+        archive = HistoryFile(f'{self.tmp.name}/{name}')
+        self.addCleanup(archive.close)
+        return archive
+
+
+class TestHistoryFile(HistoryTestCase):
+
+    def test_fixed_records(self):
+        archive = self.open_file()
+        self.make_journal(10).spill(archive)
+        self.assertEqual(len(archive), 10)
+        self.assertEqual(len(archive.view(2, 5)), 3 * RECORD.size)
+        self.assertEqual(archive.entry(3), (4, 1003.0, 'Deposit', 3))
+        self.assertEqual(archive.entry(-1)[0], 10)
+
+    def test_range_queries(self):
+        archive = self.open_file()
+        self.make_journal(1000).spill(archive)
+        self.assertEqual(archive.index_of_sequence(501), 500)
+        self.assertEqual(archive.index_of_time(1250.5), 251)
+        self.assertEqual(archive.index_of_time(5000), 1000)
+        pages = list(archive.pages(300))
+        self.assertEqual([len(page) for page in pages], [300, 300, 300, 100])
+        self.assertEqual(pages[1][0][0], 301)
+
+    def test_extend_while_views_are_held(self):
+        archive = self.open_file()
+        self.make_journal(10).spill(archive)
+        view = archive.view(0, 2)
+        entries = archive.raw_entries()
+        next(entries)
+        archive.extend([(11, 2000.0, 1, 100)])
+        self.assertEqual(len(archive), 11)
+        self.assertEqual(RECORD.unpack(view[:RECORD.size])[0], 1)
+        self.assertEqual(next(entries)[0], 2)
+        archive.extend([(12, 2001.0, 1, 100)])
+        self.assertEqual([entry[0] for entry in archive.raw_entries()], list(range(1, 13)))
+
+
+class TestSpilledJournal(HistoryTestCase):
+
+    def test_spilled_journal_behaves_like_list(self):
+        history = self.make_journal(20)
+        expected = list(history)
+        history.spill(self.open_file())
+        history.restore(21, 1020.0, 'Deposit', 2100)
+        expected.append(('Deposit', 21))
+        self.assertEqual(history.nbytes(), 26)
+        self.assertEqual(len(history), 21)
+        self.assertEqual(list(history), expected)
+        self.assertEqual(history[5], expected[5])
+        self.assertEqual(history[-1], expected[-1])
+        self.assertEqual(history[18:], expected[18:])
+        self.assertEqual(history[::5], expected[::5])
+
+    def test_indexes_span_archive_and_memory(self):
+        history = self.make_journal(10)
+        history.spill(self.open_file())
+        history.restore(11, 2000.0, 'Deposit', 100)
+        history.restore(12, 2001.0, 'Deposit', 100)
+        self.assertEqual(history.index_of_sequence(4), 3)
+        self.assertEqual(history.index_of_sequence(12), 11)
+        self.assertEqual([entry[0] for entry in history.since(1008.5)], [10, 11, 12])
+        self.assertEqual([len(page) for page in history.pages(5)], [5, 5, 2])
+
+    def test_spill_accounts(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        accounts = open_accounts_bulk([(100, 'SpillA'), (200, 'SpillB')])
+        accounts[0].deposit(5)
+        spill_history(accounts, self.tmp.name)
+        accounts[0].withdraw(10)
+        spill_history(accounts, self.tmp.name)
+        self.addCleanup(lambda: [account.transaction_history.archive.close() for account in accounts])
+        self.assertEqual(accounts[0].transaction_history, [('Account opened', 100), ('Deposit', 5),
+                                                           ('Withdraw', -10)])
+        self.assertEqual(len(accounts[0].transaction_history.archive), 3)
+        self.assertIsInstance(accounts[1], BankAccount)
+
+    def test_reused_id_starts_a_new_file(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        account = BankAccount(100, 'SpillOld')
+        account.deposit(1)
+        spill_history([account], self.tmp.name)
+        account.transaction_history.archive.close()
+        reused = BankAccount(50, 'SpillNew')
+        reused.account_id = account.account_id
+        spill_history([reused], self.tmp.name)
+        self.addCleanup(reused.transaction_history.archive.close)
+        self.assertEqual(list(reused.transaction_history), [('Account opened', 50)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import threading
+import traceback
+import unittest
+
+import bank_accounts
+from bank_accounts import BalanceException, BankAccount
+from concurrency import ThreadSafeBank
+from idempotency import DedupCache, IdempotencyConflict, IdempotentBank
+from notifiers import SilentNotifier, StdoutNotifier
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDedupCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = DedupCache(maxsize=2)
+        cache.put('a', 1, 'A')
+        cache.put('b', 2, 'B')
+        self.assertEqual(cache.get('a'), (1, 'A'))
+        cache.put('c', 3, 'C')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), (1, 'A'))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        cache = DedupCache(ttl=10, clock=clock)
+        cache.put('a', 1, 'A')
+        clock.now = 9.9
+        self.assertEqual(cache.get('a'), (1, 'A'))
+        clock.now = 10.0
+        self.assertIsNone(cache.get('a'))
+        cache.put('b', 2, 'B')
+        clock.now = 25.0
+        cache.put('c', 3, 'C')
+        self.assertEqual(len(cache), 1)
+
+
+class TestIdempotentBank(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        self.bank = IdempotentBank()
+
+    def test_retried_transfer_applies_once(self):
+        source = BankAccount(100, 'IdemSource')
+        target = BankAccount(0, 'IdemTarget')
+        for _ in range(3):
+            self.bank.transfer(source, 30, target, key='tx-1')
+        self.assertEqual(source.balance, 70)
+        self.assertEqual(target.balance, 30)
+        self.bank.transfer(source, 30, target, key='tx-2')
+        self.assertEqual(target.balance, 60)
+
+    def test_failure_is_replayed(self):
+        account = BankAccount(10, 'IdemFail')
+        with self.assertRaises(BalanceException):
+            self.bank.withdraw(account, 50, key='w-1')
+        account.deposit(100)
+        with self.assertRaises(BalanceException):
+            self.bank.withdraw(account, 50, key='w-1')
+        self.assertEqual(account.balance, 110)
+
+    def test_replayed_failures_do_not_accumulate_tracebacks(self):
+        account = BankAccount(10, 'IdemTraceback')
+        raised = []
+        for _ in range(100):
+            try:
+                self.bank.withdraw(account, 50, key='w-tb')
+            except BalanceException as exc:
+                raised.append(exc)
+        depths = set()
+        for exc in raised[1:]:
+            depth, tb = 0, exc.__traceback__
+            while tb is not None:
+                depth, tb = depth + 1, tb.tb_next
+            depths.add(depth)
+        self.assertEqual(len(depths), 1)
+        self.assertEqual(len({id(exc) for exc in raised}), 100)
+        self.assertEqual(str(raised[-1]), str(raised[0]))
+
+    def test_first_failure_keeps_its_traceback(self):
+        account = BankAccount(10, 'IdemOrigin')
+        try:
+            self.bank.withdraw(account, 50, key='w-origin')
+        except BalanceException as exc:
+            frames = traceback.extract_tb(exc.__traceback__)
+        else:
+            self.fail("withdraw did not raise")
+        self.assertEqual((os.path.basename(frames[-1].filename), frames[-1].name), ('bank_accounts.py', 'withdraw'))
+
+    def test_key_reused_for_another_operation(self):
+        account = BankAccount(100, 'IdemConflict')
+        self.bank.deposit(account, 5, key='d-1')
+        with self.assertRaises(IdempotencyConflict):
+            self.bank.deposit(account, 6, key='d-1')
+        with self.assertRaises(IdempotencyConflict):
+            self.bank.withdraw(account, 5, key='d-1')
+        self.assertEqual(account.balance, 105)
+
+    def test_unexpected_errors_are_not_cached(self):
+        account = BankAccount(100, 'IdemRetry')
+        with self.assertRaises(AttributeError):
+            self.bank.transfer_to_parent(account, 5, key='p-1')
+        self.assertIsNone(self.bank.cache.get('p-1'))
+        self.assertEqual(self.bank.in_flight, set())
+
+    def test_concurrent_retries_through_thread_safe_bank(self):
+        bank = IdempotentBank(bank=ThreadSafeBank())
+        account = BankAccount(0, 'IdemThreads')
+        threads = [threading.Thread(target=bank.deposit, args=(account, 1, f'key-{i % 50}'))
+                   for i in range(400)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(account.balance, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
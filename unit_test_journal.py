@@ -0,0 +1,55 @@
+import unittest
+
+from bank_accounts import BankAccount, SavingsAcct
+from journal import ACTIONS, TransactionJournal, action_code
+
+
+class TestTransactionJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.journal = TransactionJournal()
+        self.journal.append('Account opened', 10000)
+        self.journal.append('Deposit', 2550)
+        self.journal.append('Withdraw', -1000)
+
+    def test_iterates_as_tuples(self):
+        self.assertEqual(list(self.journal), [('Account opened', 100), ('Deposit', 25.5), ('Withdraw', -10)])
+
+    def test_indexing(self):
+        self.assertEqual(len(self.journal), 3)
+        self.assertEqual(self.journal[1], ('Deposit', 25.5))
+        self.assertEqual(self.journal[-1][0], 'Withdraw')
+        self.assertEqual(self.journal[1:], [('Deposit', 25.5), ('Withdraw', -10)])
+
+    def test_sequence_and_timestamps(self):
+        first, second = self.journal.entry(0), self.journal.entry(1)
+        self.assertLess(first[0], second[0])
+        self.assertLessEqual(first[1], second[1])
+        self.assertEqual(second[2:], ('Deposit', 25.5))
+
+    def test_unknown_action_is_interned(self):
+        code = action_code('Custom Action')
+        self.assertEqual(action_code('Custom Action'), code)
+        self.assertEqual(ACTIONS[code], 'Custom Action')
+        self.journal.append('Custom Action', 100)
+        self.assertEqual(self.journal[-1], ('Custom Action', 1))
+
+    def test_compact_storage(self):
+        self.assertEqual(self.journal.nbytes(), 3 * (2 + 8 + 8 + 8))
+
+
+class TestAccountJournal(unittest.TestCase):
+
+    def test_account_uses_journal(self):
+        account = SavingsAcct(1000, 'JournalSavings')
+        account.withdraw(100)
+        self.assertIsInstance(account.transaction_history, TransactionJournal)
+        self.assertEqual(account.transaction_history, [('Account opened', 1000), ('Withdraw with Fee', -105)])
+
+    def test_view_transaction_history(self):
+        account = BankAccount(10, 'JournalView')
+        account.view_transaction_history()
+
+
+if __name__ == '__main__':
+    unittest.main()
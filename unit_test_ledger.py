@@ -0,0 +1,123 @@
+import random
+import unittest
+
+import bank_accounts
+from bank_accounts import BalanceException, ChildAccount, InterestRewardsAcct, SavingsAcct, open_accounts_bulk
+from ledger import (BLOCKED, DEPOSIT, INSUFFICIENT_FUNDS, INVALID_AMOUNT, MIN_BALANCE, NOT_A_CHILD,
+                    OK, SAME_ACCOUNT, TRANSFER, TRANSFER_TO_PARENT, WITHDRAW, Ledger)
+from notifiers import SilentNotifier, StdoutNotifier
+
+
+def build_accounts():
+    parent = open_accounts_bulk([(1000, 'Parent', 100)])[0]
+    return [
+        parent,
+        open_accounts_bulk([(500, 'Interest', 50)], InterestRewardsAcct)[0],
+        open_accounts_bulk([(800, 'Savings', 5, 200)], SavingsAcct)[0],
+        open_accounts_bulk([(300, 'Child', parent)], ChildAccount)[0],
+        open_accounts_bulk([(50, 'Small', 20)])[0],
+    ]
+
+
+def apply_scalar(accounts, account_id, op, cents, target):
+    account = accounts[account_id]
+    amount = cents / 100
+    try:
+        if op == DEPOSIT:
+            account.deposit(amount)
+        elif op == WITHDRAW:
+            account.withdraw(amount)
+        elif op == TRANSFER:
+            account.transfer(amount, accounts[target])
+        else:
+            account.transfer_to_parent(amount)
+    except BalanceException:
+        return True
+    return False
+
+
+class TestLedgerBatch(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        self.ledger = Ledger(build_accounts())
+
+    def test_result_codes(self):
+        results = self.ledger.apply_batch(
+            [0, 0, 1, 2, 0, 4, 3, 0, 2],
+            [DEPOSIT, DEPOSIT, WITHDRAW, WITHDRAW, TRANSFER, WITHDRAW, TRANSFER_TO_PARENT,
+             TRANSFER_TO_PARENT, DEPOSIT],
+            [10000, -5, 99999, 70000, 100, 4000, 5000, 100, 100],
+            [0, 0, 0, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(list(results), [OK, INVALID_AMOUNT, INSUFFICIENT_FUNDS, MIN_BALANCE,
+                                         SAME_ACCOUNT, OK, OK, NOT_A_CHILD, BLOCKED])
+        self.assertEqual(self.ledger[0].balance, 1150)
+        self.assertEqual(self.ledger[2].balance, 95)
+        self.assertTrue(self.ledger[2].is_blocked)
+        self.assertTrue(self.ledger[4].is_blocked)
+
+    def test_matches_scalar_methods(self):
+        rng = random.Random(7)
+        scalar_accounts = build_accounts()
+        ops = [rng.choice((DEPOSIT, WITHDRAW, TRANSFER, TRANSFER_TO_PARENT)) for _ in range(2000)]
+        ids = [3 if op == TRANSFER_TO_PARENT else rng.randrange(5) for op in ops]
+        amounts = [rng.choice((-100, 0, 500, 2500, 10000, 40000)) for _ in ops]
+        targets = [rng.randrange(5) for _ in ops]
+
+        results = self.ledger.apply_batch(ids, ops, amounts, targets)
+        for i, op in enumerate(ops):
+            raised = apply_scalar(scalar_accounts, ids[i], op, amounts[i], targets[i])
+            self.assertEqual(raised, results[i] not in (OK, BLOCKED), i)
+
+        for batch_account, scalar_account in zip(self.ledger.accounts, scalar_accounts):
+            self.assertEqual(batch_account.balance, scalar_account.balance)
+            self.assertEqual(batch_account.is_blocked, scalar_account.is_blocked)
+            self.assertEqual(list(batch_account.transaction_history), list(scalar_account.transaction_history))
+
+    def test_long_batch_matches_scalar_methods(self):
+        # Mostly small amounts, so long runs are planned and written in bulk
+        # between the operations that block an account or are refused.
+        rng = random.Random(11)
+        scalar_accounts = build_accounts()
+        ops = [DEPOSIT] * 5 + [rng.choice((DEPOSIT, WITHDRAW, TRANSFER, TRANSFER_TO_PARENT))
+                               for _ in range(3000)]
+        ids = [i if i < 5 else 3 if op == TRANSFER_TO_PARENT else rng.randrange(5) for i, op in enumerate(ops)]
+        amounts = [100000] * 5 + [rng.choice((100, 200, 300, 500)) if rng.random() < 0.99 else 90000
+                                  for op in ops[5:]]
+        targets = [rng.randrange(5) for _ in ops]
+
+        results = self.ledger.apply_batch(ids, ops, amounts, targets)
+        for i, op in enumerate(ops):
+            raised = apply_scalar(scalar_accounts, ids[i], op, amounts[i], targets[i])
+            self.assertEqual(raised, results[i] not in (OK, BLOCKED), i)
+
+        for batch_account, scalar_account in zip(self.ledger.accounts, scalar_accounts):
+            batch_history = batch_account.transaction_history
+            scalar_history = scalar_account.transaction_history
+            self.assertEqual(batch_account.balance, scalar_account.balance)
+            self.assertEqual(batch_account.is_blocked, scalar_account.is_blocked)
+            self.assertEqual(list(batch_history), list(scalar_history))
+            self.assertEqual(list(batch_history.checkpoint_index), list(scalar_history.checkpoint_index))
+            self.assertEqual(list(batch_history.checkpoint_balance), list(scalar_history.checkpoint_balance))
+            self.assertEqual(list(batch_history.sequence), sorted(set(batch_history.sequence)))
+            stats = [batch_account.stats(), scalar_account.stats(),
+                     batch_account.family_stats(), scalar_account.family_stats()]
+            for totals in stats:
+                del totals['last_activity']
+            self.assertEqual(stats[0], stats[1])
+            self.assertEqual(stats[2], stats[3])
+
+    def test_transfer_to_parent_outside_the_ledger(self):
+        parent = self.ledger[0]
+        child = open_accounts_bulk([(100, 'Orphan', parent)], ChildAccount)[0]
+        ledger = Ledger([child])
+        results = ledger.apply_batch([0, 0, 0], [TRANSFER_TO_PARENT, WITHDRAW, TRANSFER_TO_PARENT],
+                                     [1000, 500, 9000])
+        self.assertEqual(list(results), [OK, OK, INSUFFICIENT_FUNDS])
+        self.assertEqual(child.balance, 85)
+        self.assertEqual(parent.balance, 1010)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import time
+import unittest
+
+import bank_accounts
+import metrics
+from bank_accounts import BalanceException, BankAccount, SavingsAcct
+from metrics import LatencyHistogram, Metrics, SamplingProfiler
+from notifiers import SilentNotifier, StdoutNotifier
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_buckets_keep_relative_precision(self):
+        histogram = LatencyHistogram(precision_bits=7)
+        for value in (0, 1, 127, 128, 129, 1000, 123456, 10 ** 9):
+            index = histogram._index(value)
+            low = histogram._lowest(index)
+            high = histogram._lowest(index + 1)
+            self.assertLessEqual(low, value)
+            self.assertLess(value, high)
+            self.assertLessEqual(high - low, max(1, value / 64))
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 1001):
+            histogram.record(value * 1000)
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.percentile(50), 500000, delta=500000 / 64)
+        self.assertAlmostEqual(histogram.percentile(99), 990000, delta=990000 / 64)
+        self.assertEqual(histogram.percentile(100), 1000000)
+        other = LatencyHistogram()
+        other.record(5)
+        histogram.merge(other)
+        self.assertEqual(histogram.min, 5)
+        self.assertEqual(histogram.count, 1001)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+
+    def test_disabled_leaves_methods_untouched(self):
+        original = BankAccount.deposit
+        with Metrics():
+            self.assertIsNot(BankAccount.deposit, original)
+        self.assertIs(BankAccount.deposit, original)
+        self.assertIs(SavingsAcct.withdraw, SavingsAcct.__dict__['withdraw'])
+
+    def test_counts_calls_errors_and_blocks(self):
+        source = SavingsAcct(100, 'MetricsSource', fee=1, min_balance=50)
+        target = BankAccount(0, 'MetricsTarget')
+        with Metrics() as recorder:
+            source.deposit(10)
+            source.transfer(5, target)
+            with self.assertRaises(BalanceException):
+                target.withdraw(1000)
+            with self.assertRaises(BalanceException):
+                source.withdraw(80)
+        counters = recorder.snapshot()['counters']
+        self.assertEqual(counters['deposit.SavingsAcct.calls'], 1)
+        self.assertEqual(counters['deposit.BankAccount.calls'], 1)
+        self.assertEqual(counters['transfer.SavingsAcct.calls'], 1)
+        self.assertEqual(counters['withdraw.SavingsAcct.calls'], 2)
+        self.assertEqual(counters['withdraw.BankAccount.errors'], 1)
+        self.assertEqual(counters['withdraw.SavingsAcct.errors'], 1)
+        self.assertEqual(counters['blocked.SavingsAcct'], 1)
+        self.assertTrue(source.is_blocked)
+
+    def test_snapshot_and_prometheus_export(self):
+        account = BankAccount(100, 'MetricsExport')
+        with Metrics() as recorder:
+            for _ in range(10):
+                account.deposit(1)
+            account.close_account()
+        snapshot = recorder.snapshot()
+        json.dumps(snapshot)
+        self.assertEqual(snapshot['latency']['deposit']['BankAccount']['count'], 10)
+        self.assertEqual(snapshot['latency']['deposit']['all']['count'], 10)
+        self.assertEqual(snapshot['latency']['close_account']['BankAccount']['count'], 1)
+        text = recorder.prometheus()
+        self.assertIn('bank_deposit_BankAccount_calls_total 10', text)
+        self.assertIn('bank_operation_seconds_count{operation="deposit",account_class="BankAccount"} 10',
+                      text)
+
+    def test_module_switch(self):
+        self.addCleanup(metrics.disable)
+        metrics.enable()
+        BankAccount(10, 'MetricsSwitch').deposit(1)
+        self.assertEqual(metrics.snapshot()['counters']['deposit.BankAccount.calls'], 1)
+        metrics.disable()
+        self.assertEqual(metrics.snapshot(), {'counters': {}, 'latency': {}})
+
+
+class TestSamplingProfiler(unittest.TestCase):
+
+    def test_samples_the_running_thread(self):
+        def busy_loop():
+            deadline = time.perf_counter() + 0.2
+            while time.perf_counter() < deadline:
+                pass
+
+        with SamplingProfiler(interval=0.001) as profiler:
+            busy_loop()
+        self.assertGreater(profiler.samples, 0)
+        self.assertTrue(any('busy_loop' in frame for frame, share in profiler.top()))
+
+
+if __name__ == '__main__':
+    unittest.main()
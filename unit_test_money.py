@@ -0,0 +1,60 @@
+import unittest
+from decimal import Decimal
+
+from bank_accounts import BankAccount, InterestRewardsAcct, SavingsAcct
+from money import apply_rate, div_round_half_even, from_cents, to_cents
+
+
+class TestMoneyConversion(unittest.TestCase):
+
+    def test_to_cents(self):
+        self.assertEqual(to_cents(12), 1200)
+        self.assertEqual(to_cents(10.5), 1050)
+        self.assertEqual(to_cents(0.1), 10)
+        self.assertEqual(to_cents(Decimal('19.99')), 1999)
+        self.assertEqual(to_cents('3.07'), 307)
+
+    def test_to_cents_bankers_rounding(self):
+        self.assertEqual(to_cents(Decimal('0.125')), 12)
+        self.assertEqual(to_cents(Decimal('0.135')), 14)
+        self.assertEqual(to_cents(1.015), 102)
+
+    def test_from_cents(self):
+        self.assertEqual(from_cents(110500), Decimal('1105.00'))
+        self.assertEqual(str(from_cents(-5)), '-0.05')
+
+    def test_div_round_half_even(self):
+        self.assertEqual(div_round_half_even(25, 10), 2)
+        self.assertEqual(div_round_half_even(35, 10), 4)
+        self.assertEqual(div_round_half_even(-25, 10), -2)
+        self.assertEqual(div_round_half_even(26, 10), 3)
+
+    def test_apply_rate(self):
+        self.assertEqual(apply_rate(10000, 500), 500)
+        self.assertEqual(apply_rate(10, 500), 0)
+        self.assertEqual(apply_rate(30, 500), 2)
+
+
+class TestExactBalances(unittest.TestCase):
+
+    def test_no_float_drift(self):
+        account = BankAccount(0, 'DriftAccount')
+        for _ in range(10):
+            account.deposit(0.1)
+        self.assertEqual(account.balance, Decimal('1.00'))
+
+    def test_interest_bonus_rounding(self):
+        account = InterestRewardsAcct(0, 'RoundingInterest')
+        account.deposit(0.3)
+        self.assertEqual(account.balance, Decimal('0.32'))
+        self.assertEqual(account.transaction_history[-1], ('Interest Deposit', Decimal('0.32')))
+
+    def test_fractional_fee(self):
+        account = SavingsAcct(10, 'FractionalFee', fee=0.25)
+        account.withdraw(1.1)
+        self.assertEqual(account.balance, Decimal('8.65'))
+        self.assertEqual(account.fee, Decimal('0.25'))
+
+
+if __name__ == '__main__':
+    unittest.main()
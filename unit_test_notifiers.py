@@ -0,0 +1,81 @@
+import contextlib
+import io
+import logging
+import unittest
+
+import bank_accounts
+from bank_accounts import BankAccount, SavingsAcct
+from notifiers import BufferedNotifier, LoggingNotifier, SilentNotifier, StdoutNotifier
+
+
+class NotifierTestCase(unittest.TestCase):
+
+    def use_notifier(self, notifier):
+        bank_accounts.set_notifier(notifier)
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        return notifier
+
+
+class TestStdoutNotifier(NotifierTestCase):
+
+    def test_deposit_output(self):
+        self.use_notifier(StdoutNotifier())
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            account = BankAccount(100, 'StdoutAccount')
+            account.deposit(50)
+        self.assertEqual(out.getvalue(),
+                         "\nAccount 'StdoutAccount' created.\nBalance = $100.00\n"
+                         "\nDeposit complete.\n\nAccount 'StdoutAccount' balance = $150.00\n")
+
+
+class TestSilentNotifier(NotifierTestCase):
+
+    def test_no_output(self):
+        self.use_notifier(SilentNotifier())
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            account = BankAccount(100, 'SilentAccount')
+            account.deposit(50)
+            account.withdraw(25)
+        self.assertEqual(out.getvalue(), '')
+        self.assertEqual(account.balance, 125)
+
+
+class TestBufferedNotifier(NotifierTestCase):
+
+    def test_events_recorded(self):
+        notifier = self.use_notifier(BufferedNotifier())
+        parent = BankAccount(100, 'BufferedParent')
+        child = parent.create_child_account(50, 'BufferedChild')
+        child.transfer_to_parent(20)
+        events = [event[0] for event in notifier.events]
+        self.assertEqual(events, ['opened', 'opened', 'child_created', 'withdraw',
+                                  'deposit', 'transfer_to_parent'])
+        self.assertEqual(notifier.messages()[-1], '\nTransfer to parent account complete: $20.00')
+
+    def test_maxlen(self):
+        notifier = self.use_notifier(BufferedNotifier(maxlen=2))
+        account = SavingsAcct(100, 'BufferedSavings')
+        account.withdraw(10)
+        account.deposit(10)
+        self.assertEqual([event[0] for event in notifier.events], ['withdraw_fee', 'interest_deposit'])
+
+
+class TestLoggingNotifier(NotifierTestCase):
+
+    def test_structured_record(self):
+        logger = logging.getLogger('bank_accounts.test')
+        self.use_notifier(LoggingNotifier(logger))
+        with self.assertLogs(logger, level='INFO') as captured:
+            account = BankAccount(100, 'LoggedAccount', min_balance=50)
+            account.withdraw(60)
+        record = captured.records[-1]
+        self.assertEqual(record.levelno, logging.WARNING)
+        self.assertEqual(record.event, 'below_minimum')
+        self.assertEqual(record.account, 'LoggedAccount')
+        self.assertEqual(record.balance, 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
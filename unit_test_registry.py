@@ -0,0 +1,140 @@
+import tempfile
+import unittest
+
+import bank_accounts
+from bank_accounts import BankAccount, SavingsAcct
+from notifiers import SilentNotifier, StdoutNotifier
+from hierarchy import HierarchyRegistry
+from registry import AccountRegistry, EvictedAccountError
+
+
+class TestAccountRegistry(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.registry = AccountRegistry(tmp.name, capacity=3).attach()
+        self.addCleanup(self.registry.close)
+
+    def test_indexes_new_accounts(self):
+        account = BankAccount(100, 'RegistryOne')
+        savings = SavingsAcct(50, 'RegistryTwo')
+        self.assertIs(self.registry.get(account.account_id), account)
+        self.assertIs(self.registry.get_by_name('RegistryTwo'), savings)
+        self.assertEqual(len(self.registry), 2)
+        with self.assertRaises(KeyError):
+            self.registry.get(-1)
+        BankAccount(1, 'RegistryOne')
+        with self.assertRaises(LookupError):
+            self.registry.get_by_name('RegistryOne')
+        self.assertEqual(len(self.registry.find('RegistryOne')), 2)
+
+    def test_cold_accounts_are_evicted_and_reloaded(self):
+        accounts = [SavingsAcct(100 + i, f'RegistryCold{i}', fee=1, min_balance=10) for i in range(2)]
+        accounts[0].withdraw(5)
+        accounts[1].close_account()
+        accounts += [SavingsAcct(100 + i, f'RegistryCold{i}', fee=1, min_balance=10) for i in range(2, 6)]
+        self.assertEqual(len(self.registry.resident), 3)
+        self.assertGreaterEqual(self.registry.evictions, 3)
+        first = self.registry.get(accounts[0].account_id)
+        self.assertIsNot(first, accounts[0])
+        self.assertEqual(first.balance, 94)
+        self.assertEqual(first.fee, 1)
+        self.assertEqual(list(first.transaction_history.raw_entries()),
+                         list(accounts[0].transaction_history.raw_entries()))
+        self.assertEqual(first.stats(), accounts[0].stats())
+        closed = self.registry.get_by_name('RegistryCold1')
+        self.assertTrue(closed.is_blocked)
+        self.assertEqual(closed.transaction_history[-1][0], 'Account Closed')
+        self.assertIs(self.registry.get(first.account_id), first)
+
+    def test_changes_after_reload_survive_eviction(self):
+        account = BankAccount(100, 'RegistryChanged')
+        account_id = account.account_id
+        for i in range(4):
+            BankAccount(1, f'RegistryFiller{i}')
+        reloaded = self.registry.get(account_id)
+        reloaded.deposit(25)
+        for i in range(4):
+            BankAccount(1, f'RegistryFillerAgain{i}')
+        self.assertNotIn(account_id, self.registry.resident)
+        self.assertEqual(self.registry.get(account_id).balance, 125)
+
+    def test_child_keeps_parent_resident(self):
+        parent = BankAccount(1000, 'RegistryParent')
+        child = parent.create_child_account(100, 'RegistryChild')
+        for i in range(5):
+            BankAccount(1, f'RegistryOther{i}')
+        self.assertNotIn(child.account_id, self.registry.resident)
+        self.assertNotIn(parent.account_id, self.registry.resident)
+        child = self.registry.get(child.account_id)
+        parent = self.registry.get(parent.account_id)
+        self.assertIs(child.parent_account, parent)
+        child.transfer_to_parent(40)
+        self.assertEqual(parent.balance, 1040)
+        self.assertEqual(parent.family_stats()['balance'], 1100)
+        for i in range(5):
+            BankAccount(1, f'RegistryLater{i}')
+        self.assertEqual(self.registry.get(parent.account_id).family_stats()['balance'], 1100)
+
+    def test_evicted_objects_refuse_changes(self):
+        account = BankAccount(100, 'RegistryStale')
+        live = BankAccount(100, 'RegistryLive')
+        for i in range(3):
+            BankAccount(1, f'RegistryPush{i}')
+        self.assertNotIn(account.account_id, self.registry.resident)
+        with self.assertRaises(EvictedAccountError):
+            account.deposit(50)
+        with self.assertRaises(EvictedAccountError):
+            account.balance = 5
+        live = self.registry.get(live.account_id)
+        with self.assertRaises(EvictedAccountError):
+            live.transfer(10, account)
+        self.assertEqual(live.balance, 100)
+        self.assertEqual(account.balance, 100)
+        reloaded = self.registry.get(account.account_id)
+        reloaded.deposit(50)
+        self.assertEqual(self.registry.get(account.account_id).balance, 150)
+
+    def test_closing_removes_the_transfer_fence(self):
+        for i in range(5):
+            BankAccount(1, f'RegistryFence{i}')
+        self.assertTrue(BankAccount.guards)
+        with tempfile.TemporaryDirectory() as directory:
+            other = AccountRegistry(directory, capacity=1).attach()
+            for i in range(3):
+                BankAccount(1, f'RegistryFenceOther{i}')
+            other.close()
+        self.assertTrue(BankAccount.guards)
+        self.registry.close()
+        self.assertEqual(BankAccount.guards, ())
+
+    def test_stale_children_cannot_be_swept(self):
+        hierarchy = HierarchyRegistry().attach()
+        self.addCleanup(hierarchy.detach)
+        parent = BankAccount(1000, 'RegistrySweepParent')
+        child = parent.create_child_account(100, 'RegistrySweepChild')
+        for i in range(5):
+            BankAccount(1, f'RegistrySweepOther{i}')
+        parent = self.registry.get(parent.account_id)
+        with self.assertRaises(EvictedAccountError):
+            hierarchy.sweep_to_parent(parent)
+        self.assertEqual(parent.balance, 1000)
+        self.assertEqual(self.registry.get(child.account_id).balance, 100)
+
+    def test_compact_keeps_latest_records(self):
+        account = BankAccount(100, 'RegistryCompact')
+        for round_ in range(3):
+            for i in range(3):
+                BankAccount(1, f'RegistryCompact{round_}.{i}')
+            self.registry.get(account.account_id).deposit(1)
+        self.registry.compact()
+        for i in range(3):
+            BankAccount(1, f'RegistryCompactLast{i}')
+        self.assertEqual(self.registry.get(account.account_id).balance, 103)
+
+
+if __name__ == '__main__':
+    unittest.main()
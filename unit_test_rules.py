@@ -0,0 +1,183 @@
+import unittest
+from decimal import Decimal
+
+import bank_accounts
+from bank_accounts import BalanceException, BankAccount, SavingsAcct
+from ledger import INSUFFICIENT_FUNDS, LIMIT_EXCEEDED, OK, TRANSFER, WITHDRAW, Ledger
+from notifiers import SilentNotifier, StdoutNotifier
+from rules import FAMILY, LimitExceeded, RuleEngine, SlidingWindows, VelocityRule
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSlidingWindows(unittest.TestCase):
+
+    def test_lengths_share_one_log(self):
+        windows = SlidingWindows(2)
+        for now, cents in ((1.0, 100), (2.0, 200), (3.0, 300)):
+            windows.add(now, cents)
+        windows.expire(4.0, (2.0, 3.0))
+        self.assertEqual((windows.count(0), windows.totals[0]), (1, 300))
+        self.assertEqual((windows.count(1), windows.totals[1]), (2, 500))
+
+    def test_trims_events_outside_the_longest_window(self):
+        windows = SlidingWindows(1)
+        for i in range(1000):
+            windows.expire(float(i), (10.0,))
+            windows.add(float(i), 1)
+        self.assertLess(len(windows.times), 200)
+        self.assertEqual((windows.count(0), windows.totals[0]), (10, 10))
+
+
+class TestVelocityRule(unittest.TestCase):
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            VelocityRule('r', 'deposit', 60, max_count=1)
+        with self.assertRaises(ValueError):
+            VelocityRule('r', 'withdraw', 60, max_count=1, scope='bank')
+        with self.assertRaises(ValueError):
+            VelocityRule('r', 'withdraw', 0, max_count=1)
+        with self.assertRaises(ValueError):
+            VelocityRule('r', 'withdraw', 60)
+        self.assertEqual(VelocityRule('r', 'withdraw', 60, max_amount=Decimal('12.34')).max_cents, 1234)
+
+
+class TestRuleEngine(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        self.clock = FakeClock()
+
+    def attach(self, *rules):
+        engine = RuleEngine(rules, clock=self.clock).attach()
+        self.addCleanup(engine.detach)
+        return engine
+
+    def test_count_limit_slides(self):
+        engine = self.attach(VelocityRule('three-per-minute', 'withdraw', 60, max_count=3))
+        account = BankAccount(100, 'Alice')
+        for i in range(3):
+            self.clock.now = i * 10.0
+            account.withdraw(1)
+        with self.assertRaises(LimitExceeded) as caught:
+            account.withdraw(1)
+        self.assertEqual(caught.exception.rule.name, 'three-per-minute')
+        self.assertEqual(account.balance, 97)
+        self.assertEqual(engine.rejections, 1)
+        self.clock.now = 60.0
+        account.withdraw(1)
+        self.assertEqual(account.balance, 96)
+
+    def test_amount_limit_and_exception_type(self):
+        self.attach(VelocityRule('fifty-per-hour', 'withdraw', 3600, max_amount=50))
+        account = BankAccount(100, 'Alice')
+        account.withdraw(30)
+        account.withdraw(20)
+        with self.assertRaises(BalanceException):
+            account.withdraw(Decimal('0.01'))
+        self.assertEqual(account.balance, 50)
+        self.assertEqual(len(account.transaction_history), 3)
+
+    def test_savings_fee_counts_towards_amount(self):
+        self.attach(VelocityRule('cap', 'withdraw', 60, max_amount=20))
+        account = SavingsAcct(100, 'Saver', fee=5)
+        account.withdraw(10)
+        with self.assertRaises(LimitExceeded):
+            account.withdraw(1)
+        self.assertEqual(account.balance, 85)
+
+    def test_tightest_rule_in_a_group_wins(self):
+        engine = self.attach(VelocityRule('loose', 'transfer', 60, max_count=5),
+                             VelocityRule('tight', 'transfer', 60, max_count=2),
+                             VelocityRule('hourly', 'transfer', 3600, max_count=10))
+        self.assertEqual(len(engine.compiled['transfer']), 1)
+        self.assertEqual(engine.compiled['transfer'][0].lengths, (60, 3600))
+        source = BankAccount(100, 'Source')
+        target = BankAccount(0, 'Target')
+        source.transfer(1, target)
+        source.transfer(1, target)
+        with self.assertRaises(LimitExceeded) as caught:
+            source.transfer(1, target)
+        self.assertEqual(caught.exception.rule.name, 'tight')
+        self.assertEqual(target.balance, 2)
+
+    def test_refused_transfer_is_not_counted(self):
+        engine = self.attach(VelocityRule('transfers', 'transfer', 60, max_count=5),
+                             VelocityRule('outflow', 'withdraw', 60, max_amount=10))
+        transfers = engine.rules[0]
+        source = BankAccount(100, 'Source')
+        target = BankAccount(0, 'Target')
+        source.transfer(8, target)
+        with self.assertRaises(LimitExceeded):
+            source.transfer(5, target)
+        self.assertEqual(engine.usage(source, transfers), (1, 800))
+        self.assertEqual(source.balance, 92)
+        self.assertEqual(target.balance, 8)
+
+    def test_family_scope(self):
+        engine = self.attach(VelocityRule('family', 'withdraw', 60, max_count=3, scope=FAMILY),
+                             VelocityRule('child-to-parent', 'transfer_to_parent', 60, max_amount=15))
+        parent = BankAccount(100, 'Parent')
+        alice = parent.create_child_account(50, 'Alice')
+        bob = parent.create_child_account(50, 'Bob')
+        grandchild = alice.create_child_account(50, 'Grandchild')
+        parent.withdraw(1)
+        bob.withdraw(1)
+        grandchild.withdraw(1)
+        with self.assertRaises(LimitExceeded):
+            alice.withdraw(1)
+        other = BankAccount(100, 'Other')
+        other.withdraw(1)
+        self.assertEqual(engine.usage(parent, engine.rules[0]), (3, 300))
+
+        self.clock.now = 100.0
+        alice.transfer_to_parent(10)
+        with self.assertRaises(LimitExceeded):
+            alice.transfer_to_parent(10)
+        bob.transfer_to_parent(10)
+        self.assertEqual(parent.balance, 119)
+
+    def test_detach_and_remove_rule(self):
+        engine = self.attach(VelocityRule('one', 'withdraw', 60, max_count=1))
+        account = BankAccount(100, 'Alice')
+        account.withdraw(1)
+        engine.add_rule(VelocityRule('amount', 'withdraw', 60, max_amount=50))
+        self.assertEqual(engine.usage(account, engine.rules[1]), (1, 100))
+        engine.add_rule(VelocityRule('daily', 'withdraw', 86400, max_count=100))
+        self.assertEqual(engine.usage(account, engine.rules[2]), (1, 100))
+        engine.remove_rule('one')
+        account.withdraw(1)
+        engine.detach()
+        for i in range(5):
+            account.withdraw(10)
+        self.assertEqual(account.balance, 48)
+
+    def test_prune_drops_idle_windows(self):
+        engine = self.attach(VelocityRule('one', 'withdraw', 60, max_count=1))
+        BankAccount(100, 'Alice').withdraw(1)
+        self.assertEqual(engine.prune(), 0)
+        self.clock.now = 61.0
+        self.assertEqual(engine.prune(), 1)
+
+    def test_ledger_batch(self):
+        self.attach(VelocityRule('two', 'withdraw', 60, max_count=2),
+                    VelocityRule('transfers', 'transfer', 60, max_count=1))
+        ledger = Ledger([BankAccount(10, 'A'), BankAccount(0, 'B')])
+        results = ledger.apply_batch([0, 0, 0, 0], [TRANSFER, WITHDRAW, WITHDRAW, TRANSFER],
+                                     [100, 100, 5000, 100], [1, 0, 0, 1])
+        self.assertEqual(list(results), [OK, OK, LIMIT_EXCEEDED, LIMIT_EXCEEDED])
+        self.assertEqual(ledger.accounts[0].balance, 8)
+        ledger = Ledger([BankAccount(10, 'C')])
+        self.assertEqual(list(ledger.apply_batch([0], [WITHDRAW], [5000])), [INSUFFICIENT_FUNDS])
+
+
+if __name__ == '__main__':
+    unittest.main()
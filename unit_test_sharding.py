@@ -0,0 +1,113 @@
+import unittest
+
+from bank_accounts import BalanceException, BankAccount, SavingsAcct
+from sharding import ShardedLedger
+
+
+class TestShardedLedger(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ledger = ShardedLedger(num_shards=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ledger.close()
+
+    def open_pair(self, prefix, source_amount=1000, target_amount=0, source_cls=BankAccount, *args):
+        # Finds two names that hash to different shards.
+        names = [f'{prefix}{i}' for i in range(20)]
+        source = names[0]
+        target = next(name for name in names if self.ledger.shard_of(name) != self.ledger.shard_of(source))
+        self.ledger.open(source_cls, source_amount, source, *args)
+        self.ledger.open(BankAccount, target_amount, target)
+        return source, target
+
+    def test_local_operations(self):
+        self.ledger.open(BankAccount, 100, 'ShardLocal')
+        self.ledger.deposit('ShardLocal', 50)
+        self.ledger.withdraw('ShardLocal', 30)
+        self.assertEqual(self.ledger.balance('ShardLocal'), 120)
+        with self.assertRaises(BalanceException):
+            self.ledger.withdraw('ShardLocal', 500)
+
+    def test_shard_survives_unexpected_errors(self):
+        self.ledger.open(BankAccount, 100, 'ShardBadCall')
+        with self.assertRaises(AttributeError):
+            self.ledger.transfer_to_parent('ShardBadCall', 10)
+        with self.assertRaises(ArithmeticError):
+            self.ledger.withdraw('ShardBadCall', 'abc')
+        self.ledger.deposit('ShardBadCall', 5)
+        self.assertEqual(self.ledger.balance('ShardBadCall'), 105)
+
+    def test_cross_shard_transfer(self):
+        source, target = self.open_pair('Cross')
+        self.ledger.transfer(source, 300, target)
+        self.assertEqual(self.ledger.balance(source), 700)
+        self.assertEqual(self.ledger.balance(target), 300)
+        with self.assertRaises(BalanceException):
+            self.ledger.transfer(source, 5000, target)
+        with self.assertRaises(BalanceException):
+            self.ledger.transfer(source, -5, target)
+        self.assertEqual(self.ledger.balance(source), 700)
+
+    def test_blocked_source_is_a_no_op(self):
+        names = [f'BlockedSrc{i}' for i in range(20)]
+        source = names[0]
+        target = next(name for name in names if self.ledger.shard_of(name) != self.ledger.shard_of(source))
+        self.ledger.open(BankAccount, 1000, source, 500)
+        self.ledger.open(BankAccount, 0, target)
+        self.ledger.withdraw(source, 600)
+        self.assertTrue(self.ledger.is_blocked(source))
+        self.assertIsNone(self.ledger.transfer(source, 100, target))
+        self.assertEqual(self.ledger.balance(target), 0)
+
+    def test_savings_fee_and_min_balance(self):
+        source, target = self.open_pair('SavingsCross', 1000, 0, SavingsAcct, 5, 200)
+        self.ledger.transfer(source, 100, target)
+        self.assertEqual(self.ledger.balance(source), 895)
+        with self.assertRaises(BalanceException):
+            self.ledger.transfer(source, 700, target)
+        self.assertEqual(self.ledger.balance(source), 190)
+        self.assertTrue(self.ledger.is_blocked(source))
+        self.assertEqual(self.ledger.balance(target), 100)
+
+    def test_reservations_prevent_double_spend_in_a_batch(self):
+        source, target = self.open_pair('Reserve', 100)
+        results = self.ledger.submit([('transfer', source, 80, target), ('withdraw', source, 50)])
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], BalanceException)
+        self.assertEqual(self.ledger.balance(source), 20)
+        self.assertEqual(self.ledger.balance(target), 80)
+
+    def test_reservations_include_the_savings_fee(self):
+        source, remote = self.open_pair('ReserveFee', 20, 0, SavingsAcct, 5)
+        local = next(f'ReserveFeeLocal{i}' for i in range(50)
+                     if self.ledger.shard_of(f'ReserveFeeLocal{i}') == self.ledger.shard_of(source))
+        self.ledger.open(BankAccount, 0, local)
+        results = self.ledger.submit([('transfer', source, 10, remote), ('transfer', source, 4, local)])
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], BalanceException)
+        self.assertEqual(self.ledger.balance(source), 5)
+        self.assertEqual(self.ledger.balance(remote), 10)
+        self.assertEqual(self.ledger.balance(local), 0)
+
+    def test_missing_target_aborts(self):
+        self.ledger.open(BankAccount, 100, 'AbortSource')
+        missing = next(f'Missing{i}' for i in range(50)
+                       if self.ledger.shard_of(f'Missing{i}') != self.ledger.shard_of('AbortSource'))
+        with self.assertRaises(KeyError):
+            self.ledger.transfer('AbortSource', 10, missing)
+        self.ledger.withdraw('AbortSource', 100)
+        self.assertEqual(self.ledger.balance('AbortSource'), 0)
+
+    def test_child_lives_on_parent_shard(self):
+        self.ledger.open(BankAccount, 100, 'ShardParent')
+        self.assertTrue(self.ledger.open_child('ShardParent', 40, 'ShardChild'))
+        self.assertEqual(self.ledger.shard_of('ShardChild'), self.ledger.shard_of('ShardParent'))
+        self.ledger.transfer_to_parent('ShardChild', 15)
+        self.assertEqual(self.ledger.balance('ShardParent'), 115)
+
+
+if __name__ == '__main__':
+    unittest.main()
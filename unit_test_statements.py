@@ -0,0 +1,155 @@
+import csv
+import os
+import random
+import tempfile
+import unittest
+from decimal import Decimal
+
+import bank_accounts
+from bank_accounts import BalanceException, BankAccount, SavingsAcct
+from bulk_io import export_columnar, import_columnar
+from journal import CHECKPOINT_EVERY
+from notifiers import SilentNotifier, StdoutNotifier
+from statements import statement, write_statements
+from wal import DurableStore, recover
+
+
+class StatementTestCase(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+
+    def run_history(self, account, other, n=CHECKPOINT_EVERY * 3 + 17):
+        # Returns {entry index: balance in cents after it}, taken from the
+        # account itself after every operation.
+        rng = random.Random(7)
+        expected = {len(account.transaction_history) - 1: account._balance}
+        for i in range(n):
+            op = rng.randrange(4)
+            try:
+                if op == 0:
+                    account.deposit(rng.randrange(1, 50))
+                elif op == 1:
+                    account.withdraw(rng.randrange(1, 20))
+                elif op == 2:
+                    account.transfer(rng.randrange(1, 10), other)
+                else:
+                    account.balance = account.balance + 1
+            except BalanceException:
+                pass
+            expected[len(account.transaction_history) - 1] = account._balance
+        return expected
+
+
+class TestCheckpoints(StatementTestCase):
+
+    def test_balance_after_matches_live_balances(self):
+        account = SavingsAcct(500, 'CheckpointSavings', fee=1)
+        expected = self.run_history(account, BankAccount(0, 'CheckpointOther'))
+        history = account.transaction_history
+        self.assertGreaterEqual(len(history.checkpoint_index), len(history) // CHECKPOINT_EVERY)
+        for index, cents in expected.items():
+            self.assertEqual(history.balance_after(index), cents)
+        running = list(history.running_balances())
+        for index, cents in expected.items():
+            self.assertEqual(running[index][4], cents)
+
+    def test_balance_at_time(self):
+        account = BankAccount(100, 'PointInTime')
+        opened = account.transaction_history.timestamps[0]
+        self.assertIsNone(account.balance_at(opened - 1))
+        self.assertEqual(account.balance_at(opened), 100)
+        account.deposit(50)
+        history = account.transaction_history
+        stamp = history.timestamps[-1]
+        account.withdraw(30)
+        history.timestamps[-1] = stamp + 10
+        self.assertEqual(account.balance_at(stamp), 150)
+        self.assertEqual(account.balance_at(stamp + 10), 120)
+        self.assertEqual(account.balance_at(stamp + 5), Decimal('150.00'))
+
+    def test_balance_at_time_before_direct_assignment(self):
+        account = BankAccount(100, 'PointInTimeAssign')
+        history = account.transaction_history
+        opened = history.timestamps[0]
+        account.balance = 40
+        history.timestamps[-1] = opened + 10
+        self.assertEqual(history[-1], ('Balance Adjusted', Decimal('-60.00')))
+        self.assertEqual(account.balance_at(opened), 100)
+        self.assertEqual(account.balance_at(opened + 10), 40)
+        self.assertEqual(account.stats()['balance'], 40)
+
+    def test_spilled_history(self):
+        account = BankAccount(1000, 'CheckpointSpill')
+        expected = self.run_history(account, BankAccount(0, 'CheckpointSpillOther'))
+        with tempfile.TemporaryDirectory() as directory:
+            from history_store import spill_history
+            spill_history([account], directory)
+            self.addCleanup(account.transaction_history.archive.close)
+            account.deposit(5)
+            expected[len(account.transaction_history) - 1] = account._balance
+            for index, cents in expected.items():
+                self.assertEqual(account.transaction_history.balance_after(index), cents)
+
+    def test_restored_histories_keep_checkpoints(self):
+        account = BankAccount(1000, 'CheckpointRestore')
+        expected = self.run_history(account, BankAccount(0, 'CheckpointRestoreOther'))
+        account.balance = 5000
+        expected[len(account.transaction_history) - 1] = account._balance
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'accounts.col')
+            export_columnar([account], path)
+            imported = import_columnar(path)[account.account_id]
+        for index, cents in expected.items():
+            self.assertEqual(imported.transaction_history.balance_after(index), cents)
+
+    def test_recovered_histories_keep_checkpoints(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = DurableStore(directory).attach()
+            try:
+                account = BankAccount(1000, 'CheckpointRecover')
+                other = BankAccount(0, 'CheckpointRecoverOther')
+                expected = self.run_history(account, other)
+            finally:
+                store.close()
+            recovered = recover(directory)[account.account_id]
+        for index, cents in expected.items():
+            self.assertEqual(recovered.transaction_history.balance_after(index), cents)
+
+
+class TestStatements(StatementTestCase):
+
+    def test_statement_period(self):
+        account = BankAccount(100, 'StatementAccount')
+        account.deposit(50)
+        account.withdraw(20)
+        account.deposit(5)
+        history = account.transaction_history
+        for i in range(len(history)):
+            history.timestamps[i] = 1000.0 + i * 10
+        report = statement(account, 1010.0, 1030.0)
+        self.assertEqual(report['opening_balance'], 100)
+        self.assertEqual(report['closing_balance'], 130)
+        self.assertEqual([entry[2:] for entry in report['entries']],
+                         [('Deposit', 50, 150), ('Withdraw', -20, 130)])
+        empty = statement(account, 2000.0, 3000.0)
+        self.assertEqual(empty['opening_balance'], 135)
+        self.assertEqual(empty['closing_balance'], 135)
+        self.assertEqual(empty['entries'], [])
+
+    def test_write_statements(self):
+        accounts = [BankAccount(10 * (i + 1), f'StatementCsv{i}') for i in range(3)]
+        accounts[0].deposit(1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'statements.csv')
+            self.assertEqual(write_statements(accounts, 0.0, float('inf'), path), 3)
+            with open(path, newline='') as f:
+                rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 3 + 4)
+        self.assertEqual(rows[0]['action'], 'Opening balance')
+        self.assertEqual(rows[2]['balance'], '11.00')
+
+
+if __name__ == '__main__':
+    unittest.main()
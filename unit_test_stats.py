@@ -0,0 +1,100 @@
+import pickle
+import tempfile
+import unittest
+from decimal import Decimal
+
+import bank_accounts
+from bank_accounts import BankAccount, SavingsAcct
+from notifiers import SilentNotifier, StdoutNotifier
+from wal import DurableStore, recover
+
+
+class StatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+
+
+class TestAccountStats(StatsTestCase):
+
+    def test_running_totals(self):
+        account = SavingsAcct(1000, 'StatsSavings', fee=5)
+        account.deposit(100)
+        account.withdraw(200)
+        account.withdraw(50)
+        stats = account.stats()
+        self.assertEqual(stats['count'], 4)
+        self.assertEqual(stats['actions']['Withdraw with Fee'], {'count': 2, 'total': Decimal('-260')})
+        self.assertEqual(stats['inflow'], 105)
+        self.assertEqual(stats['outflow'], -260)
+        self.assertEqual(stats['net_flow'], -155)
+        self.assertEqual(stats['fees'], 10)
+        self.assertEqual(stats['balance'], account.balance)
+        self.assertEqual(stats['min_balance'], 845)
+        self.assertEqual(stats['max_balance'], 1105)
+        self.assertEqual(stats['last_activity'], account.transaction_history.entry(-1)[1])
+
+    def test_transfer_memo_not_counted_twice(self):
+        source = BankAccount(500, 'StatsSource')
+        target = BankAccount(0, 'StatsTarget')
+        source.transfer(200, target)
+        self.assertEqual(source.stats()['net_flow'], -200)
+        self.assertEqual(source.stats()['actions']['Transfer']['count'], 1)
+        self.assertEqual(target.stats()['inflow'], 200)
+
+
+class TestFamilyStats(StatsTestCase):
+
+    def test_family_rollup(self):
+        parent = BankAccount(1000, 'FamilyParent')
+        self.assertEqual(parent.family_stats()['balance'], 1000)
+        child = parent.create_child_account(300, 'FamilyChild')
+        grandchild = child.create_child_account(50, 'FamilyGrandchild')
+        grandchild.deposit(25)
+        child.transfer_to_parent(100)
+        family = parent.family_stats()
+        self.assertEqual(family['balance'], parent.balance + child.balance + grandchild.balance)
+        self.assertEqual(family['actions']['Account opened']['count'], 3)
+        self.assertEqual(family['actions']['Deposit']['count'], 2)
+        self.assertEqual(child.family_stats()['balance'], 275)
+        self.assertEqual(parent.stats()['balance'], 1100)
+
+    def test_direct_balance_assignment_updates_family(self):
+        parent = BankAccount(100, 'AssignParent')
+        child = parent.create_child_account(10, 'AssignChild')
+        child.balance = 40
+        self.assertEqual(parent.family_stats()['balance'], 140)
+
+    def test_pickled_stats_drop_parent_link(self):
+        parent = BankAccount(100, 'PickleParent')
+        child = parent.create_child_account(10, 'PickleChild')
+        child.create_child_account(5, 'PickleGrandchild')
+        copy = pickle.loads(pickle.dumps(child._stats))
+        self.assertIsNone(copy.parent)
+        self.assertEqual(copy.as_dict(), child.stats())
+        self.assertEqual(copy.family_dict(), child.family_stats())
+
+
+class TestRecoveredStats(StatsTestCase):
+
+    def test_stats_rebuilt_on_recovery(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = DurableStore(directory).attach()
+            try:
+                parent = BankAccount(1000, 'RecoveredParent')
+                child = parent.create_child_account(200, 'RecoveredChild')
+                child.transfer_to_parent(50)
+                savings = SavingsAcct(100, 'RecoveredSavings')
+                savings.withdraw(10)
+                store.snapshot()
+                parent.deposit(5)
+            finally:
+                store.close()
+            recovered = recover(directory)
+        self.assertEqual(recovered[parent.account_id].family_stats(), parent.family_stats())
+        self.assertEqual(recovered[savings.account_id].stats(), savings.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
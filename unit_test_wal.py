@@ -0,0 +1,131 @@
+import os
+import tempfile
+import time
+import unittest
+
+import bank_accounts
+from bank_accounts import BankAccount, SavingsAcct
+from notifiers import SilentNotifier, StdoutNotifier
+from wal import WAL_FILE, DurableStore, recover
+
+
+class DurableStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        bank_accounts.set_notifier(SilentNotifier())
+        self.addCleanup(bank_accounts.set_notifier, StdoutNotifier())
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = self.tmp.name
+
+    def open_store(self, **kwargs):
+        store = DurableStore(self.directory, **kwargs).attach()
+        self.addCleanup(store.detach)
+        return store
+
+    def populate(self):
+        parent = BankAccount(1000, 'WalParent', min_balance=100)
+        child = parent.create_child_account(300, 'WalChild')
+        savings = SavingsAcct(500, 'WalSavings', fee=2, min_balance=50)
+        parent.deposit(50)
+        child.transfer_to_parent(120)
+        savings.withdraw(10)
+        parent.withdraw(1000)
+        parent.transfer(20, savings)
+        return parent, child, savings
+
+    def assertRecovered(self, originals, recovered):
+        self.assertEqual(sorted(recovered), sorted(account.account_id for account in originals))
+        for original in originals:
+            account = recovered[original.account_id]
+            self.assertIs(type(account), type(original))
+            self.assertEqual(account.name, original.name)
+            self.assertEqual(account.balance, original.balance)
+            self.assertEqual(account.min_balance, original.min_balance)
+            self.assertEqual(account.is_blocked, original.is_blocked)
+            self.assertEqual(list(account.transaction_history), list(original.transaction_history))
+            self.assertEqual(list(account.transaction_history.sequence),
+                             list(original.transaction_history.sequence))
+
+
+class TestWriteAheadLog(DurableStoreTestCase):
+
+    def test_recover_from_wal(self):
+        store = self.open_store()
+        accounts = self.populate()
+        store.close()
+        recovered = recover(self.directory)
+        self.assertRecovered(accounts, recovered)
+        parent, child, savings = accounts
+        self.assertIs(recovered[child.account_id].parent_account, recovered[parent.account_id])
+        self.assertEqual(recovered[savings.account_id].fee, 2)
+
+    def test_recover_from_snapshot_and_tail(self):
+        store = self.open_store(snapshot_every=7)
+        accounts = self.populate()
+        accounts[0].unblock_account()
+        accounts[1].balance = 42
+        store.close()
+        self.assertRecovered(accounts, recover(self.directory))
+
+    def test_torn_tail_is_ignored(self):
+        store = self.open_store()
+        accounts = self.populate()
+        store.close()
+        path = os.path.join(self.directory, WAL_FILE)
+        size = os.path.getsize(path)
+        with open(path, 'r+b') as f:
+            f.truncate(size - 3)
+        recovered = recover(self.directory)
+        parent = recovered[accounts[0].account_id]
+        self.assertEqual(list(parent.transaction_history), list(accounts[0].transaction_history)[:-1])
+        self.assertEqual(parent.balance, accounts[0].balance)
+
+    def test_seeded_accounts_are_recoverable(self):
+        seeded = BankAccount(100, 'WalSeeded')
+        seeded.deposit(5)
+        store = self.open_store(accounts={seeded.account_id: seeded})
+        seeded.deposit(10)
+        store.close()
+        self.assertRecovered([seeded], recover(self.directory))
+
+    def test_accounts_opened_before_attach_are_adopted(self):
+        pre = BankAccount(100, 'WalPre')
+        blocked = BankAccount(50, 'WalPreBlocked')
+        store = self.open_store()
+        fresh = BankAccount(5, 'WalNew')
+        pre.deposit(10)
+        blocked.is_blocked = True
+        blocked.min_balance = 20
+        store.close()
+        recovered = recover(self.directory)
+        self.assertRecovered([fresh], {fresh.account_id: recovered[fresh.account_id]})
+        self.assertEqual(recovered[pre.account_id].balance, 110)
+        self.assertEqual(list(recovered[pre.account_id].transaction_history), [('Deposit', 10)])
+        self.assertEqual(recovered[pre.account_id].transaction_history.balance_after(0), 11000)
+        self.assertEqual(recovered[pre.account_id].stats()['balance'], 110)
+        self.assertEqual(recovered[blocked.account_id].balance, 50)
+        self.assertEqual(recovered[blocked.account_id].min_balance, 20)
+        self.assertTrue(recovered[blocked.account_id].is_blocked)
+
+    def test_idle_records_are_flushed(self):
+        store = self.open_store(group_size=1000, sync_interval=0.01)
+        self.addCleanup(store.wal.close)
+        account = BankAccount(100, 'WalIdle')
+        path = os.path.join(self.directory, WAL_FILE)
+        for _ in range(100):
+            if os.path.getsize(path):
+                break
+            time.sleep(0.01)
+        self.assertIn(account.account_id, recover(self.directory))
+
+    def test_new_accounts_do_not_reuse_ids(self):
+        store = self.open_store()
+        accounts = self.populate()
+        store.close()
+        recover(self.directory)
+        self.assertGreater(BankAccount(1, 'AfterRecovery').account_id, max(a.account_id for a in accounts))
+
+
+if __name__ == '__main__':
+    unittest.main()
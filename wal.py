@@ -0,0 +1,350 @@
+import os
+import struct
+import threading
+import time
+import zlib
+
+import bank_accounts
+import journal
+from bank_accounts import BankAccount, ChildAccount, InterestRewardsAcct, SavingsAcct
+from journal import CHECKPOINT_EVERY, MEMO_CODES, OPENING_CODE
+from ledger import KIND_BASIC, KIND_CHILD, KIND_INTEREST, KIND_SAVINGS, account_kind
+from stats import AccountStats
+
+
+# Every record is framed as <payload length, type> + payload + crc32, so a
+# torn write at the end of the log is detected and ignored on recovery.
+FRAME = struct.Struct('<IB')
+CRC = struct.Struct('<I')
+
+OPEN = 1
+ENTRY = 2
+STATE = 3
+ACTION = 4
+SNAPSHOT = 5
+
+OPEN_RECORD = struct.Struct('<QQBqqQ')     # seq, account id, kind, min balance, fee, parent id; name follows
+ENTRY_RECORD = struct.Struct('<QQdHqq?')   # seq, account id, timestamp, action code, cents, balance, blocked
+STATE_RECORD = struct.Struct('<QQqqq?')    # seq, account id, balance, min balance, fee, blocked
+ACTION_RECORD = struct.Struct('<H')        # action code; name follows
+SNAPSHOT_RECORD = struct.Struct('<Q')      # highest sequence number covered by the snapshot
+
+ACCOUNT_CLASSES = {
+    KIND_BASIC: BankAccount,
+    KIND_INTEREST: InterestRewardsAcct,
+    KIND_SAVINGS: SavingsAcct,
+    KIND_CHILD: ChildAccount,
+}
+
+WAL_FILE = 'accounts.wal'
+SNAPSHOT_FILE = 'accounts.snapshot'
+
+
+def frame(record_type, payload):
+    header = FRAME.pack(len(payload), record_type)
+    return header + payload + CRC.pack(zlib.crc32(header[4:] + payload))
+
+
+def read_frames(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return
+    view = memoryview(data)
+    offset = 0
+    end = len(data)
+    while offset + FRAME.size <= end:
+        length, record_type = FRAME.unpack_from(view, offset)
+        payload_end = offset + FRAME.size + length
+        if payload_end + CRC.size > end:
+            break
+        payload = view[offset + FRAME.size:payload_end]
+        crc, = CRC.unpack_from(view, payload_end)
+        if crc != zlib.crc32(view[offset + 4:payload_end]):
+            break
+        yield record_type, payload
+        offset = payload_end + CRC.size
+
+
+def open_payload(account, seq):
+    parent = getattr(account, 'parent_account', None)
+    return OPEN_RECORD.pack(seq, account.account_id, account_kind(account), account._min_balance,
+                            getattr(account, '_fee', 0), parent.account_id if parent is not None else 0
+                            ) + account.name.encode('utf-8')
+
+
+def state_payload(account, seq):
+    return STATE_RECORD.pack(seq, account.account_id, account._balance, account._min_balance,
+                             getattr(account, '_fee', 0), account.is_blocked)
+
+
+class WriteAheadLog:
+    # Records are buffered and written with a single write + fsync once
+    # group_size records are pending or sync_interval seconds have passed.
+    # A background flusher enforces the interval when traffic stops, so no
+    # record waits longer than about sync_interval to reach the disk.
+    def __init__(self, path, group_size=256, sync_interval=0.05):
+        self.path = path
+        self.group_size = group_size
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self.file = open(path, 'ab')
+        self.stopping = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_loop, name='wal-flusher', daemon=True)
+        self.flusher.start()
+
+    def _flush_loop(self):
+        while not self.stopping.wait(self.sync_interval):
+            with self.lock:
+                if self.buffer and time.monotonic() - self.last_sync >= self.sync_interval:
+                    self._sync()
+
+    def append(self, record_type, payload):
+        with self.lock:
+            self.buffer += frame(record_type, payload)
+            self.pending += 1
+            if self.pending >= self.group_size or time.monotonic() - self.last_sync >= self.sync_interval:
+                self._sync()
+
+    def commit(self):
+        with self.lock:
+            self._sync()
+
+    def _sync(self):
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.buffer.clear()
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def truncate(self):
+        with self.lock:
+            self._sync()
+            self.file.truncate(0)
+            self.file.seek(0)
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.stopping.set()
+        self.flusher.join()
+        with self.lock:
+            self._sync()
+            self.file.close()
+
+
+class DurableStore:
+    def __init__(self, directory, accounts=None, group_size=256, sync_interval=0.05, snapshot_every=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.accounts = accounts if accounts is not None else {}
+        self.wal = WriteAheadLog(os.path.join(directory, WAL_FILE), group_size, sync_interval)
+        self.snapshot_every = snapshot_every
+        self.records_since_snapshot = 0
+        self.logged_actions = set()
+
+    def attach(self):
+        # Accounts passed in (for example what recover() returned) exist in
+        # no log yet, so they become the first snapshot; otherwise their
+        # later entries could not be replayed.
+        if self.accounts:
+            self.snapshot()
+        bank_accounts.add_listener(self)
+        return self
+
+    def detach(self):
+        bank_accounts.remove_listener(self)
+
+    def close(self):
+        self.detach()
+        self.wal.close()
+
+    def on_transaction(self, account, action, cents):
+        history = account.transaction_history
+        code = history.codes[-1]
+        if code not in self.logged_actions:
+            self.logged_actions.add(code)
+            self.wal.append(ACTION, ACTION_RECORD.pack(code) + action.encode('utf-8'))
+        if action == 'Account opened':
+            self.accounts[account.account_id] = account
+            self.wal.append(OPEN, open_payload(account, history.sequence[-1]))
+        elif account.account_id not in self.accounts:
+            before = account._balance if code in MEMO_CODES else account._balance - cents
+            self._adopt(account, before)
+        self.wal.append(ENTRY, ENTRY_RECORD.pack(history.sequence[-1], account.account_id,
+                                                 history.timestamps[-1], code, cents,
+                                                 account._balance, account.is_blocked))
+        self._maybe_snapshot()
+
+    def on_state(self, account):
+        if account.account_id not in self.accounts:
+            self._adopt(account, account._balance)
+        self.wal.append(STATE, state_payload(account, journal.next_sequence()))
+        self._maybe_snapshot()
+
+    def _adopt(self, account, balance):
+        # An account opened before attach() and not passed in has no record
+        # in the log yet. It is opened there with balance (its balance
+        # before the record being logged) so the records that follow replay;
+        # its earlier history is not logged.
+        self.accounts[account.account_id] = account
+        self.wal.append(OPEN, open_payload(account, journal.next_sequence()))
+        self.wal.append(STATE, STATE_RECORD.pack(journal.next_sequence(), account.account_id, balance,
+                                                 account._min_balance, getattr(account, '_fee', 0),
+                                                 account.is_blocked))
+
+    def _maybe_snapshot(self):
+        self.records_since_snapshot += 1
+        if self.snapshot_every is not None and self.records_since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        # The snapshot is written beside the live one and swapped in atomically.
+        # Its high-water sequence lets recovery skip WAL records it already
+        # covers if we crash before the WAL is truncated.
+        self.wal.commit()
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        with open(path + '.tmp', 'wb') as f:
+            write_snapshot(f, self.accounts.values(), journal.next_sequence())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self.wal.truncate()
+        self.logged_actions.clear()
+        self.records_since_snapshot = 0
+
+
+def write_snapshot(f, accounts, high_water):
+    f.write(frame(SNAPSHOT, SNAPSHOT_RECORD.pack(high_water)))
+    actions = journal.ACTIONS
+    f.write(b''.join(frame(ACTION, ACTION_RECORD.pack(code) + name.encode('utf-8'))
+                     for code, name in enumerate(actions)))
+    for account in sorted(accounts, key=lambda item: item.account_id):
+        f.write(frame(OPEN, open_payload(account, 0)))
+        # Running balances are rebuilt from the entry amounts; the STATE
+        # record that follows carries the authoritative final state.
+        account_id = account.account_id
+        balance = 0
+        records = []
+        for seq, timestamp, code, cents in account.transaction_history.raw_entries():
+            if code == OPENING_CODE:
+                balance = cents
+            elif code not in MEMO_CODES:
+                balance += cents
+            records.append(frame(ENTRY, ENTRY_RECORD.pack(seq, account_id, timestamp, code, cents,
+                                                          balance, False)))
+        f.write(b''.join(records))
+        f.write(frame(STATE, state_payload(account, 0)))
+
+
+def blank_account(kind, account_id, name, min_balance, fee):
+    # An account with an empty journal that bypasses __init__, for callers
+    # that restore its state and history themselves.
+    cls = ACCOUNT_CLASSES[kind]
+    account = cls.__new__(cls)
+    account.account_id = account_id
+    account._balance = 0
+    account.name = name
+    account._min_balance = min_balance
+    account.is_blocked = False
+    account.transaction_history = journal.TransactionJournal()
+    account._stats = AccountStats()
+    if kind == KIND_SAVINGS:
+        account._fee = fee
+    if kind == KIND_CHILD:
+        account.parent_account = None
+    return account
+
+
+class _Recovery:
+    def __init__(self):
+        self.accounts = {}
+        self.actions = {}
+        self.parents = {}
+        self.high_water = 0
+        self.last_seq = 0
+
+    def replay(self, path, skip_covered):
+        accounts = self.accounts
+        for record_type, payload in read_frames(path):
+            if record_type == ENTRY:
+                seq, account_id, timestamp, code, cents, balance, blocked = ENTRY_RECORD.unpack(payload)
+                if skip_covered and seq <= self.high_water:
+                    continue
+                account = accounts[account_id]
+                action = self.actions[code]
+                history = account.transaction_history
+                history.restore(seq, timestamp, action, cents)
+                if not len(history) % CHECKPOINT_EVERY:
+                    history.checkpoint(balance)
+                elif len(history) == 1 and history.codes[0] != OPENING_CODE:
+                    # An adopted account's history starts part way through,
+                    # so its first balance cannot be replayed from zero.
+                    history.checkpoint(balance)
+                account._stats.record(history.codes[-1], cents, balance, timestamp)
+                if action == 'Withdraw with Fee':
+                    account._stats.record_fee(account._fee)
+                elif action == 'Maintenance Fee':
+                    account._stats.record_fee(-cents)
+                account._balance = balance
+                account.is_blocked = blocked
+                self.last_seq = max(self.last_seq, seq)
+            elif record_type == STATE:
+                seq, account_id, balance, min_balance, fee, blocked = STATE_RECORD.unpack(payload)
+                if skip_covered and seq <= self.high_water:
+                    continue
+                account = accounts[account_id]
+                if balance != account._balance:
+                    account.transaction_history.checkpoint(balance)
+                account._balance = balance
+                account._min_balance = min_balance
+                account.is_blocked = blocked
+                if isinstance(account, SavingsAcct):
+                    account._fee = fee
+                account._stats.sync_balance(balance)
+                self.last_seq = max(self.last_seq, seq)
+            elif record_type == OPEN:
+                fixed = payload[:OPEN_RECORD.size]
+                seq, account_id, kind, min_balance, fee, parent_id = OPEN_RECORD.unpack(fixed)
+                if skip_covered and seq <= self.high_water:
+                    continue
+                accounts[account_id] = self.new_account(kind, account_id, min_balance, fee, parent_id,
+                                                        bytes(payload[OPEN_RECORD.size:]).decode('utf-8'))
+                self.last_seq = max(self.last_seq, seq)
+            elif record_type == ACTION:
+                code, = ACTION_RECORD.unpack(payload[:ACTION_RECORD.size])
+                self.actions[code] = bytes(payload[ACTION_RECORD.size:]).decode('utf-8')
+            elif record_type == SNAPSHOT:
+                self.high_water, = SNAPSHOT_RECORD.unpack(payload)
+                self.last_seq = max(self.last_seq, self.high_water)
+
+    def new_account(self, kind, account_id, min_balance, fee, parent_id, name):
+        if kind == KIND_CHILD:
+            self.parents[account_id] = parent_id
+        return blank_account(kind, account_id, name, min_balance, fee)
+
+    def link_parents(self):
+        for account_id, parent_id in self.parents.items():
+            account = self.accounts[account_id]
+            account.parent_account = self.accounts.get(parent_id)
+            if account.parent_account is not None:
+                account._stats.attach(account.parent_account._stats)
+
+
+def recover(directory):
+    # Rebuilds every account from the latest snapshot plus the WAL tail,
+    # restores ChildAccount.parent_account links and moves the id and
+    # sequence counters past everything recovered.
+    recovery = _Recovery()
+    recovery.replay(os.path.join(directory, SNAPSHOT_FILE), skip_covered=False)
+    recovery.replay(os.path.join(directory, WAL_FILE), skip_covered=True)
+    recovery.link_parents()
+    if recovery.accounts:
+        bank_accounts.advance_account_ids(max(recovery.accounts))
+    journal.advance_sequence(recovery.last_seq)
+    return recovery.accounts